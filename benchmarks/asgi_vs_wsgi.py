@@ -0,0 +1,166 @@
+"""
+Benchmark: WSGI (gunicorn gthread) vs ASGI (uvicorn workers, asyncpg) apps.
+
+Both apps are served by gunicorn with the same number of workers against the
+testing database and hit by the same load: many concurrent clients issuing
+balance reads and transfers (20:1 by default).
+
+.. code-block:: shell
+
+    python -m benchmarks.asgi_vs_wsgi --concurrency 256 --requests 20000
+
+Accounts are created in the testing database and removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+from flask_migrate import Migrate, upgrade
+
+from benchmarks.transfer_contention import remove_accounts, seed_accounts
+from wallet_api import create_app, db
+from wallet_api.config import PSQLClientConfig as db_conf
+
+
+#: gunicorn command line options of each app.
+SERVERS = {
+    "wsgi": ["wallet_api.wsgi:app", "--worker-class", "gthread", "--threads", "2"],
+    "asgi": ["wallet_api.asgi:app", "--worker-class", "uvicorn.workers.UvicornWorker"],
+}
+
+
+def start_server(app: str, port: int, workers: int) -> subprocess.Popen:
+    """
+    Starts gunicorn serving one of the apps on the testing database.
+
+    :param app: App to serve (`wsgi` or `asgi`).
+    :param port: Local port to bind.
+    :param workers: Number of worker processes.
+    :return: gunicorn process (once the app is alive).
+    """
+    env = dict(os.environ, PSQL_CLIENT_DATABASE=db_conf.test_database)
+    server = subprocess.Popen(
+        ["gunicorn", *SERVERS[app]]
+        + ["--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health/live").raise_for_status()
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+
+    server.terminate()
+    raise RuntimeError(f"{app} server didn't start")
+
+
+async def run_load(
+    port: int, user_ids: List[int], concurrency: int, requests: int, reads_per_transfer: int
+) -> Dict:
+    """
+    Issues `requests` requests from `concurrency` concurrent clients.
+
+    :param port: Local port of the server.
+    :param user_ids: Ids of the users involved.
+    :param concurrency: Number of concurrent clients.
+    :param requests: Total number of requests.
+    :param reads_per_transfer: Balance reads issued per transfer.
+    :return: Throughput, latency percentiles (ms) and count of responses per
+        status (`error` for transport errors).
+    """
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+    ) as client:
+
+        async def worker() -> None:
+            for i in remaining:
+                sender, recipient = random.sample(user_ids, 2)
+                start = time.perf_counter()
+                try:
+                    if i % (reads_per_transfer + 1):
+                        resp = await client.get(f"/user/{sender}/balance")
+                    else:
+                        resp = await client.post(
+                            f"/user/{sender}/transfer", json={"toUserId": recipient, "amount": "1"}
+                        )
+                except httpx.TransportError:
+                    # Connection refused/reset by an overloaded server
+                    statuses["error"] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[resp.status_code] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "throughput": statuses[200] / elapsed,
+        "p50": quantiles[49] * 1000,
+        "p99": quantiles[98] * 1000,
+        "statuses": dict(statuses),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--reads-per-transfer", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    app = create_app(test=True)
+    with app.app_context():
+        Migrate(app, db)
+        upgrade(revision="head")
+        remove_accounts()
+        user_ids = seed_accounts(app, args.accounts)
+
+        try:
+            results = {}
+            for name in SERVERS:
+                server = start_server(name, args.port, args.workers)
+                try:
+                    results[name] = asyncio.run(
+                        run_load(
+                            args.port,
+                            user_ids,
+                            args.concurrency,
+                            args.requests,
+                            args.reads_per_transfer,
+                        )
+                    )
+                finally:
+                    server.terminate()
+                    server.wait()
+        finally:
+            remove_accounts()
+
+    print(f"workers: {args.workers}, concurrency: {args.concurrency}")
+    for name, result in results.items():
+        print(
+            f"{name}: {result['throughput']:8.1f} ok/s"
+            f"  p50 {result['p50']:7.1f} ms  p99 {result['p99']:7.1f} ms"
+            f"  {result['statuses']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
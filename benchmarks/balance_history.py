@@ -0,0 +1,104 @@
+"""
+Benchmark: latest balance latency vs. length of the user's transaction history.
+
+Seeds one user per history length inside a transaction of the testing database
+(rolled back at the end) and times each way of reading its current balance.
+
+Usage:
+.. code-block:: shell
+
+    python -m benchmarks.balance_history --lengths 10 1000 100000 --repeat 100
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+from flask_migrate import Migrate, upgrade
+
+from wallet_api import create_app, db
+from wallet_api.models import AccountBalance, TransactionLog, User
+
+
+def seed_user(history_len: int) -> int:
+    """
+    Creates a user with `history_len` deposits of 1.00 each.
+
+    :param history_len: Number of transaction log entries of the user.
+    :return: Id of the new user.
+    """
+    user_id = db.session.execute(
+        'INSERT INTO "user" (name, email) VALUES (:name, :email) RETURNING id',
+        {"name": "Bench User", "email": f"bench-{history_len}-{time.time()}@email.com"},
+    ).scalar()
+    db.session.execute(
+        """
+        INSERT INTO transaction_log
+            (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+        SELECT
+            :user_id, 'DEPOSIT', 100, (i - 1) * 100, i * 100,
+            now() - make_interval(secs => :length - i)
+        FROM generate_series(1, :length) AS i
+        """,
+        {"user_id": user_id, "length": history_len},
+    )
+    db.session.execute(
+        "INSERT INTO account_balance (user_id, balance) VALUES (:user_id, :length * 100)",
+        {"user_id": user_id, "length": history_len},
+    )
+    db.session.execute("ANALYZE transaction_log")
+
+    return user_id
+
+
+def measure(func: Callable[[], object], repeat: int) -> List[float]:
+    """
+    Times `func` with an empty session identity map on every run.
+
+    :param func: Function to time.
+    :param repeat: Number of runs.
+    :return: Latencies in milliseconds.
+    """
+    latencies = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    app = create_app(test=True)
+    with app.app_context():
+        Migrate(app, db)
+        upgrade(revision="head")
+
+        paths = {
+            "relationship": lambda uid: User.query.get(uid).transactions.all()[-1].new_balance,
+            "latest_for": lambda uid: TransactionLog.latest_for(uid),
+            "account_balance": lambda uid: AccountBalance.total_for(uid),
+        }
+        print(f"{'history':>10} {'path':>16} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+        try:
+            for length in args.lengths:
+                user_id = seed_user(length)
+                for name, path in paths.items():
+                    latencies = sorted(measure(lambda: path(user_id), args.repeat))
+                    print(
+                        f"{length:>10} {name:>16} "
+                        f"{statistics.median(latencies):>10.3f} "
+                        f"{latencies[int(len(latencies) * 0.95) - 1]:>10.3f}"
+                    )
+        finally:
+            db.session.rollback()
+
+
+if __name__ == "__main__":
+    main()
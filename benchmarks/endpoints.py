@@ -0,0 +1,284 @@
+"""
+Benchmark: throughput and latency of the endpoints over a synthetic dataset.
+
+Seeds the testing database with `--users` users holding `--transactions`
+deposits each, then times user creation, balance reads and transfers issued
+by 1 and N concurrent clients. Results are written as JSON (tagged with the
+current commit) so runs can be compared across commits:
+.. code-block:: shell
+
+    python -m benchmarks.endpoints --users 10000 --transactions 10 --clients 1 16
+    python -m benchmarks.endpoints --users 1000000 --transactions 10 --keep  # reuse the dataset
+
+Seeded users are removed afterwards unless `--keep` is given (a later run at
+the same scale then skips the seeding).
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain
+from typing import Callable, Dict, List, Tuple
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_migrate import Migrate, upgrade
+
+from benchmarks.transfer_contention import remove_accounts
+from wallet_api import create_app, db
+from wallet_api.config import PSQLClientConfig as db_conf
+
+
+#: Email domain of the benchmark users (used to clean them up).
+BENCH_EMAIL_DOMAIN = "endpoints.bench"
+
+#: Users seeded per statement.
+SEED_CHUNK_USERS = 10000
+
+#: Amount of every seeded deposit (minor units).
+DEPOSIT_AMOUNT = 10000
+
+
+def seed_users(users: int, transactions: int) -> List[int]:
+    """
+    Seeds `users` users with `transactions` deposits each (server-side, in
+    chunks committed one by one), unless the dataset already exists.
+
+    :param users: Number of users.
+    :param transactions: Number of transaction log entries per user.
+    :return: Ids of the seeded users.
+    """
+    # Users created by the `create_user` scenario aren't part of the dataset
+    email_pattern = f"user-%@{BENCH_EMAIL_DOMAIN}"
+    user_ids = [
+        row[0]
+        for row in db.session.execute(
+            'SELECT id FROM "user" WHERE email LIKE :pattern ORDER BY id',
+            {"pattern": email_pattern},
+        )
+    ]
+    if len(user_ids) == users:
+        return user_ids
+
+    remove_accounts(BENCH_EMAIL_DOMAIN)
+    for start in range(0, users, SEED_CHUNK_USERS):
+        db.session.execute(
+            """
+            WITH new_user AS (
+                INSERT INTO "user" (name, email)
+                SELECT 'Bench User ' || i, 'user-' || i || :domain
+                FROM generate_series(:start, :stop - 1) AS i
+                RETURNING id
+            ), new_balance AS (
+                INSERT INTO account_balance (user_id, balance)
+                SELECT id, :transactions * :amount FROM new_user
+            )
+            INSERT INTO transaction_log
+                (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+            SELECT
+                id, 'DEPOSIT', :amount, (n - 1) * :amount, n * :amount,
+                now() - make_interval(secs => :transactions - n)
+            FROM new_user, generate_series(1, :transactions) AS n
+            """,
+            {
+                "domain": f"@{BENCH_EMAIL_DOMAIN}",
+                "start": start,
+                "stop": min(start + SEED_CHUNK_USERS, users),
+                "transactions": transactions,
+                "amount": DEPOSIT_AMOUNT,
+            },
+        )
+        db.session.commit()
+    db.session.execute("ANALYZE")
+    db.session.commit()
+
+    return seed_users(users, transactions)
+
+
+def percentile(latencies: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    :param latencies: Sorted latencies.
+    :param pct: Percentile (0-100).
+    :return: The percentile value.
+    """
+    return latencies[max(math.ceil(len(latencies) * pct / 100) - 1, 0)]
+
+
+def create_user(client: FlaskClient, user_ids: List[int]) -> int:
+    """Scenario: creates a new user."""
+    resp = client.post(
+        "/user",
+        json={
+            "name": "Bench User",
+            "email": f"new-{random.getrandbits(64)}@{BENCH_EMAIL_DOMAIN}",
+            "init_balance": "10.00",
+        },
+    )
+    return resp.status_code
+
+
+def read_balance(client: FlaskClient, user_ids: List[int]) -> int:
+    """Scenario: reads the balance of a random user."""
+    return client.get(f"/user/{random.choice(user_ids)}/balance").status_code
+
+
+def transfer(client: FlaskClient, user_ids: List[int]) -> int:
+    """Scenario: transfers between two random users."""
+    sender, recipient = random.sample(user_ids, 2)
+    resp = client.post(f"/user/{sender}/transfer", json={"toUserId": recipient, "amount": "0.01"})
+    return resp.status_code if resp.status_code != 200 else resp.json["status"]
+
+
+#: Benchmarked scenarios indexed by name.
+SCENARIOS: Dict[str, Callable[[FlaskClient, List[int]], object]] = {
+    "create_user": create_user,
+    "read_balance": read_balance,
+    "transfer": transfer,
+}
+
+
+def run_client(
+    app: Flask, scenario: Callable, user_ids: List[int], requests: int
+) -> List[Tuple[float, object]]:
+    """
+    Issues `requests` requests of a scenario.
+
+    :param app: Flask application.
+    :param scenario: Scenario function.
+    :param user_ids: Ids of the seeded users.
+    :param requests: Number of requests to issue.
+    :return: Latency (milliseconds) and outcome of every request.
+    """
+    client = app.test_client()
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        outcome = scenario(client, user_ids)
+        samples.append(((time.perf_counter() - start) * 1000, outcome))
+
+    return samples
+
+
+def run_scenario(app: Flask, name: str, user_ids: List[int], clients: int, requests: int) -> dict:
+    """
+    Runs a scenario with concurrent clients.
+
+    :param app: Flask application.
+    :param name: Scenario name.
+    :param user_ids: Ids of the seeded users.
+    :param clients: Number of concurrent clients.
+    :param requests: Number of requests per client.
+    :return: Scenario results.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        samples = list(
+            chain.from_iterable(
+                executor.map(
+                    lambda _: run_client(app, SCENARIOS[name], user_ids, requests), range(clients)
+                )
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in samples)
+    outcomes: Dict[str, int] = {}
+    for _, outcome in samples:
+        outcomes[str(outcome)] = outcomes.get(str(outcome), 0) + 1
+
+    return {
+        "scenario": name,
+        "clients": clients,
+        "requests": len(samples),
+        "outcomes": outcomes,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def current_commit() -> str:
+    """Gets the current git commit (`unknown` outside a git checkout)."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=10, help="transactions per user")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--requests", type=int, default=500, help="requests per client")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", help="results file (default: endpoints-<commit>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded dataset")
+    args = parser.parse_args()
+
+    commit = current_commit()
+    app = create_app(test=True)
+    with app.app_context():
+        Migrate(app, db)
+        upgrade(revision="head")
+        # Isolation levels are only honoured outside testing mode
+        app.config["TESTING"] = False
+
+        seed_start = time.perf_counter()
+        user_ids = seed_users(args.users, args.transactions)
+        seed_elapsed = time.perf_counter() - seed_start
+
+        results = []
+        try:
+            for name in args.scenarios:
+                for clients in args.clients:
+                    result = run_scenario(app, name, user_ids, clients, args.requests)
+                    results.append(result)
+                    print(
+                        f"{name:>14} {clients:>4} clients: {result['throughput_rps']:>9.1f} req/s "
+                        f"p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, "
+                        f"p99 {result['p99_ms']:.2f} ms {result['outcomes']}"
+                    )
+        finally:
+            if not args.keep:
+                remove_accounts(BENCH_EMAIL_DOMAIN)
+
+    output = args.output or f"endpoints-{commit}.json"
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "date": datetime.utcnow().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "dataset": {
+                    "users": args.users,
+                    "transactions_per_user": args.transactions,
+                    "seed_s": round(seed_elapsed, 3),
+                },
+                "config": {
+                    "transfer_strategy": db_conf.transfer_strategy,
+                    "transfer_group_commit": bool(db_conf.transfer_group_commit),
+                    "pool_size": db_conf.pool_size,
+                    "max_overflow": db_conf.max_overflow,
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: transfers throughput into a single hot account split in N slots.
+
+Every client transfers from its own account to the same merchant account,
+whose balance is split in a varying number of slots. Clients are threads of
+several client processes (each with its own application and connection pool),
+and a simulated database round trip is added while the balance locks are held
+so transfers are bound by the merchant's row locks, as with a remote database,
+rather than by the Python side. Best run with a row-locking strategy, e.g.:
+.. code-block:: shell
+
+    PSQL_CLIENT_TRANSFER_STRATEGY=row_lock python -m benchmarks.hot_account --slots 1 4 16
+
+Throughput is reported per slot count, along with the speedup over the first
+one. It scales with N until the client processes run out of CPU: on a single
+core (`row_lock`, 4 processes of 4 clients, 20 ms round trip) 37.8 (1 slot),
+113.4 (4 slots, 3.0x) and 133.6 (16 slots, 3.5x) transfers/s, the last one
+bound by the CPU. Without the simulated round trip (`--latency 0`) the same
+core is the bottleneck whatever N: 112.8, 117.3 and 130.2 transfers/s.
+
+Accounts are created in the testing database and removed afterwards.
+"""
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from flask import Flask
+from flask_migrate import Migrate, upgrade
+
+from benchmarks.transfer_contention import remove_accounts, seed_accounts
+from wallet_api import create_app, db
+from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.models import AccountBalance
+
+
+#: Application of a client process.
+_app: Optional[Flask] = None
+
+
+def init_process(latency: float) -> None:
+    """
+    Client process initializer: creates its application and delays every
+    transfer by `latency` once its balances are locked.
+
+    :param latency: Simulated database round trip (seconds).
+    """
+    global _app
+    _app = create_app(test=True)
+    # Isolation levels are only honoured outside testing mode
+    _app.config["TESTING"] = False
+
+    transfer = AccountBalance.transfer
+
+    def slow_transfer(*args):
+        time.sleep(latency)
+        return transfer(*args)
+
+    AccountBalance.transfer = slow_transfer
+
+
+def run_process(sender_ids: List[int], merchant_id: int, transfers: int) -> int:
+    """
+    Runs a client thread per sender in the current client process.
+
+    :param sender_ids: Ids of the client users.
+    :param merchant_id: Id of the merchant user.
+    :param transfers: Number of transfers per client.
+    :return: Number of transfers done.
+    """
+    with ThreadPoolExecutor(max_workers=len(sender_ids)) as executor:
+        return sum(
+            executor.map(
+                lambda sender_id: run_client(_app, sender_id, merchant_id, transfers), sender_ids
+            )
+        )
+
+
+def run_client(app: Flask, sender_id: int, merchant_id: int, transfers: int) -> int:
+    """
+    Issues `transfers` transfers from a client account to the merchant.
+
+    :param app: Flask application.
+    :param sender_id: Id of the client user.
+    :param merchant_id: Id of the merchant user.
+    :param transfers: Number of transfers to issue.
+    :return: Number of transfers done.
+    """
+    client = app.test_client()
+    done = 0
+    for _ in range(transfers):
+        resp = client.post(
+            f"/user/{sender_id}/transfer", json={"toUserId": merchant_id, "amount": "1"}
+        )
+        done += resp.json.get("status") == "done"
+
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slots", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--processes", type=int, default=4, help="client processes")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--transfers", type=int, default=50, help="transfers per client")
+    parser.add_argument(
+        "--latency", type=float, default=20, help="simulated database round trip (ms)"
+    )
+    args = parser.parse_args()
+
+    app = create_app(test=True)
+    with app.app_context():
+        Migrate(app, db)
+        upgrade(revision="head")
+        app.config["TESTING"] = False
+        remove_accounts()
+        merchant_id, *sender_ids = seed_accounts(app, args.clients + 1)
+        groups: List[List[int]] = [[] for _ in range(args.processes)]
+        for i, sender_id in enumerate(sender_ids):
+            groups[i % args.processes].append(sender_id)
+
+        print(f"strategy: {db_conf.transfer_strategy}, latency: {args.latency} ms")
+        print(f"{'slots':>6} {'done/s':>10} {'speedup':>8}")
+        baseline = None
+        try:
+            with multiprocessing.get_context("spawn").Pool(
+                args.processes, initializer=init_process, initargs=(args.latency / 1000,)
+            ) as pool:
+                # Warms up the client processes and their connection pools
+                pool.starmap(run_process, [(group, merchant_id, 1) for group in groups if group])
+                for slots in args.slots:
+                    AccountBalance.set_slots(merchant_id, slots, datetime.utcnow())
+                    db.session.commit()
+
+                    start = time.perf_counter()
+                    done = sum(
+                        pool.starmap(
+                            run_process,
+                            [(group, merchant_id, args.transfers) for group in groups if group],
+                        )
+                    )
+                    rate = done / (time.perf_counter() - start)
+                    baseline = baseline or rate
+                    print(f"{slots:>6} {rate:>10.1f} {rate / baseline:>7.1f}x")
+        finally:
+            remove_accounts()
+
+
+if __name__ == "__main__":
+    main()
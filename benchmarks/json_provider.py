@@ -0,0 +1,123 @@
+"""
+Benchmark: response encoding and request decoding time, Flask's JSON vs. the JSON providers.
+
+Times a history page and a transfers batch response (formatted dump +
+`flask.jsonify` vs. provider dump + response) and a transfers batch
+request (`request.get_json` vs. the provider's `request_json`) with every
+installed JSON backend. No database is needed.
+
+Usage:
+.. code-block:: shell
+
+    python -m benchmarks.json_provider --repeat 200 --batch 1000 --page 500
+"""
+import argparse
+import json
+import statistics
+from datetime import datetime, timedelta
+
+from flask import jsonify, request
+
+from benchmarks.serializers import measure
+from wallet_api import create_app
+from wallet_api.archive import ArchivedEntry
+from wallet_api.common import json_provider, serializers
+from wallet_api.common.money import Money
+from wallet_api.models import TransactionType
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--page", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    start = datetime(2026, 1, 1)
+    entries = [
+        ArchivedEntry(
+            i,
+            1,
+            0,
+            TransactionType.TRANSFER_IN,
+            Money(1250),
+            Money(i * 1250),
+            Money((i + 1) * 1250),
+            start + timedelta(seconds=i),
+        )
+        for i in range(args.page)
+    ]
+    history = (
+        serializers.user_transactions_output_schema,
+        {"userId": 1, "transactions": entries, "next": (start, args.page)},
+    )
+    results = [{"status": "done"}] * args.batch
+    batch = (
+        serializers.transfer_batch_output_schema,
+        {"status": "done", "timestamp": start, "results": results},
+    )
+    body = json.dumps(
+        {
+            "transfers": [
+                {"fromUserId": i, "toUserId": i + 1, "amount": "12.50"} for i in range(args.batch)
+            ]
+        }
+    )
+
+    backends = [name for name in sorted(json_provider.PROVIDERS) if name != "orjson"]
+    if json_provider.orjson is not None:
+        backends.insert(0, "orjson")
+
+    print(
+        f"{'payload':>16} {'backend':>10} {'flask p50 (us)':>15} {'provider p50 (us)':>18} "
+        f"{'speedup':>8}"
+    )
+    for name in backends:
+        provider = json_provider.get_provider(name)
+        for payload, (compiled, obj) in (("history page", history), ("batch response", batch)):
+            with app.app_context():
+                expected = json.loads(jsonify(compiled.dump(obj).data).get_data())
+                assert (
+                    json.loads(
+                        provider.response(
+                            compiled.dump(obj, native=provider.native).data
+                        ).get_data()
+                    )
+                    == expected
+                )
+                flask_p50 = statistics.median(
+                    measure(lambda: jsonify(compiled.dump(obj).data).get_data(), args.repeat)
+                )
+                provider_p50 = statistics.median(
+                    measure(
+                        lambda: provider.response(
+                            compiled.dump(obj, native=provider.native).data
+                        ).get_data(),
+                        args.repeat,
+                    )
+                )
+            print(
+                f"{payload:>16} {name:>10} {flask_p50:>15.1f} {provider_p50:>18.1f} "
+                f"{flask_p50 / provider_p50:>7.1f}x"
+            )
+
+        def get_json():
+            with app.test_request_context(data=body, content_type="application/json"):
+                return request.get_json(silent=True)
+
+        def request_json():
+            with app.test_request_context(data=body, content_type="application/json"):
+                return provider.request_json()
+
+        assert get_json() == request_json()
+        flask_p50 = statistics.median(measure(get_json, args.repeat))
+        provider_p50 = statistics.median(measure(request_json, args.repeat))
+        print(
+            f"{'batch request':>16} {name:>10} {flask_p50:>15.1f} {provider_p50:>18.1f} "
+            f"{flask_p50 / provider_p50:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark: (de)serialization time per endpoint, per-request schemas vs. compiled serializers.
+
+Times the request and response payloads of every endpoint with a marshmallow
+schema instantiated per call (as the resources used to) and with the compiled
+serializers shared by every request. No database is needed.
+
+Usage:
+.. code-block:: shell
+
+    python -m benchmarks.serializers --repeat 200 --batch 1000 --page 50
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from wallet_api.archive import ArchivedEntry
+from wallet_api.common import serializers
+from wallet_api.common.money import Money
+from wallet_api.models import TransactionType
+
+
+def measure(func: Callable[[], object], repeat: int) -> List[float]:
+    """
+    Times `func`.
+
+    :param func: Function to time.
+    :param repeat: Number of runs.
+    :return: Latencies in microseconds.
+    """
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    return latencies
+
+
+def payloads(batch: int, page: int) -> list:
+    """
+    Payloads of every endpoint.
+
+    :param batch: Number of transfers of the batch and rows of the statement chunk.
+    :param page: Number of transactions of the history page.
+    :return: `(endpoint, operation, compiled serializer, payload)` tuples.
+    """
+    start = datetime(2026, 1, 1)
+    entries = [
+        ArchivedEntry(
+            i,
+            1,
+            0,
+            TransactionType.TRANSFER_IN,
+            Money(1250),
+            Money(i * 1250),
+            Money((i + 1) * 1250),
+            start + timedelta(seconds=i),
+        )
+        for i in range(max(batch, page))
+    ]
+    transfers = [{"fromUserId": i, "toUserId": i + 1, "amount": "12.50"} for i in range(batch)]
+    query = {"limit": str(page), "type": "transfer_in", "from": "2026-01-01T00:00:00+00:00"}
+
+    return [
+        (
+            "POST /user",
+            "load",
+            serializers.user_input_schema,
+            {"name": "Bench User", "email": "bench@email.com", "init_balance": "100.00"},
+        ),
+        ("POST /user", "dump", serializers.user_output_schema, {"id": 1}),
+        (
+            "GET /user/<id>/balance",
+            "dump",
+            serializers.user_balance_output_schema,
+            {"userId": 1, "balance": Money(12345)},
+        ),
+        (
+            "POST /user/<id>/transfer",
+            "load",
+            serializers.user_transfer_input_schema,
+            {"toUserId": 2, "amount": "12.50"},
+        ),
+        (
+            "POST /user/<id>/transfer",
+            "dump",
+            serializers.user_transfer_output_schema,
+            {"status": "done", "timestamp": start},
+        ),
+        (
+            "POST /transfers/batch",
+            "load",
+            serializers.transfer_batch_input_schema,
+            {"transfers": transfers, "mode": "atomic"},
+        ),
+        (
+            "POST /transfers/batch",
+            "dump",
+            serializers.transfer_batch_output_schema,
+            {"status": "done", "timestamp": start, "results": [{"status": "done"}] * batch},
+        ),
+        ("GET /user/<id>/transactions", "load", serializers.user_transactions_input_schema, query),
+        (
+            "GET /user/<id>/transactions",
+            "dump",
+            serializers.user_transactions_output_schema,
+            {"userId": 1, "transactions": entries[:page], "next": (start, page)},
+        ),
+        (
+            "GET /user/<id>/statement",
+            "load",
+            serializers.user_statement_input_schema,
+            {"format": "csv", "from": "2026-01-01T00:00:00"},
+        ),
+        (
+            "GET /user/<id>/statement",
+            "dump",
+            serializers.statement_entries_output_schema,
+            entries[:batch],
+        ),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--page", type=int, default=50)
+    args = parser.parse_args()
+
+    print(
+        f"{'endpoint':>28} {'op':>5} {'schema p50 (us)':>16} {'compiled p50 (us)':>18} "
+        f"{'speedup':>8}"
+    )
+    for endpoint, operation, compiled, payload in payloads(args.batch, args.page):
+        schema_class, many = compiled.schema.__class__, compiled.many
+        compiled_result = getattr(compiled, operation)(payload)
+        schema_result = getattr(schema_class(many=many), operation)(payload)
+        assert compiled_result == schema_result, f"{endpoint} {operation} results differ"
+
+        schema_p50 = statistics.median(
+            measure(lambda: getattr(schema_class(many=many), operation)(payload), args.repeat)
+        )
+        compiled_p50 = statistics.median(
+            measure(lambda: getattr(compiled, operation)(payload), args.repeat)
+        )
+        print(
+            f"{endpoint:>28} {operation:>5} {schema_p50:>16.1f} {compiled_p50:>18.1f} "
+            f"{schema_p50 / compiled_p50:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
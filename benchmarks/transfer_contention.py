@@ -0,0 +1,125 @@
+"""
+Benchmark: transfers throughput between a few hot accounts under contention.
+
+The transfers concurrency strategy is picked at import time, so run it once
+per strategy and compare:
+.. code-block:: shell
+
+    PSQL_CLIENT_TRANSFER_STRATEGY=serializable python -m benchmarks.transfer_contention
+    PSQL_CLIENT_TRANSFER_STRATEGY=row_lock python -m benchmarks.transfer_contention
+    PSQL_CLIENT_TRANSFER_GROUP_COMMIT=true python -m benchmarks.transfer_contention
+
+Accounts are created in the testing database and removed afterwards.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from flask import Flask
+from flask_migrate import Migrate, upgrade
+
+from wallet_api import create_app, db
+from wallet_api.config import PSQLClientConfig as db_conf
+
+
+#: Email domain of the benchmark users (used to clean them up).
+BENCH_EMAIL_DOMAIN = "contention.bench"
+
+
+def seed_accounts(app: Flask, accounts: int) -> List[int]:
+    """
+    Creates `accounts` users through the API with a large initial balance.
+
+    :param app: Flask application.
+    :param accounts: Number of users to create.
+    :return: Ids of the new users.
+    """
+    client = app.test_client()
+    user_ids = []
+    for i in range(accounts):
+        resp = client.post(
+            "/user",
+            json={
+                "name": f"Bench User {i}",
+                "email": f"user-{i}@{BENCH_EMAIL_DOMAIN}",
+                "init_balance": "1000000.00",
+            },
+        )
+        user_ids.append(resp.json["userId"])
+
+    return user_ids
+
+
+def remove_accounts(domain: str = BENCH_EMAIL_DOMAIN) -> None:
+    """
+    Deletes the benchmark users and their data.
+
+    :param domain: Email domain of the benchmark users.
+    """
+    users = f"SELECT id FROM \"user\" WHERE email LIKE '%@{domain}'"
+    db.session.execute(f"DELETE FROM transaction_log WHERE user_id IN ({users})")
+    db.session.execute(f"DELETE FROM account_balance WHERE user_id IN ({users})")
+    db.session.execute(f"DELETE FROM balance_checkpoint WHERE user_id IN ({users})")
+    db.session.execute(f"DELETE FROM \"user\" WHERE email LIKE '%@{domain}'")
+    db.session.commit()
+
+
+def run_client(app: Flask, user_ids: List[int], transfers: int) -> Counter:
+    """
+    Issues `transfers` random transfers between the given users.
+
+    :param app: Flask application.
+    :param user_ids: Ids of the users involved.
+    :param transfers: Number of transfers to issue.
+    :return: Count of transfers per outcome.
+    """
+    client = app.test_client()
+    outcomes: Counter = Counter()
+    for _ in range(transfers):
+        sender, recipient = random.sample(user_ids, 2)
+        resp = client.post(f"/user/{sender}/transfer", json={"toUserId": recipient, "amount": "1"})
+        outcomes[resp.json.get("status", resp.status_code)] += 1
+
+    return outcomes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--transfers", type=int, default=200, help="transfers per client")
+    args = parser.parse_args()
+
+    app = create_app(test=True)
+    with app.app_context():
+        Migrate(app, db)
+        upgrade(revision="head")
+        # Isolation levels are only honoured outside testing mode
+        app.config["TESTING"] = False
+        remove_accounts()
+        user_ids = seed_accounts(app, args.accounts)
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = executor.map(
+                    lambda _: run_client(app, user_ids, args.transfers), range(args.clients)
+                )
+                outcomes = sum(results, Counter())
+            elapsed = time.perf_counter() - start
+        finally:
+            remove_accounts()
+
+    total = sum(outcomes.values())
+    print(f"strategy:    {db_conf.transfer_strategy}")
+    print(f"group commit: {bool(db_conf.transfer_group_commit)}")
+    print(f"transfers:   {total} ({dict(outcomes)})")
+    print(f"throughput:  {outcomes['done'] / elapsed:.1f} done/s")
+    print(f"failed rate: {outcomes['failed'] / total:.1%}")
+
+
+if __name__ == "__main__":
+    main()
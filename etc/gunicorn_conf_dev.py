@@ -1,5 +1,14 @@
 # gunicorn's configuration for development.
 # For configuration details go to: http://docs.gunicorn.org/en/stable/configure.html
+import os
+import shutil
+
+# Metrics (prometheus_client multiprocess mode): every worker writes its
+# values to files in this directory, aggregated by the `/metrics` endpoint.
+# It must be set before prometheus_client is imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/dev/shm/wallet_api_metrics")
+
+from prometheus_client import multiprocess  # noqa: E402
 
 # Server Socket
 backlog = 2048  # default
@@ -36,3 +45,14 @@ reload = True
 accesslog = "-"
 errorlog = "-"  # default
 loglevel = "debug"
+
+
+# Server Hooks
+def on_starting(server):
+    # Metrics of a previous run must not be aggregated
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
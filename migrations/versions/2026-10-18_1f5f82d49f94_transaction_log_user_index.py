@@ -0,0 +1,31 @@
+"""transaction log user index
+
+Revision ID: 1f5f82d49f94
+Revises: 3876c98d60b6
+Create Date: 2026-10-18 10:02:17.344091
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f5f82d49f94'
+down_revision = '3876c98d60b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Covering index (PostgreSQL 11+) so the latest balance of a user is
+    # served by an index-only backward scan
+    op.execute(
+        """
+        CREATE INDEX ix_transaction_log_user_id_timestamp_id
+        ON transaction_log (user_id, timestamp, id) INCLUDE (new_balance)
+        """
+    )
+
+
+def downgrade():
+    op.drop_index('ix_transaction_log_user_id_timestamp_id', table_name='transaction_log')
@@ -0,0 +1,46 @@
+"""balance change notify
+
+Revision ID: 2c39c0affec5
+Revises: ddb45a9676ab
+Create Date: 2026-10-18 15:02:47.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c39c0affec5'
+down_revision = 'ddb45a9676ab'
+branch_labels = None
+depends_on = None
+
+
+# One notification per user whose balance changed (statement level, so a
+# multi-row insert notifies each user once; delivered on commit)
+NOTIFY_BALANCE_CHANGED_SQL = """
+CREATE OR REPLACE FUNCTION notify_balance_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('balance_changed', changed.user_id::text)
+    FROM (SELECT DISTINCT user_id FROM inserted) AS changed;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    op.execute(NOTIFY_BALANCE_CHANGED_SQL)
+    op.execute(
+        """
+        CREATE TRIGGER transaction_log_balance_changed
+        AFTER INSERT ON transaction_log
+        REFERENCING NEW TABLE AS inserted
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_balance_changed()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER transaction_log_balance_changed ON transaction_log")
+    op.execute("DROP FUNCTION notify_balance_changed()")
@@ -0,0 +1,82 @@
+"""wallet transfer function
+
+Revision ID: 2d0db5f5ee04
+Revises: 1f5f82d49f94
+Create Date: 2026-10-18 12:40:55.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d0db5f5ee04'
+down_revision = '1f5f82d49f94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Server-side transfer: locks both balances (ascending user id order),
+    # checks funds and writes both transaction log rows. Returns `done` along
+    # with the new balances or an error code (`user_not_found`, `insufficient_funds`)
+    op.execute(
+        """
+        CREATE FUNCTION wallet_transfer(
+            sender_id integer,
+            recipient_id integer,
+            transfer_amount numeric,
+            transfer_timestamp timestamp,
+            OUT status text,
+            OUT sender_balance numeric,
+            OUT recipient_balance numeric
+        ) AS $$
+        BEGIN
+            PERFORM 1 FROM account_balance
+            WHERE user_id IN (sender_id, recipient_id)
+            ORDER BY user_id
+            FOR UPDATE;
+
+            SELECT balance INTO sender_balance FROM account_balance WHERE user_id = sender_id;
+            SELECT balance INTO recipient_balance FROM account_balance WHERE user_id = recipient_id;
+            IF sender_balance IS NULL OR recipient_balance IS NULL THEN
+                status := 'user_not_found';
+                sender_balance := NULL;
+                recipient_balance := NULL;
+                RETURN;
+            END IF;
+            IF transfer_amount > sender_balance THEN
+                status := 'insufficient_funds';
+                RETURN;
+            END IF;
+
+            -- Sender goes first so a self-transfer keeps a consistent chain
+            UPDATE account_balance SET balance = balance - transfer_amount
+            WHERE user_id = sender_id
+            RETURNING balance INTO sender_balance;
+            INSERT INTO transaction_log
+                (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+            VALUES (
+                sender_id, 'TRANSFER_OUT', transfer_amount,
+                sender_balance + transfer_amount, sender_balance, transfer_timestamp
+            );
+
+            UPDATE account_balance SET balance = balance + transfer_amount
+            WHERE user_id = recipient_id
+            RETURNING balance INTO recipient_balance;
+            INSERT INTO transaction_log
+                (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+            VALUES (
+                recipient_id, 'TRANSFER_IN', transfer_amount,
+                recipient_balance - transfer_amount, recipient_balance, transfer_timestamp
+            );
+
+            status := 'done';
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP FUNCTION wallet_transfer(integer, integer, numeric, timestamp)")
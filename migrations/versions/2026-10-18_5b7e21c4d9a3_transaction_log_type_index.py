@@ -0,0 +1,30 @@
+"""transaction log type index
+
+Revision ID: 5b7e21c4d9a3
+Revises: 2c39c0affec5
+Create Date: 2026-10-18 21:40:12.508113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e21c4d9a3'
+down_revision = '2c39c0affec5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination of a user's history filtered by transaction type
+    op.create_index(
+        'ix_transaction_log_user_id_trans_type_timestamp_id',
+        'transaction_log',
+        ['user_id', 'trans_type', 'timestamp', 'id'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_transaction_log_user_id_trans_type_timestamp_id', table_name='transaction_log')
@@ -0,0 +1,169 @@
+"""transaction log partitions
+
+Revision ID: 8e3f6a1b2c47
+Revises: 5b7e21c4d9a3
+Create Date: 2026-10-18 22:31:05.271944
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3f6a1b2c47'
+down_revision = '5b7e21c4d9a3'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = "id, user_id, slot, trans_type, amount, opening_balance, new_balance, timestamp"
+
+# Monthly partitions from the oldest entry to 3 months after the newest one
+# (or now). No DEFAULT partition: it would rule out ordered partition scans
+# and block the creation of partitions overlapping its rows
+CREATE_PARTITIONS_SQL = """
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(min(timestamp), now() AT TIME ZONE 'UTC')),
+            date_trunc('month', greatest(max(timestamp), now() AT TIME ZONE 'UTC'))
+                + interval '3 months',
+            interval '1 month'
+        )::date
+        FROM transaction_log_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF transaction_log FOR VALUES FROM (%L) TO (%L)',
+            'transaction_log_' || to_char(month, 'YYYY_MM'),
+            month,
+            month + interval '1 month'
+        );
+    END LOOP;
+END;
+$$
+"""
+
+
+def create_indexes_and_trigger():
+    op.execute(
+        """
+        CREATE INDEX ix_transaction_log_user_id_timestamp_id
+        ON transaction_log (user_id, timestamp, id) INCLUDE (new_balance)
+        """
+    )
+    op.create_index(
+        'ix_transaction_log_user_id_trans_type_timestamp_id',
+        'transaction_log',
+        ['user_id', 'trans_type', 'timestamp', 'id'],
+        unique=False,
+    )
+    op.execute(
+        """
+        CREATE TRIGGER transaction_log_balance_changed
+        AFTER INSERT ON transaction_log
+        REFERENCING NEW TABLE AS inserted
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_balance_changed()
+        """
+    )
+
+
+def drop_indexes_and_trigger(table):
+    op.execute(f"DROP TRIGGER transaction_log_balance_changed ON {table}")
+    op.drop_index('ix_transaction_log_user_id_timestamp_id', table_name=table)
+    op.drop_index('ix_transaction_log_user_id_trans_type_timestamp_id', table_name=table)
+
+
+def upgrade():
+    op.rename_table('transaction_log', 'transaction_log_unpartitioned')
+    op.execute(
+        "ALTER TABLE transaction_log_unpartitioned "
+        "RENAME CONSTRAINT transaction_log_pkey TO transaction_log_unpartitioned_pkey"
+    )
+    drop_indexes_and_trigger('transaction_log_unpartitioned')
+
+    # Partitioned tables can't have identity columns (PostgreSQL < 17): the
+    # identity is replaced by a sequence going on from it
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            next_id integer;
+        BEGIN
+            next_id := nextval(pg_get_serial_sequence('transaction_log_unpartitioned', 'id'));
+            ALTER TABLE transaction_log_unpartitioned ALTER COLUMN id DROP IDENTITY;
+            EXECUTE format('CREATE SEQUENCE transaction_log_id_seq AS integer START %s', next_id);
+        END;
+        $$
+        """
+    )
+    # The partition key must be part of the primary key
+    op.execute(
+        """
+        CREATE TABLE transaction_log (
+            id integer NOT NULL DEFAULT nextval('transaction_log_id_seq'),
+            user_id integer NOT NULL,
+            slot smallint NOT NULL DEFAULT 0,
+            trans_type transactiontype NOT NULL,
+            amount numeric NOT NULL,
+            opening_balance numeric NOT NULL,
+            new_balance numeric NOT NULL,
+            timestamp timestamp without time zone NOT NULL,
+            CONSTRAINT transaction_log_pkey PRIMARY KEY (id, timestamp),
+            CONSTRAINT transaction_log_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user" (id)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    )
+    op.execute("ALTER SEQUENCE transaction_log_id_seq OWNED BY transaction_log.id")
+    op.execute(CREATE_PARTITIONS_SQL)
+
+    op.execute(
+        f"INSERT INTO transaction_log ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM transaction_log_unpartitioned"
+    )
+    op.drop_table('transaction_log_unpartitioned')
+    create_indexes_and_trigger()
+
+
+def downgrade():
+    op.rename_table('transaction_log', 'transaction_log_partitioned')
+    op.execute(
+        "ALTER TABLE transaction_log_partitioned "
+        "RENAME CONSTRAINT transaction_log_pkey TO transaction_log_partitioned_pkey"
+    )
+    op.execute("ALTER SEQUENCE transaction_log_id_seq RENAME TO transaction_log_partitioned_id_seq")
+    drop_indexes_and_trigger('transaction_log_partitioned')
+
+    op.execute(
+        """
+        CREATE TABLE transaction_log (
+            id integer GENERATED ALWAYS AS IDENTITY,
+            user_id integer NOT NULL,
+            trans_type transactiontype NOT NULL,
+            amount numeric NOT NULL,
+            opening_balance numeric NOT NULL,
+            new_balance numeric NOT NULL,
+            timestamp timestamp without time zone NOT NULL,
+            slot smallint NOT NULL DEFAULT 0,
+            CONSTRAINT transaction_log_pkey PRIMARY KEY (id),
+            CONSTRAINT transaction_log_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user" (id)
+        )
+        """
+    )
+    op.execute(
+        f"INSERT INTO transaction_log ({COLUMNS}) OVERRIDING SYSTEM VALUE "
+        f"SELECT {COLUMNS} FROM transaction_log_partitioned"
+    )
+    op.execute(
+        """
+        SELECT setval(
+            pg_get_serial_sequence('transaction_log', 'id'),
+            nextval('transaction_log_partitioned_id_seq'),
+            false
+        )
+        """
+    )
+    op.drop_table('transaction_log_partitioned')
+    create_indexes_and_trigger()
@@ -0,0 +1,183 @@
+"""balance slots
+
+Revision ID: ddb45a9676ab
+Revises: 2d0db5f5ee04
+Create Date: 2026-10-18 14:21:08.633470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ddb45a9676ab'
+down_revision = '2d0db5f5ee04'
+branch_labels = None
+depends_on = None
+
+
+# Slot-aware server-side transfer: locks every sender slot and a random
+# recipient slot (ascending user id, slot order), takes the amount from the
+# fullest sender slots first and writes one log row per slot used
+WALLET_TRANSFER_SQL = """
+CREATE OR REPLACE FUNCTION wallet_transfer(
+    sender_id integer,
+    recipient_id integer,
+    transfer_amount numeric,
+    transfer_timestamp timestamp,
+    OUT status text,
+    OUT sender_balance numeric,
+    OUT recipient_balance numeric
+) AS $$
+DECLARE
+    recipient_slot integer;
+    remaining numeric := transfer_amount;
+    debit numeric;
+    debited boolean := false;
+    account record;
+BEGIN
+    SELECT floor(random() * balance_slots) INTO recipient_slot
+    FROM "user" WHERE id = recipient_id;
+
+    PERFORM 1 FROM account_balance
+    WHERE user_id = sender_id OR (user_id = recipient_id AND slot = recipient_slot)
+    ORDER BY user_id, slot
+    FOR UPDATE;
+
+    SELECT sum(balance) INTO sender_balance FROM account_balance WHERE user_id = sender_id;
+    SELECT balance INTO recipient_balance FROM account_balance
+    WHERE user_id = recipient_id AND slot = recipient_slot;
+    IF sender_balance IS NULL OR recipient_balance IS NULL THEN
+        status := 'user_not_found';
+        sender_balance := NULL;
+        recipient_balance := NULL;
+        RETURN;
+    END IF;
+    IF transfer_amount > sender_balance THEN
+        status := 'insufficient_funds';
+        RETURN;
+    END IF;
+
+    -- Sender goes first so a self-transfer keeps a consistent chain
+    FOR account IN
+        SELECT slot, balance FROM account_balance
+        WHERE user_id = sender_id ORDER BY balance DESC, slot
+    LOOP
+        EXIT WHEN debited AND remaining <= 0;
+        debit := least(remaining, account.balance);
+        UPDATE account_balance SET balance = balance - debit
+        WHERE user_id = sender_id AND slot = account.slot;
+        INSERT INTO transaction_log
+            (user_id, slot, trans_type, amount, opening_balance, new_balance, timestamp)
+        VALUES (
+            sender_id, account.slot, 'TRANSFER_OUT', debit,
+            account.balance, account.balance - debit, transfer_timestamp
+        );
+        remaining := remaining - debit;
+        debited := true;
+    END LOOP;
+    sender_balance := sender_balance - transfer_amount;
+
+    UPDATE account_balance SET balance = balance + transfer_amount
+    WHERE user_id = recipient_id AND slot = recipient_slot
+    RETURNING balance INTO recipient_balance;
+    INSERT INTO transaction_log
+        (user_id, slot, trans_type, amount, opening_balance, new_balance, timestamp)
+    VALUES (
+        recipient_id, recipient_slot, 'TRANSFER_IN', transfer_amount,
+        recipient_balance - transfer_amount, recipient_balance, transfer_timestamp
+    );
+
+    status := 'done';
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Single balance server-side transfer (previous revision)
+WALLET_TRANSFER_SQL_PREV = """
+CREATE OR REPLACE FUNCTION wallet_transfer(
+    sender_id integer,
+    recipient_id integer,
+    transfer_amount numeric,
+    transfer_timestamp timestamp,
+    OUT status text,
+    OUT sender_balance numeric,
+    OUT recipient_balance numeric
+) AS $$
+BEGIN
+    PERFORM 1 FROM account_balance
+    WHERE user_id IN (sender_id, recipient_id)
+    ORDER BY user_id
+    FOR UPDATE;
+
+    SELECT balance INTO sender_balance FROM account_balance WHERE user_id = sender_id;
+    SELECT balance INTO recipient_balance FROM account_balance WHERE user_id = recipient_id;
+    IF sender_balance IS NULL OR recipient_balance IS NULL THEN
+        status := 'user_not_found';
+        sender_balance := NULL;
+        recipient_balance := NULL;
+        RETURN;
+    END IF;
+    IF transfer_amount > sender_balance THEN
+        status := 'insufficient_funds';
+        RETURN;
+    END IF;
+
+    UPDATE account_balance SET balance = balance - transfer_amount
+    WHERE user_id = sender_id
+    RETURNING balance INTO sender_balance;
+    INSERT INTO transaction_log
+        (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+    VALUES (
+        sender_id, 'TRANSFER_OUT', transfer_amount,
+        sender_balance + transfer_amount, sender_balance, transfer_timestamp
+    );
+
+    UPDATE account_balance SET balance = balance + transfer_amount
+    WHERE user_id = recipient_id
+    RETURNING balance INTO recipient_balance;
+    INSERT INTO transaction_log
+        (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+    VALUES (
+        recipient_id, 'TRANSFER_IN', transfer_amount,
+        recipient_balance - transfer_amount, recipient_balance, transfer_timestamp
+    );
+
+    status := 'done';
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column('user', sa.Column('balance_slots', sa.SmallInteger(), server_default='1', nullable=False))
+    op.add_column('transaction_log', sa.Column('slot', sa.SmallInteger(), server_default='0', nullable=False))
+    op.add_column('account_balance', sa.Column('slot', sa.SmallInteger(), server_default='0', autoincrement=False, nullable=False))
+    # ### end Alembic commands ###
+    op.drop_constraint('account_balance_pkey', 'account_balance', type_='primary')
+    op.create_primary_key('account_balance_pkey', 'account_balance', ['user_id', 'slot'])
+
+    op.execute(WALLET_TRANSFER_SQL)
+
+
+def downgrade():
+    op.execute(WALLET_TRANSFER_SQL_PREV)
+
+    # Merge every hot account back into a single balance
+    op.execute(
+        """
+        UPDATE account_balance SET balance = totals.balance
+        FROM (SELECT user_id, sum(balance) AS balance FROM account_balance GROUP BY user_id) AS totals
+        WHERE account_balance.user_id = totals.user_id AND account_balance.slot = 0
+        """
+    )
+    op.execute("DELETE FROM account_balance WHERE slot <> 0")
+    op.drop_constraint('account_balance_pkey', 'account_balance', type_='primary')
+    op.create_primary_key('account_balance_pkey', 'account_balance', ['user_id'])
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_column('account_balance', 'slot')
+    op.drop_column('transaction_log', 'slot')
+    op.drop_column('user', 'balance_slots')
+    # ### end Alembic commands ###
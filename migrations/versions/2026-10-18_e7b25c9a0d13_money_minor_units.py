@@ -0,0 +1,140 @@
+"""money minor units
+
+Revision ID: e7b25c9a0d13
+Revises: c4a91d2e7f58
+Create Date: 2026-10-18 23:58:47.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b25c9a0d13'
+down_revision = 'c4a91d2e7f58'
+branch_labels = None
+depends_on = None
+
+
+MONEY_COLUMNS = {
+    "transaction_log": ("amount", "opening_balance", "new_balance"),
+    "account_balance": ("balance",),
+    "balance_checkpoint": ("balance",),
+}
+
+# Server-side transfer (see the balance slots revision) with amounts of the
+# given type
+WALLET_TRANSFER_SQL = """
+CREATE OR REPLACE FUNCTION wallet_transfer(
+    sender_id integer,
+    recipient_id integer,
+    transfer_amount {money},
+    transfer_timestamp timestamp,
+    OUT status text,
+    OUT sender_balance {money},
+    OUT recipient_balance {money}
+) AS $$
+DECLARE
+    recipient_slot integer;
+    remaining {money} := transfer_amount;
+    debit {money};
+    debited boolean := false;
+    account record;
+BEGIN
+    SELECT floor(random() * balance_slots) INTO recipient_slot
+    FROM "user" WHERE id = recipient_id;
+
+    PERFORM 1 FROM account_balance
+    WHERE user_id = sender_id OR (user_id = recipient_id AND slot = recipient_slot)
+    ORDER BY user_id, slot
+    FOR UPDATE;
+
+    SELECT sum(balance) INTO sender_balance FROM account_balance WHERE user_id = sender_id;
+    SELECT balance INTO recipient_balance FROM account_balance
+    WHERE user_id = recipient_id AND slot = recipient_slot;
+    IF sender_balance IS NULL OR recipient_balance IS NULL THEN
+        status := 'user_not_found';
+        sender_balance := NULL;
+        recipient_balance := NULL;
+        RETURN;
+    END IF;
+    IF transfer_amount > sender_balance THEN
+        status := 'insufficient_funds';
+        RETURN;
+    END IF;
+
+    -- Sender goes first so a self-transfer keeps a consistent chain
+    FOR account IN
+        SELECT slot, balance FROM account_balance
+        WHERE user_id = sender_id ORDER BY balance DESC, slot
+    LOOP
+        EXIT WHEN debited AND remaining <= 0;
+        debit := least(remaining, account.balance);
+        UPDATE account_balance SET balance = balance - debit
+        WHERE user_id = sender_id AND slot = account.slot;
+        INSERT INTO transaction_log
+            (user_id, slot, trans_type, amount, opening_balance, new_balance, timestamp)
+        VALUES (
+            sender_id, account.slot, 'TRANSFER_OUT', debit,
+            account.balance, account.balance - debit, transfer_timestamp
+        );
+        remaining := remaining - debit;
+        debited := true;
+    END LOOP;
+    sender_balance := sender_balance - transfer_amount;
+
+    UPDATE account_balance SET balance = balance + transfer_amount
+    WHERE user_id = recipient_id AND slot = recipient_slot
+    RETURNING balance INTO recipient_balance;
+    INSERT INTO transaction_log
+        (user_id, slot, trans_type, amount, opening_balance, new_balance, timestamp)
+    VALUES (
+        recipient_id, recipient_slot, 'TRANSFER_IN', transfer_amount,
+        recipient_balance - transfer_amount, recipient_balance, transfer_timestamp
+    );
+
+    status := 'done';
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    # Amounts become BIGINT minor units (cents), which can't hold fractions of a cent
+    for table, columns in MONEY_COLUMNS.items():
+        fractional = " OR ".join(f"{column} * 100 <> trunc({column} * 100)" for column in columns)
+        op.execute(
+            f"""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM {table} WHERE {fractional}) THEN
+                    RAISE EXCEPTION '{table} holds amounts with fractions of a cent';
+                END IF;
+            END;
+            $$
+            """
+        )
+        op.execute(
+            f"ALTER TABLE {table} "
+            + ", ".join(
+                f"ALTER COLUMN {column} TYPE bigint USING ({column} * 100)::bigint"
+                for column in columns
+            )
+        )
+
+    op.execute("DROP FUNCTION wallet_transfer(integer, integer, numeric, timestamp)")
+    op.execute(WALLET_TRANSFER_SQL.format(money="bigint"))
+
+
+def downgrade():
+    op.execute("DROP FUNCTION wallet_transfer(integer, integer, bigint, timestamp)")
+    op.execute(WALLET_TRANSFER_SQL.format(money="numeric"))
+
+    for table, columns in MONEY_COLUMNS.items():
+        op.execute(
+            f"ALTER TABLE {table} "
+            + ", ".join(
+                f"ALTER COLUMN {column} TYPE numeric USING round({column} / 100.0, 2)"
+                for column in columns
+            )
+        )
@@ -2,12 +2,16 @@
 Pytest's fixtures.
 """
 import os
+from contextlib import contextmanager
 
 import pytest
 from flask_migrate import downgrade, Migrate, upgrade
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from wallet_api import create_app
 from wallet_api import db as _db
+from wallet_api.balance_cache import BalanceCache
 from wallet_api.common.configfetch import (
     BooleanValue,
     Configuration,
@@ -18,6 +22,7 @@ from wallet_api.common.configfetch import (
     TupleValue,
     Value,
 )
+from wallet_api.config import BalanceCacheConfig as cache_conf
 
 
 ALEMBIC_CONFIG_FILE = "./migrations/alembic.ini"
@@ -92,6 +97,52 @@ def db_session(db):
     connection.force_close()
 
 
+@pytest.fixture
+def balance_cache(app, tmp_path, monkeypatch):
+    """Enabled balance cache backed by a temporary file, its listener heard from."""
+    monkeypatch.setattr(cache_conf, "enabled", True)
+    monkeypatch.setattr(cache_conf, "path", str(tmp_path / "balance_cache"))
+    monkeypatch.setattr(cache_conf, "capacity", 100)
+    cache = BalanceCache()
+    monkeypatch.setattr("wallet_api.resources.user.balance_cache", cache)
+    # No listener thread: the tests invalidate the records themselves
+    monkeypatch.setattr(cache, "_listen", lambda app: None)
+    cache._ensure_started(app)
+    cache.heartbeat()
+
+    return cache
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Asserts the maximum number of SQL statements issued within a block, so
+    query count regressions of the endpoints fail the tests:
+
+        with max_queries(2):
+            client.get("/user/1/balance")
+    """
+
+    @contextmanager
+    def assert_max_queries(count: int):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+
+        assert len(statements) <= count, "{} queries issued (max {}):\n{}".format(
+            len(statements), count, "\n".join(statements)
+        )
+
+    return assert_max_queries
+
+
 # ----- Fixtures to test config via env-vars infra ----- #
 @pytest.fixture
 def config_env_vars_setup():
@@ -1,11 +1,52 @@
 """
 Set of tests for basic infra codebase.
 """
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 
-from wallet_api import create_app
+from wallet_api import create_app, retry_on_conflict
+from wallet_api.archive import ArchivedEntry, Segment, write_segment
+from wallet_api.balance_cache import BalanceCache
+from wallet_api.common import metrics
+from wallet_api.common.exception import ConflictException
+from wallet_api.common.json_provider import current_json, get_provider, JSONProvider, PROVIDERS
+from wallet_api.common.money import DecimalPlacesError, Money, ZERO
+from wallet_api.common.serializers import (
+    statement_entries_output_schema,
+    transfer_batch_input_schema,
+    transfer_batch_output_schema,
+    user_balance_output_schema,
+    user_input_schema,
+    user_transactions_input_schema,
+    user_transactions_output_schema,
+    user_transfer_input_schema,
+    UserBalanceOutputSchema,
+    UserTransferInputSchema,
+)
 from wallet_api.config import FlaskAppConfig as app_conf
 from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.models import BalanceCheckpoint, TransactionType
+from wallet_api.partitions import (
+    add_months,
+    list_detached_partitions,
+    list_partitions,
+    maintain,
+    Partition,
+    partition_for,
+)
+from wallet_api.pool import (
+    engine_options,
+    InstrumentedQueuePool,
+    pool_waits,
+    PoolWaits,
+    set_local_timeouts,
+)
+from wallet_api.seed import NOTIFY_TRIGGER, seed, SEED_EMAIL_DOMAIN, SeedOptions
 
 
 @pytest.mark.usefixtures("config_env_vars_setup")
@@ -105,6 +146,75 @@ class TestFlaskBase:
         assert test_app.config["SQLALCHEMY_DATABASE_URI"] == db_conf.connection_url(test=True)
         assert app.config["SQLALCHEMY_DATABASE_URI"] != test_app.config["SQLALCHEMY_DATABASE_URI"]
 
+    def test_transfer_isolation_level(self, monkeypatch):
+        """Test isolation level required by each transfer concurrency strategy."""
+        monkeypatch.setattr(db_conf, "transfer_strategy", "serializable")
+        assert db_conf.transfer_isolation_level() == "SERIALIZABLE"
+
+        monkeypatch.setattr(db_conf, "transfer_strategy", "row_lock")
+        assert db_conf.transfer_isolation_level() == "READ COMMITTED"
+
+    def test_engine_options(self, monkeypatch):
+        """Test connection pool options and server-side timeouts."""
+        monkeypatch.setattr(db_conf, "pool_size", 8)
+        monkeypatch.setattr(db_conf, "statement_timeout", 5000)
+        options = engine_options()
+
+        assert options["poolclass"] is InstrumentedQueuePool
+        assert options["pool_size"] == 8
+        assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+        # PgBouncer mode: no startup parameters
+        monkeypatch.setattr(db_conf, "pgbouncer", True)
+        assert "connect_args" not in engine_options()
+
+    def test_local_timeouts(self, app, monkeypatch):
+        """Test timeouts are set on every transaction in PgBouncer mode."""
+        monkeypatch.setattr(db_conf, "pgbouncer", True)
+        monkeypatch.setattr(db_conf, "lock_timeout", 1500)
+        engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"], **engine_options())
+        set_local_timeouts(engine)
+
+        with engine.connect() as connection:
+            for _ in range(2):
+                with connection.begin():
+                    lock_timeout = connection.scalar("SELECT current_setting('lock_timeout')")
+                    assert lock_timeout == "1500ms"
+        engine.dispose()
+
+    def test_pool_metrics(self, app):
+        """Test connection pool usage metrics."""
+        engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"], **engine_options())
+        waits = sum(sum(counts) for counts, _ in metrics.db_pool_wait_seconds.collect().values())
+
+        with engine.connect():
+            assert metrics.db_pool_checked_out.collect()[()] == 1
+        assert metrics.db_pool_checked_out.collect()[()] == 0
+        assert (
+            sum(sum(counts) for counts, _ in metrics.db_pool_wait_seconds.collect().values())
+            == waits + 1
+        )
+        engine.dispose()
+
+    def test_pool_waits(self, app):
+        """Test connection waits tracking."""
+        waits = PoolWaits()
+        with waits.waiting():
+            assert waits.count() == 1
+            assert waits.longest(1) < 1
+        assert waits.count() == 0
+
+        # Finished waits only count within the window
+        waits.last = (waits.last[0] - 2, 5.0)
+        assert waits.longest(60) == 5.0
+        assert waits.longest(1) == 0
+
+        engine = create_engine(app.config["SQLALCHEMY_DATABASE_URI"], **engine_options())
+        end = pool_waits.last[0]
+        with engine.connect():
+            assert pool_waits.last[0] > end
+        engine.dispose()
+
     def test_client(self, client):
         """Test FLask's test client."""
         # Checking invalid path
@@ -114,3 +224,497 @@ class TestFlaskBase:
         # Checking valid path
         resp = client.get("/health/live")
         assert resp.status_code == 200
+
+
+class TestRetryOnConflict:
+    """Test the `retry_on_conflict` view decorator."""
+
+    @staticmethod
+    def conflict_error(sqlstate: str) -> OperationalError:
+        """Builds the error raised by SQLAlchemy on a concurrency conflict."""
+        orig = type("DBAPIError", (Exception,), {"pgcode": sqlstate})()
+        return OperationalError("COMMIT", {}, orig)
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        """Disables waiting between re-runs."""
+        monkeypatch.setattr(db_conf, "conflict_backoff_base", 0)
+        monkeypatch.setattr(db_conf, "conflict_max_retries", 3)
+
+    def test_retries_until_success(self, app):
+        """Test the view is re-run until its transaction succeeds."""
+        calls = []
+
+        @retry_on_conflict
+        def view():
+            calls.append(None)
+            if len(calls) < 3:
+                raise self.conflict_error("40001" if len(calls) == 1 else "40P01")
+            return "done"
+
+        retries_before = sum(metrics.db_conflict_retries.collect().values())
+        with app.test_request_context():
+            assert view() == "done"
+
+        assert len(calls) == 3
+        assert sum(metrics.db_conflict_retries.collect().values()) == retries_before + 2
+
+    def test_retries_exhausted(self, app):
+        """Test a conflict error is raised once the maximum number of retries is reached."""
+        calls = []
+
+        @retry_on_conflict
+        def view():
+            calls.append(None)
+            raise self.conflict_error("40001")
+
+        with app.test_request_context(), pytest.raises(ConflictException):
+            view()
+
+        assert len(calls) == 4
+
+    def test_other_errors_not_retried(self, app):
+        """Test errors other than concurrency conflicts are raised straight away."""
+        calls = []
+
+        @retry_on_conflict
+        def view():
+            calls.append(None)
+            raise self.conflict_error("23505")
+
+        with app.test_request_context(), pytest.raises(OperationalError):
+            view()
+
+        assert len(calls) == 1
+
+
+class TestMoney:
+    """Test the money type and serializer field."""
+
+    def test_parse(self):
+        """Test amounts are parsed into minor units."""
+        assert Money.parse("12.5").cents == 1250
+        assert Money.parse("-0.01").cents == -1
+        assert Money.parse("7").cents == 700
+        assert Money.parse("1.2300").cents == 123
+        assert Money.parse("1e2").cents == 10000
+        assert Money.parse(3.25).cents == 325
+        for value in ("abc", "", "nan", "inf", True):
+            with pytest.raises(ValueError):
+                Money.parse(value)
+        with pytest.raises(DecimalPlacesError):
+            Money.parse("1.001")
+        with pytest.raises(OverflowError):
+            Money.parse("1e20")
+
+    def test_arithmetic(self):
+        """Test formatting, comparisons and arithmetic."""
+        assert str(Money(-1250)) == "-12.50"
+        assert str(Money(5)) == "0.05"
+        assert repr(ZERO) == "Money('0.00')"
+        assert Money(100) + Money(50) - Money(25) == Money(125)
+        assert sum((Money(1), Money(2)), ZERO) == Money(3)
+        assert Money(1) > ZERO > -Money(1)
+        assert not ZERO
+        assert Money(100) != 100
+
+    def test_field(self):
+        """Test the field error messages and the dumped format."""
+        schema = UserTransferInputSchema()
+
+        assert schema.load({"toUserId": 1, "amount": "10.5"}).data["amount"] == Money(1050)
+        for amount, error in (
+            ("1.001", "No more than 2 decimal digits allowed"),
+            ("abc", "Not a valid number."),
+            ("1e20", "Amount out of range."),
+            ("-1", "Must be at least 0."),
+        ):
+            assert schema.load({"toUserId": 1, "amount": amount}).errors == {"amount": [error]}
+        assert UserBalanceOutputSchema().dump({"userId": 1, "balance": Money(20)}).data == {
+            "userId": 1,
+            "balance": "0.20",
+        }
+
+
+class TestCompiledSchemas:
+    """Test the compiled serializers match their marshmallow schemas."""
+
+    @pytest.mark.parametrize(
+        "compiled,data",
+        [
+            (user_input_schema, {"name": "A", "email": "a@email.com", "init_balance": "1.5"}),
+            (user_input_schema, {"name": "A", "email": "a@email.com"}),
+            (user_transfer_input_schema, {"toUserId": 1, "amount": 2}),
+            (
+                transfer_batch_input_schema,
+                {"transfers": [{"fromUserId": 1, "toUserId": 2, "amount": "1.00"}] * 2},
+            ),
+            (
+                user_transactions_input_schema,
+                {"limit": "10", "type": "deposit", "from": "2000-01-01T00:00:00"},
+            ),
+        ],
+    )
+    def test_load(self, compiled, data):
+        """Test valid data is loaded by the fast path as by the schema."""
+        assert compiled._load(data) == compiled.schema.__class__().load(data).data
+        assert compiled.load(data) == compiled.schema.__class__().load(data)
+
+    @pytest.mark.parametrize(
+        "compiled,data",
+        [
+            (user_input_schema, {"name": None, "email": "invalid", "init_balance": "1.001"}),
+            (user_input_schema, ["not", "a", "dict"]),
+            (user_transfer_input_schema, {"toUserId": "x", "amount": "-1"}),
+            (user_transfer_input_schema, {}),
+            (transfer_batch_input_schema, {"transfers": [{"fromUserId": 1}, {"amount": "a"}]}),
+            (transfer_batch_input_schema, {"transfers": [], "mode": "other"}),
+            (user_transactions_input_schema, {"cursor": "invalid", "limit": 0}),
+        ],
+    )
+    def test_load_errors(self, compiled, data):
+        """Test invalid data gets the schema's errors, without counting it as a fallback."""
+        fallbacks = sum(metrics.serialization_fallbacks.collect().values())
+        result = compiled.load(data)
+
+        assert result.errors
+        assert result.errors == compiled.schema.__class__().load(data).errors
+        assert sum(metrics.serialization_fallbacks.collect().values()) == fallbacks
+
+    def test_unexpected_fallback(self, monkeypatch, caplog):
+        """Test unexpected fast path failures are logged and counted before falling back."""
+        key = ("UserBalanceOutputSchema", "dump")
+        fallbacks = metrics.serialization_fallbacks.collect().get(key, 0)
+
+        def failing_dump(obj, native=False):
+            raise AttributeError("bug")
+
+        monkeypatch.setattr(user_balance_output_schema, "_dump", failing_dump)
+        result = user_balance_output_schema.dump({"userId": 1, "balance": Money(5)})
+
+        assert result.data == {"userId": 1, "balance": "0.05"}
+        assert metrics.serialization_fallbacks.collect()[key] == fallbacks + 1
+        assert "Compiled dump of UserBalanceOutputSchema failed" in caplog.text
+
+    def test_dump(self):
+        """Test objects are dumped by the fast path as by the schemas."""
+        entry = ArchivedEntry(
+            1, 2, 0, TransactionType.DEPOSIT, Money(5), ZERO, Money(5), datetime(2000, 1, 1)
+        )
+        results = [{"status": "done"}, {"status": "failed", "error": "Insufficient funds"}]
+        cases = (
+            (user_balance_output_schema, {"userId": 1, "balance": Money(5)}),
+            (user_transactions_output_schema, {"userId": 2, "transactions": [entry], "next": None}),
+            (transfer_batch_output_schema, {"status": "partial", "results": results}),
+            (statement_entries_output_schema, [entry, entry]),
+        )
+        for compiled, obj in cases:
+            many = compiled.many
+            fast = compiled._dump_many(obj) if many else compiled._dump(obj)
+
+            assert fast == compiled.schema.__class__(many=many).dump(obj).data
+            assert compiled.dump(obj).data == fast
+
+
+class TestJSONProviders:
+    """Test the JSON providers."""
+
+    @pytest.fixture(params=sorted(PROVIDERS))
+    def provider(self, request):
+        return get_provider(request.param)
+
+    def test_dumps(self, provider):
+        """Test money amounts, decimals and date-times encoding."""
+        obj = {
+            "b": Money(1250),
+            "a": Decimal("0.5"),
+            "naive": datetime(2000, 1, 1),
+            "aware": datetime(2000, 1, 1, 1, tzinfo=timezone(timedelta(hours=1))),
+            1: ["é"],
+        }
+
+        assert json.loads(provider.dumps(obj)) == {
+            "b": "12.50",
+            "a": "0.5",
+            "naive": "2000-01-01T00:00:00+00:00",
+            "aware": "2000-01-01T01:00:00+01:00",
+            "1": ["é"],
+        }
+        assert provider.dumps({"b": 1, "a": 2}, sort_keys=True) == b'{"a":2,"b":1}'
+        assert provider.dumps([1], indent=True) == b"[\n  1\n]"
+        with pytest.raises(TypeError):
+            provider.dumps({"a": object()})
+
+    def test_loads(self, provider):
+        """Test decoding of raw and decoded documents."""
+        assert provider.loads('{"a": [1, "é"]}'.encode()) == {"a": [1, "é"]}
+        assert provider.loads('{"a": 1.5}') == {"a": 1.5}
+        with pytest.raises(ValueError):
+            provider.loads(b"{invalid")
+
+    def test_native_dump(self, provider):
+        """Test native dumps are encoded as the formatted ones."""
+        entry = ArchivedEntry(
+            1, 2, 0, TransactionType.DEPOSIT, Money(5), ZERO, Money(5), datetime(2000, 1, 1)
+        )
+        obj = {"userId": 2, "transactions": [entry], "next": (datetime(2000, 1, 1), 1)}
+        native = user_transactions_output_schema.dump(obj, native=True).data
+
+        assert native["transactions"][0]["amount"] == Money(5)
+        assert json.loads(provider.dumps(native)) == user_transactions_output_schema.dump(obj).data
+
+    def test_request_json(self, app, provider):
+        """Test request bodies decoding."""
+        with app.test_request_context(json={"a": 1}):
+            assert provider.request_json() == {"a": 1}
+            assert provider.request_json() == {"a": 1}
+        with app.test_request_context(data="{invalid", content_type="application/json"):
+            assert provider.request_json() is None
+        with app.test_request_context(data='{"a": 1}', content_type="text/plain"):
+            assert provider.request_json() is None
+
+    def test_get_provider(self, app):
+        """Test the default backend and unknown backends."""
+        assert get_provider().name == "orjson"
+        with app.app_context():
+            assert current_json.name == "orjson"
+        with pytest.raises(ValueError):
+            get_provider("unknown")
+        with pytest.raises(TypeError):
+            JSONProvider()
+
+
+class TestBalanceCache:
+    """Test the shared-memory balance cache."""
+
+    def test_fill_and_lookup(self, app, balance_cache):
+        """Test a filled record is served until invalidated."""
+        assert balance_cache.get(5, lambda _: Money.parse("12.34")) == Money.parse("12.34")
+        assert balance_cache.lookup(5)[0] == Money.parse("12.34")
+
+        balance_cache.invalidate(5)
+        assert balance_cache.lookup(5)[0] is None
+
+    def test_stale_fill_discarded(self, app, balance_cache):
+        """Test a balance loaded before an invalidation is not cached."""
+        balance_cache.get(5, lambda _: None)
+        _, version = balance_cache.lookup(5)
+
+        balance_cache.invalidate(5)
+        balance_cache.fill(5, version, Money.parse("1.00"))
+        assert balance_cache.lookup(5)[0] is None
+
+    def test_clear(self, app, balance_cache):
+        """Test clearing the cache invalidates every record."""
+        balance_cache.get(5, lambda _: Money.parse("1.00"))
+        balance_cache.get(6, lambda _: Money.parse("2.00"))
+
+        balance_cache.clear()
+        assert balance_cache.lookup(5)[0] is None
+        assert balance_cache.lookup(6)[0] is None
+
+    def test_listener_down(self, app, balance_cache):
+        """Test the cache is bypassed while nobody listens to the balance changes."""
+        balance_cache.get(5, lambda _: Money.parse("1.00"))
+        balance_cache.heartbeat(False)
+
+        assert balance_cache.lookup(5) == (None, -1)
+        assert balance_cache.get(5, lambda _: Money.parse("2.00")) == Money.parse("2.00")
+
+    def test_previous_run_cleared(self, app, balance_cache, monkeypatch):
+        """Test a cache file left over by a previous run isn't served."""
+        balance_cache.get(5, lambda _: Money.parse("1.00"))
+        cache = BalanceCache()
+        monkeypatch.setattr(cache, "_listen", lambda app: None)
+        cache._ensure_started(app)
+
+        assert cache.lookup(5) == (None, -1)
+        cache.heartbeat()
+        assert cache.lookup(5)[0] is None
+
+    def test_out_of_capacity(self, app, balance_cache):
+        """Test user Ids beyond the cache capacity always miss."""
+        balance_cache.get(101, lambda _: Money.parse("1.00"))
+        assert balance_cache.lookup(101) == (None, -1)
+
+
+class TestSeed:
+    """Test the synthetic data generator."""
+
+    @pytest.fixture
+    def seeded(self, db):
+        """Seeds a small dataset with two workers, removed afterwards."""
+        options = SeedOptions(users=30, transfers=300, chunk_rows=100, random_seed=1)
+        rows = seed(options, workers=2)
+
+        yield rows
+
+        users = f"SELECT id FROM \"user\" WHERE email LIKE '%@{SEED_EMAIL_DOMAIN}'"
+        for table in ("transaction_log", "account_balance"):
+            db.session.execute(f"DELETE FROM {table} WHERE user_id IN ({users})")
+        db.session.execute(f"DELETE FROM \"user\" WHERE email LIKE '%@{SEED_EMAIL_DOMAIN}'")
+        db.session.commit()
+
+    def test_before_checkpoint(self, db, monkeypatch):
+        """Test transfers aren't dated before the latest balance checkpoint."""
+        monkeypatch.setattr(BalanceCheckpoint, "latest", lambda: datetime.utcnow())
+
+        with pytest.raises(ValueError):
+            seed(SeedOptions(users=2, transfers=1, days=1))
+
+    def test_dataset(self, db, seeded):
+        """Test users, deposits and transfers (two entries each) are created."""
+        assert seeded == 30 + 300 * 2
+        assert (
+            db.session.execute(
+                f"SELECT count(*) FROM \"user\" WHERE email LIKE '%@{SEED_EMAIL_DOMAIN}'"
+            ).scalar()
+            == 30
+        )
+        assert not db.session.execute(
+            f"SELECT tgenabled = 'D' FROM pg_trigger WHERE tgname = '{NOTIFY_TRIGGER}'"
+        ).scalar()
+
+    def test_balances_chained(self, db, seeded):
+        """Test every entry starts from the previous balance of the user."""
+        unchained = db.session.execute(
+            """
+            SELECT count(*) FROM (
+                SELECT opening_balance,
+                    lag(new_balance, 1, 0.0) OVER (PARTITION BY user_id ORDER BY id) AS previous
+                FROM transaction_log
+            ) AS entries
+            WHERE opening_balance <> previous
+            """
+        ).scalar()
+        stale = db.session.execute(
+            """
+            SELECT count(*) FROM account_balance
+            JOIN (
+                SELECT DISTINCT ON (user_id) user_id, new_balance
+                FROM transaction_log ORDER BY user_id, id DESC
+            ) AS latest USING (user_id)
+            WHERE balance <> new_balance
+            """
+        ).scalar()
+
+        assert unchained == 0
+        assert stale == 0
+
+
+class TestPartitions:
+    """Test the transaction log partitions maintenance."""
+
+    @pytest.fixture
+    def old_partitions(self, db):
+        """Names of the partitions made for the tests, removed afterwards."""
+        names = [f"transaction_log_2000_0{month}" for month in (1, 2, 3)]
+
+        yield names
+
+        db.session.rollback()
+        for name in names:
+            db.session.execute(f"DROP TABLE IF EXISTS {name}")
+        db.session.commit()
+
+    def test_months(self):
+        """Test month arithmetic and partition ranges."""
+        assert add_months(date(2020, 11, 1), 3) == date(2021, 2, 1)
+        assert add_months(date(2020, 1, 1), -1) == date(2019, 12, 1)
+        assert partition_for(date(2020, 2, 29)) == Partition(
+            "transaction_log_2020_02", date(2020, 2, 1), date(2020, 3, 1)
+        )
+
+    def test_maintain(self, db, old_partitions):
+        """Test upcoming partitions are created and expired ones detached."""
+        current = partition_for(datetime.utcnow())
+        assert current in list_partitions()
+
+        # Current and next month, only the missing ones
+        assert maintain(ahead=1, today=date(2000, 1, 15)) == {
+            "created": old_partitions[:2],
+            "detached": [],
+        }
+        assert maintain(ahead=1, today=date(2000, 1, 15))["created"] == []
+
+        # Retains February only, January is kept as a plain table
+        assert maintain(ahead=0, retain=1, today=date(2000, 2, 10)) == {
+            "created": [],
+            "detached": old_partitions[:1],
+        }
+        names = [partition.name for partition in list_partitions()]
+        assert old_partitions[0] not in names
+        assert old_partitions[1] in names and current.name in names
+        assert list_detached_partitions() == [partition_for(date(2000, 1, 1))]
+
+        # Dropped
+        assert maintain(ahead=0, retain=1, drop=True, today=date(2000, 3, 10)) == {
+            "created": old_partitions[2:],
+            "detached": old_partitions[1:2],
+        }
+
+
+class TestArchive:
+    """Test the archive segment files."""
+
+    @pytest.fixture
+    def entries(self):
+        """Entries of three users (sorted by user, timestamp and Id)."""
+        start = datetime(2000, 1, 1)
+        rows = (
+            (1, 1, "DEPOSIT", 1000, start),
+            (2, 1, "TRANSFER_OUT", 1, start + timedelta(hours=1)),
+            (3, 2, "DEPOSIT", 550, start),
+            (4, 2, "TRANSFER_IN", 123456789, start + timedelta(hours=2)),
+            (5, 2, "TRANSFER_OUT", 100, start + timedelta(hours=2)),
+            (6, 3, "DEPOSIT", 700, start + timedelta(microseconds=1)),
+        )
+        return [
+            (entry_id, user_id, 0, trans_type, amount, 0, amount, timestamp)
+            for entry_id, user_id, trans_type, amount, timestamp in rows
+        ]
+
+    def test_segment(self, tmp_path, entries):
+        """Test entries are written and found back by user and time range."""
+        path = str(tmp_path / "segment.col")
+        write_segment(path, len(entries), iter(entries))
+        segment = Segment(path)
+        start = entries[0][-1]
+
+        def ids(*args, **kwargs):
+            return [segment.entry(index).id for index in segment.find(*args, **kwargs)]
+
+        assert segment.rows == 6
+        assert segment.entry(3) == ArchivedEntry(
+            4,
+            2,
+            0,
+            TransactionType.TRANSFER_IN,
+            Money.parse("1234567.89"),
+            ZERO,
+            Money.parse("1234567.89"),
+            start + timedelta(hours=2),
+        )
+        assert segment.entry(5).timestamp == start + timedelta(microseconds=1)
+        assert ids(2) == [3, 4, 5]
+        assert ids(2, since=start + timedelta(hours=1)) == [4, 5]
+        assert ids(2, until=start + timedelta(hours=2)) == [3]
+        assert ids(2, before=(start + timedelta(hours=2), 5)) == [3, 4]
+        assert ids(4) == []
+
+    def test_invalid_entries(self, tmp_path, entries):
+        """Test row count mismatches are rejected."""
+        path = tmp_path / "segment.col"
+        with pytest.raises(ValueError):
+            write_segment(str(path), len(entries) + 1, iter(entries))
+        assert not path.exists()
+
+
+def test_histogram():
+    """Test histogram buckets and sum."""
+    histogram = metrics.Histogram("test_histogram", "Test histogram", ("label",), (1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, label="a")
+
+    assert histogram.collect() == {("a",): [[2, 1, 1], 14.5]}
+    metrics.REGISTRY.unregister(histogram.metric)
@@ -1,12 +1,15 @@
 """
 Data fixtures used to test API endpoints.
 """
-from datetime import datetime
-from decimal import Decimal
+from datetime import date, datetime, timedelta
 
 import pytest
 
-from wallet_api.models import TransactionLog, TransactionType, User
+from wallet_api.archive import archive_history
+from wallet_api.common.money import Money, ZERO
+from wallet_api.config import ArchiveConfig as archive_conf
+from wallet_api.models import AccountBalance, TransactionLog, TransactionType, User
+from wallet_api.partitions import create_partitions
 
 
 @pytest.fixture
@@ -18,12 +21,13 @@ def user_view_init_data(db_session):
         TransactionLog(
             user_id=1,
             trans_type=TransactionType.DEPOSIT,
-            amount=Decimal("0.0"),
-            opening_balance=Decimal("0.0"),
-            new_balance=Decimal("0.0"),
+            amount=ZERO,
+            opening_balance=ZERO,
+            new_balance=ZERO,
             timestamp=datetime.utcnow(),
         )
     )
+    db_session.add(AccountBalance(user_id=1, balance=ZERO))
 
     # Second user
     db_session.add(User(id=2, name="Jane Doe", email="jane@email.com"))
@@ -31,11 +35,81 @@ def user_view_init_data(db_session):
         TransactionLog(
             user_id=2,
             trans_type=TransactionType.DEPOSIT,
-            amount=Decimal("200.0"),
-            opening_balance=Decimal("0.0"),
-            new_balance=Decimal("200.0"),
+            amount=Money.parse("200.00"),
+            opening_balance=ZERO,
+            new_balance=Money.parse("200.00"),
             timestamp=datetime.utcnow(),
         )
     )
+    db_session.add(AccountBalance(user_id=2, balance=Money.parse("200.00")))
 
     db_session.commit()
+
+
+@pytest.fixture
+def user_history_data(db_session, user_view_init_data):
+    """
+    Add ten daily entries of 1.00 to the first user (the last three on the
+    same day), following its initial deposit.
+
+    :return: Date-time of the first entry.
+    """
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    for day in range(10):
+        db_session.add(
+            TransactionLog(
+                user_id=1,
+                trans_type=TransactionType.DEPOSIT if day % 2 else TransactionType.TRANSFER_IN,
+                amount=Money.parse("1.00"),
+                opening_balance=Money(day * 100),
+                new_balance=Money((day + 1) * 100),
+                timestamp=start + timedelta(days=min(day, 7)),
+            )
+        )
+    db_session.commit()
+
+    return start
+
+
+@pytest.fixture
+def archived_history_data(db_session, user_history_data, tmp_path, monkeypatch):
+    """
+    Add three debits of 2.50 (the second one a charge) to the first user in
+    January 2000, the first two on the same date-time, and archive them.
+
+    :return: Names of the archived partitions.
+    """
+    monkeypatch.setattr(archive_conf, "path", str(tmp_path))
+    create_partitions(date(2000, 1, 1), date(2000, 1, 1))
+    for day in range(3):
+        db_session.add(
+            TransactionLog(
+                user_id=1,
+                trans_type=TransactionType.CHARGE if day == 1 else TransactionType.WITHDRAWAL,
+                amount=Money.parse("2.50"),
+                opening_balance=Money(1000 - day * 250),
+                new_balance=Money(750 - day * 250),
+                timestamp=datetime(2000, 1, 10 + max(day, 1), 12),
+            )
+        )
+    db_session.commit()
+
+    return archive_history(retain=1, today=date(2000, 2, 15))
+
+
+@pytest.fixture
+def aio_client(db):
+    """
+    Test client of the ASGI variant of the API. Its asyncpg connections commit
+    on their own, so every row is deleted afterwards.
+    """
+    from starlette.testclient import TestClient
+
+    from wallet_api.aio import create_app
+
+    with TestClient(create_app(test=True)) as client:
+        yield client
+
+    with db.engine.begin() as connection:
+        for table in ("transaction_log", "account_balance", '"user"'):
+            connection.execute(f"DELETE FROM {table}")
@@ -0,0 +1,123 @@
+"""
+Set of tests for the admission control and the readiness probe.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from wallet_api.admission import controller
+from wallet_api.common import metrics
+from wallet_api.config import AdmissionConfig as admission_conf
+from wallet_api.partitions import add_months, month_start, partition_for, PartitionsMonitor
+from wallet_api.pool import pool_waits
+
+
+@pytest.fixture
+def slow_pool(monkeypatch):
+    """Pool whose connections are waited for over the wait budget."""
+    monkeypatch.setattr(admission_conf, "pool_wait_budget", 0.5)
+    monkeypatch.setattr(pool_waits, "longest", lambda window: 1.0)
+
+
+@pytest.mark.usefixtures("user_view_init_data")
+class TestAdmission:
+    """Group of tests for the admission control."""
+
+    def test_admitted(self, client):
+        """Test admitted requests are released, failing ones included."""
+        assert client.get("/user/2/balance").status_code == 200
+        assert client.get("/user/99/balance").status_code == 403
+        assert controller.in_flight == 0
+
+    def test_in_flight_limit(self, client, monkeypatch):
+        """Test requests over the in-flight limit are shed."""
+        monkeypatch.setattr(admission_conf, "max_in_flight", 1)
+        monkeypatch.setattr(controller, "in_flight", 1)
+        shed = metrics.admission_rejected.collect().get(("app.user_transfer", "in_flight"), 0)
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+        assert resp.get_json() == {"Error": "Service overloaded, retry later"}
+        assert metrics.admission_rejected.collect()[("app.user_transfer", "in_flight")] == shed + 1
+        assert controller.in_flight == 1
+        assert client.get("/health/live").status_code == 200
+
+    @pytest.mark.usefixtures("slow_pool")
+    def test_pool_wait_budget(self, client, monkeypatch):
+        """Test requests are shed while the pool is saturated, but prioritized reads."""
+        assert client.post("/user/2/transfer", json={"toUserId": 1}).status_code == 503
+        assert client.get("/user/2/balance").status_code == 503
+
+        monkeypatch.setattr(admission_conf, "prioritize_reads", True)
+        assert client.get("/user/2/balance").status_code == 200
+        assert client.post("/user/2/transfer", json={"toUserId": 1}).status_code == 503
+
+    def test_pool_waiting_limit(self, client, monkeypatch):
+        """Test requests are shed while too many wait for a connection."""
+        monkeypatch.setattr(admission_conf, "max_pool_waiting", 1)
+        with pool_waits.waiting():
+            assert client.get("/user/2/balance").status_code == 503
+        assert client.get("/user/2/balance").status_code == 200
+
+
+@pytest.mark.usefixtures("db_session")
+class TestHealthReady:
+    """Group of tests for `/health/ready` endpoint."""
+
+    @pytest.fixture(autouse=True)
+    def partitions_monitor(self, monkeypatch):
+        """Partitions monitor without checker thread (checked by the tests)."""
+        partitions_monitor = PartitionsMonitor()
+        monkeypatch.setattr(partitions_monitor, "_run", lambda app: None)
+        monkeypatch.setattr("wallet_api.resources.health.partitions_monitor", partitions_monitor)
+
+        return partitions_monitor
+
+    def test_ready(self, client, partitions_monitor, max_queries):
+        """Test a worker not saturated is ready, without querying the database."""
+        partitions_monitor.check()
+        with max_queries(0):
+            resp = client.get("/health/ready")
+
+        assert resp.status_code == 200
+        assert resp.get_json()["status"] == "OK"
+        assert resp.get_json()["inFlight"] == 0
+        assert resp.get_json()["poolWaiting"] == 0
+
+    @pytest.mark.usefixtures("slow_pool")
+    def test_saturated(self, client):
+        """Test a saturated worker isn't ready."""
+        resp = client.get("/health/ready")
+
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "1"
+        assert resp.get_json()["status"] == "Saturated"
+        assert resp.get_json()["reason"] == "pool_wait"
+
+    def test_missing_partitions(self, client, db_session, partitions_monitor):
+        """Test a worker isn't ready once the next month's partition is missing."""
+        next_month = partition_for(add_months(month_start(datetime.utcnow().date()), 1))
+        db_session.execute(f"ALTER TABLE transaction_log DETACH PARTITION {next_month.name}")
+        partitions_monitor.check()
+        resp = client.get("/health/ready")
+
+        assert resp.status_code == 503
+        assert resp.get_json()["status"] == "Unavailable"
+        assert resp.get_json()["reason"] == "partitions"
+        assert resp.get_json()["missingPartitions"] == [next_month.name]
+
+    def test_partitions_check_failed(self, client, partitions_monitor, monkeypatch):
+        """Test a failed partitions check keeps the last result."""
+        partitions_monitor.missing = ["transaction_log_2000_01"]
+
+        def failing_check(ahead):
+            raise OperationalError("SELECT ...", {}, Exception())
+
+        monkeypatch.setattr("wallet_api.partitions.missing_partitions", failing_check)
+        partitions_monitor.check()
+        resp = client.get("/health/ready")
+
+        assert resp.status_code == 503
+        assert resp.get_json()["missingPartitions"] == ["transaction_log_2000_01"]
@@ -0,0 +1,101 @@
+"""
+Set of test for the asynchronous (ASGI) variant of the user endpoints.
+"""
+from decimal import Decimal
+
+import pytest
+
+
+@pytest.fixture
+def aio_users(aio_client):
+    """Add a couple of users through the ASGI app."""
+    users = [
+        {"name": "John Doe", "email": "john@email.com"},
+        {"name": "Jane Doe", "email": "jane@email.com", "init_balance": "200.00"},
+    ]
+    return [aio_client.post("/user", json=user).json()["userId"] for user in users]
+
+
+class TestAioUserView:
+    """Group of tests for `/user` endpoint."""
+
+    def test_valid_user(self, aio_client):
+        """Test valid input data."""
+        resp = aio_client.post("/user", json={"name": "Valid Name", "email": "valid@email.com"})
+
+        assert resp.status_code == 201
+        assert "userId" in resp.json()
+
+    def test_existing_user(self, aio_client, aio_users):
+        """Test user creation with an email already taken."""
+        resp = aio_client.post("/user", json={"name": "John", "email": "john@email.com"})
+
+        assert resp.status_code == 403
+        assert resp.json() == {"Error": "User already exists"}
+
+    def test_invalid_input(self, aio_client):
+        """Test invalid input data."""
+        resp = aio_client.post("/user", json={"name": "Invalid Name", "email": "invalid"})
+
+        assert resp.status_code == 400
+        assert "email" in resp.json()["InputDataErrors"]
+
+
+class TestAioUserBalanceView:
+    """Group of tests for `/user/<id>/balance` endpoint."""
+
+    def test_existing_user(self, aio_client, aio_users):
+        """Test retrieving balance of existing user."""
+        resp = aio_client.get(f"/user/{aio_users[1]}/balance")
+
+        assert resp.status_code == 200
+        assert Decimal(resp.json()["balance"]) == Decimal("200.00")
+
+    def test_inexistent_user(self, aio_client):
+        """Test retrieving balance of inexistent user."""
+        resp = aio_client.get("/user/10/balance")
+
+        assert resp.status_code == 403
+        assert resp.json() == {"Error": "User not found"}
+
+
+class TestAioUserTransferView:
+    """Group of tests for `/user/<id>/transfer` endpoint."""
+
+    def test_valid_transfer(self, aio_client, aio_users):
+        """Test valid transfer."""
+        john, jane = aio_users
+        resp = aio_client.post(f"/user/{jane}/transfer", json={"toUserId": john, "amount": "50"})
+
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "done"
+
+        resp = aio_client.get(f"/user/{john}/balance")
+        assert Decimal(resp.json()["balance"]) == Decimal("50.00")
+        resp = aio_client.get(f"/user/{jane}/balance")
+        assert Decimal(resp.json()["balance"]) == Decimal("150.00")
+
+    def test_insufficient_funds(self, aio_client, aio_users):
+        """Test transfer exceeding the sender balance."""
+        john, jane = aio_users
+        resp = aio_client.post(f"/user/{john}/transfer", json={"toUserId": jane, "amount": "1"})
+
+        assert resp.status_code == 403
+        assert resp.json() == {"Error": "Insufficient funds"}
+
+    def test_inexistent_recipient(self, aio_client, aio_users):
+        """Test transfer to inexistent user."""
+        resp = aio_client.post(
+            f"/user/{aio_users[1]}/transfer", json={"toUserId": 0, "amount": "1"}
+        )
+
+        assert resp.status_code == 403
+        assert resp.json() == {"Error": "User not found"}
+
+
+def test_health_live(aio_client):
+    """Test liveness probe."""
+    resp = aio_client.get("/health/live")
+
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "OK"}
@@ -0,0 +1,52 @@
+"""
+Set of test for the metrics endpoint and requests instrumentation.
+"""
+import pytest
+
+from wallet_api.common import metrics
+
+
+def histogram_count(histogram: metrics.Histogram, *labels: str) -> int:
+    """Number of values observed by a histogram."""
+    value = histogram.collect().get(labels)
+    return sum(value[0]) if value else 0
+
+
+@pytest.mark.usefixtures("user_view_init_data")
+class TestMetricsView:
+    """Group of tests for `/metrics` endpoint."""
+
+    def test_exposition(self, client):
+        """Test metrics are exposed in the Prometheus text format."""
+        client.get("/user/2/balance")
+        resp = client.get("/metrics")
+
+        assert resp.status_code == 200
+        assert resp.content_type.startswith("text/plain")
+        assert b'wallet_http_requests_total{endpoint="app.user_balance"' in resp.data
+        assert b"wallet_http_request_duration_seconds_bucket" in resp.data
+
+    def test_request_metrics(self, client):
+        """Test per-request latency, status, database and serialization metrics."""
+        endpoint = "app.user_balance"
+        requests = metrics.http_requests.collect().get((endpoint, "GET", "200"), 0)
+        latencies = histogram_count(metrics.http_request_seconds, endpoint, "GET")
+        queries = metrics.db_request_queries.collect().get((endpoint,), [[], 0])[1]
+        serializations = histogram_count(metrics.serialization_seconds, endpoint)
+
+        client.get("/user/2/balance")
+
+        assert metrics.http_requests.collect()[(endpoint, "GET", "200")] == requests + 1
+        assert histogram_count(metrics.http_request_seconds, endpoint, "GET") == latencies + 1
+        assert metrics.db_request_queries.collect()[(endpoint,)][1] == queries + 1
+        assert histogram_count(metrics.serialization_seconds, endpoint) == serializations + 1
+
+    def test_transfer_outcomes(self, client):
+        """Test transfers are counted by outcome."""
+        outcomes = metrics.transfers.collect()
+        client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+        client.post("/user/1/transfer", json={"toUserId": 2, "amount": "500.00"})
+        client.post("/user/2/transfer", json={"toUserId": 10, "amount": "1.00"})
+
+        for outcome in ("done", "insufficient_funds", "user_not_found"):
+            assert metrics.transfers.collect()[(outcome,)] == outcomes.get((outcome,), 0) + 1
@@ -0,0 +1,92 @@
+"""
+Set of test for the SQL statements issued by the endpoints.
+"""
+import logging
+
+import pytest
+
+from wallet_api.config import SQLProfilerConfig as profiler_conf
+
+
+#: Maximum number of SQL statements issued per request of each endpoint.
+QUERY_BUDGETS = [
+    ("get", "/user/2/balance", None, 1),
+    ("get", "/user/2/transactions", None, 1),
+    ("post", "/user/2/transfer", {"toUserId": 1, "amount": "5.00"}, 4),
+    (
+        "post",
+        "/transfers/batch",
+        {"transfers": [{"fromUserId": 2, "toUserId": 1, "amount": "1.00"}] * 2},
+        3,
+    ),
+    ("get", "/health/live", None, 0),
+]
+
+
+@pytest.fixture
+def profiler(app, monkeypatch):
+    """Enabled SQL profiler."""
+    monkeypatch.setattr(profiler_conf, "enabled", True)
+    # Alembic's logging configuration disables the existing loggers
+    monkeypatch.setattr(app.logger, "disabled", False)
+
+
+class TestQueryBudgets:
+    """Group of tests for the number of queries issued by the endpoints."""
+
+    def test_create_user(self, client, db_session, max_queries):
+        """Test a user is created in a single statement."""
+        with max_queries(1):
+            resp = client.post("/user", json={"name": "Valid Name", "email": "valid@email.com"})
+
+        assert resp.status_code == 201
+
+    @pytest.mark.usefixtures("user_view_init_data")
+    @pytest.mark.parametrize("method, url, data, budget", QUERY_BUDGETS)
+    def test_endpoints(self, client, max_queries, method, url, data, budget):
+        """Test the endpoints stay within their queries budget."""
+        with max_queries(budget):
+            resp = getattr(client, method)(url, json=data)
+
+        assert resp.status_code == 200
+
+
+@pytest.mark.usefixtures("user_view_init_data")
+class TestSQLProfiler:
+    """Group of tests for the per-request SQL profiler."""
+
+    def test_server_timing(self, app, client, monkeypatch):
+        """Test the `Server-Timing` header is only returned in debug mode."""
+        resp = client.get("/user/2/balance")
+
+        assert "Server-Timing" not in resp.headers
+
+        monkeypatch.setattr(app, "debug", True)
+        resp = client.get("/user/2/balance")
+
+        assert resp.headers["Server-Timing"].startswith("db;dur=")
+        assert resp.headers["Server-Timing"].endswith('desc="1 queries"')
+
+    @pytest.mark.usefixtures("profiler")
+    def test_over_budget(self, client, caplog, monkeypatch):
+        """Test requests exceeding the queries budget are logged."""
+        client.get("/user/2/balance")
+
+        assert not caplog.records
+
+        monkeypatch.setattr(profiler_conf, "query_budget", 0)
+        with caplog.at_level(logging.WARNING):
+            client.get("/user/2/balance")
+
+        assert "GET app.user_balance over budget: 1 queries" in caplog.text
+        assert "FROM account_balance" in caplog.text
+
+    @pytest.mark.usefixtures("profiler")
+    def test_repeated_statements(self, client, caplog, monkeypatch):
+        """Test statements executed repeatedly within a request are logged."""
+        monkeypatch.setattr(profiler_conf, "repeated_threshold", 2)
+        with caplog.at_level(logging.WARNING):
+            client.post("/user/2/transfer", json={"toUserId": 1, "amount": "5.00"})
+
+        assert "POST app.user_transfer possible N+1: statement executed 2 times" in caplog.text
+        assert "INSERT INTO transaction_log" in caplog.text
@@ -0,0 +1,110 @@
+"""
+Set of test for the transfer endpoints.
+"""
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from wallet_api.common.money import Money
+from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.models import AccountBalance, TransactionLog
+
+
+@pytest.mark.usefixtures("user_view_init_data")
+class TestTransferBatchView:
+    """Group of tests for `/transfers/batch` endpoint."""
+
+    def test_valid_batch(self, client):
+        """Test a batch of valid transfers."""
+        data_input = {
+            "transfers": [
+                {"fromUserId": 2, "toUserId": 1, "amount": "150.00"},
+                {"fromUserId": 1, "toUserId": 2, "amount": "100.00"},
+            ]
+        }
+        resp = client.post("/transfers/batch", json=data_input)
+
+        assert resp.status_code == 200
+        assert resp.json["status"] == "done"
+        assert [r["status"] for r in resp.json["results"]] == ["done", "done"]
+
+        assert AccountBalance.total_for(1) == Money.parse("50.00")
+        assert AccountBalance.total_for(2) == Money.parse("150.00")
+        assert TransactionLog.latest_for(1) == Money.parse("50.00")
+        assert TransactionLog.latest_for(2) == Money.parse("150.00")
+
+    def test_atomic_batch_with_failures(self, client):
+        """Test an all-or-nothing batch is aborted by a single failing transfer."""
+        data_input = {
+            "transfers": [
+                {"fromUserId": 2, "toUserId": 1, "amount": "50.00"},
+                {"fromUserId": 1, "toUserId": 2, "amount": "100.00"},
+            ]
+        }
+        resp = client.post("/transfers/batch", json=data_input)
+
+        assert resp.status_code == 200
+        assert resp.json["status"] == "failed"
+        assert resp.json["results"][0] == {"status": "aborted"}
+        assert resp.json["results"][1] == {"status": "failed", "error": "Insufficient funds"}
+
+        assert AccountBalance.total_for(2) == Money.parse("200.00")
+
+    def test_best_effort_batch_with_failures(self, client):
+        """Test a best-effort batch only skips the failing transfers."""
+        data_input = {
+            "mode": "best_effort",
+            "transfers": [
+                {"fromUserId": 2, "toUserId": 1, "amount": "50.00"},
+                {"fromUserId": 1, "toUserId": 2, "amount": "100.00"},
+                {"fromUserId": 2, "toUserId": 10, "amount": "1.00"},
+            ],
+        }
+        resp = client.post("/transfers/batch", json=data_input)
+
+        assert resp.status_code == 200
+        assert resp.json["status"] == "partial"
+        assert [r["status"] for r in resp.json["results"]] == ["done", "failed", "failed"]
+        assert resp.json["results"][2]["error"] == "User not found"
+
+        assert AccountBalance.total_for(1) == Money.parse("50.00")
+        assert AccountBalance.total_for(2) == Money.parse("150.00")
+
+    def test_deadlock_retried(self, client, monkeypatch):
+        """Test a batch aborted by a deadlock is re-run with its request body."""
+        monkeypatch.setattr(db_conf, "conflict_backoff_base", 0)
+        transfer_many = AccountBalance.transfer_many
+        calls = []
+
+        def conflicting_transfer_many(transfers):
+            calls.append(None)
+            if len(calls) == 1:
+                orig = type("DBAPIError", (Exception,), {"pgcode": "40P01"})()
+                raise OperationalError("SELECT ... FOR UPDATE", {}, orig)
+            return transfer_many(transfers)
+
+        monkeypatch.setattr(AccountBalance, "transfer_many", conflicting_transfer_many)
+        data_input = {"transfers": [{"fromUserId": 2, "toUserId": 1, "amount": "50.00"}]}
+        resp = client.post("/transfers/batch", json=data_input)
+
+        assert resp.status_code == 200
+        assert resp.json["status"] == "done"
+        assert len(calls) == 2
+        assert AccountBalance.total_for(1) == Money.parse("50.00")
+
+    def test_invalid_request_data(self, client):
+        """Test with invalid input data."""
+        for invalid_data in (
+            {"transfers": []},
+            {"transfers": [{"fromUserId": 2, "toUserId": 1, "amount": "30.005"}]},
+            {"transfers": [{"fromUserId": 2, "toUserId": 1, "amount": "1"}], "mode": "other"},
+        ):
+            resp = client.post("/transfers/batch", json=invalid_data)
+
+            assert resp.status_code == 400
+
+        for body in ("null", "not json"):
+            resp = client.post("/transfers/batch", data=body, content_type="application/json")
+
+            assert resp.status_code == 400
+            assert resp.json == {"InputDataErrors": {"_schema": ["Invalid type."]}}
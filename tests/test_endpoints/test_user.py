@@ -1,7 +1,29 @@
 """
 Set of test for the user endpoints.
 """
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
 import pytest
+from sqlalchemy.exc import OperationalError
+
+from wallet_api import db
+from wallet_api.archive import archive_history
+from wallet_api.common import metrics
+from wallet_api.common.money import Money, ZERO
+from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.models import (
+    AccountBalance,
+    BalanceCheckpoint,
+    TransactionLog,
+    TransactionType,
+    Transfer,
+)
+from wallet_api.partitions import create_partitions, list_detached_partitions, maintain
 
 
 class TestUserView:
@@ -66,6 +88,36 @@ class TestUserBalanceView:
         assert resp.status_code == 403
         assert b"User not found" in resp.data
 
+    def test_cached_balance(self, client, balance_cache):
+        """Test balance reads are served by the cache after a first miss."""
+        hits = metrics.balance_cache_hits.collect().get((), 0)
+        misses = metrics.balance_cache_misses.collect().get((), 0)
+
+        for _ in range(3):
+            resp = client.get(f"/user/2/balance")
+
+            assert resp.status_code == 200
+            assert Decimal(resp.json["balance"]) == Decimal("200.00")
+
+        assert metrics.balance_cache_misses.collect()[()] == misses + 1
+        assert metrics.balance_cache_hits.collect()[()] == hits + 2
+
+    def test_cached_balance_invalidated(self, client, balance_cache):
+        """Test an invalidated balance is read again from the database."""
+        client.get(f"/user/2/balance")
+        AccountBalance.query.filter_by(user_id=2).update({"balance": Money.parse("150.00")})
+        balance_cache.invalidate(2)
+        resp = client.get(f"/user/2/balance")
+
+        assert Decimal(resp.json["balance"]) == Decimal("150.00")
+
+    def test_cached_inexistent_user(self, client, balance_cache):
+        """Test inexistent users are not cached."""
+        resp = client.get(f"/user/10/balance")
+
+        assert resp.status_code == 403
+        assert balance_cache.lookup(10)[0] is None
+
 
 @pytest.mark.usefixtures("user_view_init_data")
 class TestUserTransferView:
@@ -89,6 +141,139 @@ class TestUserTransferView:
 
         assert b"150.00" in resp.data
 
+    def test_valid_transfer_row_lock(self, client, monkeypatch):
+        """Test valid transfer with the row-locking concurrency strategy."""
+        monkeypatch.setattr(db_conf, "transfer_strategy", "row_lock")
+        data_input = {"toUserId": 1, "amount": "50.00"}
+        resp = client.post("/user/2/transfer", json=data_input)
+
+        assert resp.status_code == 200
+        assert b"done" in resp.data
+
+        resp = client.get(f"/user/2/balance")
+
+        assert b"150.00" in resp.data
+
+    def test_stored_function_transfer(self, client, monkeypatch):
+        """Test transfers made by the server-side database function."""
+        monkeypatch.setattr(db_conf, "transfer_strategy", "stored_function")
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+
+        assert resp.status_code == 200
+        assert b"done" in resp.data
+        assert AccountBalance.total_for(1) == Money.parse("50.00")
+        assert TransactionLog.latest_for(2) == Money.parse("150.00")
+
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "300.00"})
+
+        assert resp.status_code == 403
+        assert b"Insufficient funds" in resp.data
+
+        resp = client.post("/user/2/transfer", json={"toUserId": 10, "amount": "1.00"})
+
+        assert resp.status_code == 403
+        assert b"User not found" in resp.data
+
+    def test_group_commit_transfer(self, client, monkeypatch):
+        """Test transfers applied by the group commit thread."""
+        monkeypatch.setattr(db_conf, "transfer_group_commit", True)
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+
+        assert resp.status_code == 200
+        assert b"done" in resp.data
+        assert AccountBalance.total_for(1) == Money.parse("50.00")
+        assert TransactionLog.latest_for(2) == Money.parse("150.00")
+
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "300.00"})
+
+        assert resp.status_code == 403
+        assert b"Insufficient funds" in resp.data
+
+    def test_group_commit_lock_conflict(self, client, monkeypatch):
+        """Test a group is re-run when it conflicts while locking the balances."""
+        monkeypatch.setattr(db_conf, "transfer_group_commit", True)
+        monkeypatch.setattr(db_conf, "conflict_backoff_base", 0)
+        transfer_many = AccountBalance.transfer_many
+        calls = []
+
+        def conflicting_transfer_many(transfers):
+            calls.append(None)
+            if len(calls) == 1:
+                orig = type("DBAPIError", (Exception,), {"pgcode": "40P01"})()
+                raise OperationalError("SELECT ... FOR UPDATE", {}, orig)
+            return transfer_many(transfers)
+
+        monkeypatch.setattr(AccountBalance, "transfer_many", conflicting_transfer_many)
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+
+        assert resp.status_code == 200
+        assert b"done" in resp.data
+        assert len(calls) == 2
+        assert AccountBalance.total_for(1) == Money.parse("50.00")
+
+    def test_group_commit_retries_exhausted(self, client, monkeypatch):
+        """Test a group that keeps conflicting gets a 409 as the other transfers."""
+        monkeypatch.setattr(db_conf, "transfer_group_commit", True)
+        monkeypatch.setattr(db_conf, "conflict_max_retries", 1)
+        monkeypatch.setattr(db_conf, "conflict_backoff_base", 0)
+
+        def conflict(transfers):
+            orig = type("DBAPIError", (Exception,), {"pgcode": "40P01"})()
+            raise OperationalError("SELECT ... FOR UPDATE", {}, orig)
+
+        monkeypatch.setattr(AccountBalance, "transfer_many", conflict)
+        exhausted = metrics.db_conflict_exhausted.collect().get(("group_commit",), 0)
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+
+        assert resp.status_code == 409
+        assert resp.json == {"Error": "Transaction aborted by concurrent updates, retry later"}
+        assert metrics.db_conflict_exhausted.collect()[("group_commit",)] == exhausted + 1
+        assert AccountBalance.total_for(1) == Money.parse("0.00")
+
+    @pytest.mark.parametrize("stage", ["lock", "commit"])
+    def test_conflict_retries_exhausted(self, client, monkeypatch, stage):
+        """Test a transfer that keeps conflicting gets a 409 wherever the conflict happens."""
+        monkeypatch.setattr(db_conf, "transfer_strategy", "row_lock")
+        monkeypatch.setattr(db_conf, "conflict_max_retries", 1)
+        monkeypatch.setattr(db_conf, "conflict_backoff_base", 0)
+
+        def conflict(*args, **kwargs):
+            orig = type("DBAPIError", (Exception,), {"pgcode": "40P01"})()
+            raise OperationalError(stage, {}, orig)
+
+        if stage == "lock":
+            monkeypatch.setattr(AccountBalance, "fetch_for_transfer", conflict)
+        else:
+            monkeypatch.setattr(db.session, "commit", conflict)
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "50.00"})
+
+        assert resp.status_code == 409
+        assert resp.json == {"Error": "Transaction aborted by concurrent updates, retry later"}
+
+    def test_self_transfer(self, client):
+        """Test a transfer to the sender itself leaves its balance untouched."""
+        data_input = {"toUserId": 2, "amount": "50.00"}
+        resp = client.post("/user/2/transfer", json=data_input)
+
+        assert resp.status_code == 200
+
+        resp = client.get(f"/user/2/balance")
+
+        assert Decimal(resp.json["balance"]) == Decimal("200.00")
+
+    def test_balance_matches_transaction_log(self, client):
+        """Test materialized balances are kept in sync with the transaction log."""
+        data_input = {"toUserId": 1, "amount": "20.00"}
+        resp = client.post("/user/2/transfer", json=data_input)
+
+        assert resp.status_code == 200
+
+        for user_id in (1, 2):
+            latest_balance = TransactionLog.latest_for(user_id)
+            assert AccountBalance.total_for(user_id) == latest_balance
+
+        assert TransactionLog.latest_for(10) is None
+
     def test_invalid_request_data(self, client):
         """Test with invalid input data (more than 2 decimals)."""
         invalid_data = {"toUserId": 1, "amount": "30.005"}
@@ -120,3 +305,316 @@ class TestUserTransferView:
 
         assert resp.status_code == 403
         assert b"User not found" in resp.data
+
+
+@pytest.mark.usefixtures("user_view_init_data")
+class TestUserBulkView:
+    """Group of tests for `/users/bulk` endpoint."""
+
+    def test_ndjson(self, client):
+        """Test NDJSON input with duplicate and invalid rows."""
+        data_input = "\n".join(
+            (
+                '{"name": "New User", "email": "new@email.com", "init_balance": "10.00"}',
+                '{"name": "John Doe", "email": "john@email.com"}',
+                '{"name": "Invalid", "email": "invalid_email"}',
+                "not json",
+                '{"name": "New User", "email": "new@email.com"}',
+            )
+        )
+        resp = client.post("/users/bulk", data=data_input, content_type="application/x-ndjson")
+
+        assert resp.status_code == 200
+        assert resp.json["created"] == 1
+        assert [(r["line"], r["status"]) for r in resp.json["rejected"]] == [
+            (2, "duplicate"),
+            (3, "invalid"),
+            (4, "invalid"),
+            (5, "duplicate"),
+        ]
+        assert "email" in resp.json["rejected"][1]["errors"]
+
+        account = AccountBalance.query.filter(AccountBalance.user_id > 2).one()
+        assert account.balance == Money.parse("10.00")
+        assert TransactionLog.latest_for(account.user_id) == Money.parse("10.00")
+
+    def test_csv(self, client):
+        """Test CSV input."""
+        data_input = "name,email,init_balance\nUser A,a@email.com,\nUser B,b@email.com,5.50\n"
+        resp = client.post("/users/bulk", data=data_input, content_type="text/csv")
+
+        assert resp.status_code == 200
+        assert resp.json == {"created": 2, "rejected": []}
+
+    def test_column_limits(self, client):
+        """Test rows exceeding the column limits are rejected without aborting the rest."""
+        data_input = "\n".join(
+            (
+                json.dumps({"name": "N" * 51, "email": "long.name@email.com"}),
+                json.dumps({"name": "Long Email", "email": "e" * 250 + "@email.com"}),
+                json.dumps({"name": "N" * 50, "email": "valid@email.com"}),
+            )
+        )
+        resp = client.post("/users/bulk", data=data_input, content_type="application/x-ndjson")
+
+        assert resp.status_code == 200
+        assert resp.json["created"] == 1
+        assert [(r["line"], list(r["errors"])) for r in resp.json["rejected"]] == [
+            (1, ["name"]),
+            (2, ["email"]),
+        ]
+
+
+@pytest.mark.usefixtures("user_view_init_data")
+class TestHotAccountTransfers:
+    """Group of tests for transfers involving hot accounts (balance split in slots)."""
+
+    @pytest.fixture
+    def hot_account(self, db_session):
+        """Splits the balance of the second user into three slots (50, 100, 50)."""
+        AccountBalance.set_slots(2, 3, datetime.utcnow())
+        for account, balance in zip(AccountBalance.fetch(2)[2], ("50", "100", "50")):
+            account.balance = Money.parse(balance)
+        db_session.commit()
+
+    @pytest.mark.parametrize("strategy", ["serializable", "stored_function"])
+    def test_outgoing_transfer(self, client, monkeypatch, hot_account, strategy):
+        """Test outgoing transfers take the amount from several slots."""
+        monkeypatch.setattr(db_conf, "transfer_strategy", strategy)
+        resp = client.post("/user/2/transfer", json={"toUserId": 1, "amount": "180.00"})
+
+        assert resp.status_code == 200
+        assert b"done" in resp.data
+        assert [a.balance for a in AccountBalance.fetch(2)[2]] == [ZERO, ZERO, Money.parse("20.00")]
+        assert AccountBalance.total_for(1) == Money.parse("180.00")
+
+        resp = client.get(f"/user/2/balance")
+
+        assert Decimal(resp.json["balance"]) == Decimal("20.00")
+
+    @pytest.mark.parametrize("strategy", ["serializable", "stored_function"])
+    def test_incoming_transfers(self, client, monkeypatch, hot_account, strategy):
+        """Test incoming transfers land in a single slot."""
+        monkeypatch.setattr(db_conf, "transfer_strategy", strategy)
+        client.post("/user/2/transfer", json={"toUserId": 1, "amount": "100.00"})
+        for _ in range(5):
+            resp = client.post("/user/1/transfer", json={"toUserId": 2, "amount": "20.00"})
+
+            assert b"done" in resp.data
+
+        assert AccountBalance.total_for(1) == Money.parse("0.00")
+        assert AccountBalance.total_for(2) == Money.parse("200.00")
+
+    def test_batch_locks_one_recipient_slot(self, db_session, hot_account):
+        """Test batched transfers to a hot account only lock (and credit) one of its slots."""
+        db_session.expunge_all()
+        timestamp = datetime.utcnow()
+        transfers = [Transfer(1, 2, ZERO, timestamp), Transfer(1, 2, ZERO, timestamp)]
+        rows, errors = AccountBalance.transfer_many(transfers)
+
+        assert errors == [None, None]
+        locked = [a for a in db_session.identity_map.values() if isinstance(a, AccountBalance)]
+        assert sorted(a.user_id for a in locked) == [1, 2]
+        assert {row["slot"] for row in rows if row["user_id"] == 2} == {
+            account.slot for account in locked if account.user_id == 2
+        }
+
+    def test_merge_slots(self, db_session, hot_account):
+        """Test merging the slots of a hot account keeps its balance."""
+        AccountBalance.set_slots(2, 1, datetime.utcnow())
+        db_session.commit()
+
+        assert [a.balance for a in AccountBalance.fetch(2)[2]] == [Money.parse("200.00")]
+        assert TransactionLog.latest_for(2) == Money.parse("200.00")
+
+
+@pytest.mark.usefixtures("user_history_data")
+class TestUserTransactionsView:
+    """Group of tests for `/user/<id>/transactions` endpoint."""
+
+    def test_pages(self, client):
+        """Test walking the pages returns every entry once, newest first."""
+        entries, cursor = [], None
+        for _ in range(4):
+            query = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            resp = client.get("/user/1/transactions", query_string=query)
+
+            assert resp.status_code == 200
+            assert resp.json["userId"] == 1
+            entries.extend(resp.json["transactions"])
+            cursor = resp.json["next"]
+            if cursor is None:
+                break
+
+        assert len(entries) == 11
+        assert len({entry["id"] for entry in entries}) == 11
+        assert [entry["balance"] for entry in entries] == [
+            *(f"{balance}.00" for balance in range(10, 0, -1)),
+            "0.00",  # Initial deposit
+        ]
+        assert set(entries[0]) == {"id", "type", "amount", "balance", "timestamp"}
+
+    def test_filters(self, client, user_history_data):
+        """Test filtering by transaction type and date range."""
+        resp = client.get("/user/1/transactions", query_string={"type": "transfer_in"})
+
+        assert {entry["type"] for entry in resp.json["transactions"]} == {"transfer_in"}
+        assert len(resp.json["transactions"]) == 5
+
+        query = {
+            "from": (user_history_data + timedelta(days=1)).isoformat(),
+            "to": (user_history_data + timedelta(days=3)).isoformat() + "+00:00",
+        }
+        resp = client.get("/user/1/transactions", query_string=query)
+
+        assert [entry["balance"] for entry in resp.json["transactions"]] == ["3.00", "2.00"]
+        assert resp.json["next"] is None
+
+    def test_invalid_query(self, client):
+        """Test invalid query string parameters."""
+        for query in ({"limit": 0}, {"cursor": "invalid"}, {"type": "unknown"}, {"from": "x"}):
+            resp = client.get("/user/1/transactions", query_string=query)
+
+            assert resp.status_code == 400
+
+    def test_inexistent_user(self, client):
+        """Test retrieving transactions of inexistent user."""
+        resp = client.get("/user/10/transactions")
+
+        assert resp.status_code == 403
+        assert b"User not found" in resp.data
+
+
+@pytest.mark.usefixtures("user_history_data")
+class TestUserStatementView:
+    """Group of tests for `/user/<id>/statement` endpoint."""
+
+    def test_ndjson(self, client):
+        """Test NDJSON statement in chronological order."""
+        resp = client.get("/user/1/statement")
+
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert resp.mimetype == "application/x-ndjson"
+        entries = [json.loads(line) for line in resp.data.decode().splitlines()]
+        assert [entry["balance"] for entry in entries] == [
+            "0.00",
+            *(f"{balance}.00" for balance in range(1, 11)),
+        ]
+        assert entries[1]["openingBalance"] == "0.00"
+
+    def test_csv(self, client, user_history_data):
+        """Test CSV statement filtered by date range."""
+        query = {"format": "csv", "from": (user_history_data + timedelta(days=7)).isoformat()}
+        resp = client.get("/user/1/statement", query_string=query)
+
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/csv"
+        rows = list(csv.DictReader(io.StringIO(resp.data.decode())))
+        assert [row["balance"] for row in rows] == ["8.00", "9.00", "10.00"]
+        assert rows[0]["type"] == "deposit"
+
+    def test_gzip(self, client):
+        """Test statement compressed when accepted by the client."""
+        resp = client.get("/user/1/statement", headers={"Accept-Encoding": "gzip"})
+
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert len(gzip.decompress(resp.data).decode().splitlines()) == 11
+
+    def test_invalid_query(self, client):
+        """Test invalid query string parameters."""
+        resp = client.get("/user/1/statement", query_string={"format": "xml"})
+
+        assert resp.status_code == 400
+
+    def test_inexistent_user(self, client):
+        """Test retrieving the statement of inexistent user."""
+        resp = client.get("/user/10/statement")
+
+        assert resp.status_code == 403
+        assert b"User not found" in resp.data
+
+
+@pytest.mark.usefixtures("archived_history_data")
+class TestArchivedHistory:
+    """Group of tests for the history endpoints over archived transactions."""
+
+    def test_archived(self, db_session, archived_history_data, tmp_path):
+        """Test the archived month is moved to a segment file and checkpointed."""
+        assert archived_history_data == ["transaction_log_2000_01"]
+        assert [path.name for path in tmp_path.iterdir()] == ["transaction_log_2000_01.col"]
+        assert TransactionLog.query.filter_by(user_id=1).count() == 11
+        checkpoints = [(c.as_of, c.user_id, c.slot, c.balance) for c in BalanceCheckpoint.query]
+        assert checkpoints == [(datetime(2000, 2, 1), 1, 0, Money.parse("2.50"))]
+
+    def test_archived_once(self, db_session, tmp_path):
+        """Test a month recreated after being archived isn't archived over its segment."""
+        segment = tmp_path / "transaction_log_2000_01.col"
+        archived = segment.read_bytes()
+        create_partitions(date(2000, 1, 1), date(2000, 1, 1))
+
+        with pytest.raises(ValueError):
+            archive_history(retain=1, today=date(2000, 2, 15))
+        assert segment.read_bytes() == archived
+
+    def test_detached_archived(self, db_session, tmp_path):
+        """Test a month detached by the partitions maintenance is archived."""
+        create_partitions(date(2000, 2, 1), date(2000, 2, 1))
+        db_session.add(
+            TransactionLog(
+                user_id=1,
+                trans_type=TransactionType.DEPOSIT,
+                amount=Money.parse("1.00"),
+                opening_balance=Money.parse("2.50"),
+                new_balance=Money.parse("3.50"),
+                timestamp=datetime(2000, 2, 3),
+            )
+        )
+        db_session.commit()
+        assert maintain(ahead=0, retain=1, today=date(2000, 3, 10))["detached"] == [
+            "transaction_log_2000_02"
+        ]
+
+        assert archive_history(retain=1, today=date(2000, 3, 15)) == ["transaction_log_2000_02"]
+        assert (tmp_path / "transaction_log_2000_02.col").exists()
+        assert list_detached_partitions() == []
+        checkpoint = BalanceCheckpoint.query.filter_by(as_of=datetime(2000, 3, 1)).one()
+        assert checkpoint.balance == Money.parse("3.50")
+
+    def test_pages(self, client):
+        """Test pages go on through the archived entries, newest first."""
+        entries, cursor = [], None
+        for _ in range(4):
+            query = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+            resp = client.get("/user/1/transactions", query_string=query)
+
+            assert resp.status_code == 200
+            entries.extend(resp.json["transactions"])
+            cursor = resp.json["next"]
+            if cursor is None:
+                break
+
+        assert len({entry["id"] for entry in entries}) == 14
+        assert [entry["balance"] for entry in entries[-4:]] == ["0.00", "2.50", "5.00", "7.50"]
+        assert entries[-3]["type"] == "withdrawal"
+        assert entries[-3]["timestamp"] == "2000-01-12T12:00:00+00:00"
+
+    def test_filters(self, client):
+        """Test filtering archived entries by transaction type and date range."""
+        resp = client.get("/user/1/transactions", query_string={"type": "charge"})
+
+        assert [entry["balance"] for entry in resp.json["transactions"]] == ["5.00"]
+
+        query = {"from": "2000-01-11T12:00:00", "to": "2000-01-12T00:00:00"}
+        resp = client.get("/user/1/transactions", query_string=query)
+
+        assert [entry["balance"] for entry in resp.json["transactions"]] == ["5.00", "7.50"]
+
+    def test_statement(self, client):
+        """Test the statement starts with the archived entries."""
+        resp = client.get("/user/1/statement")
+
+        entries = [json.loads(line) for line in resp.data.decode().splitlines()]
+        assert len(entries) == 14
+        assert [entry["balance"] for entry in entries[:4]] == ["7.50", "5.00", "2.50", "0.00"]
+        assert entries[0]["openingBalance"] == "10.00"
@@ -1,12 +1,19 @@
 import logging
 import os
+import random
+import time
 from functools import wraps
+from typing import Optional
 
-from flask import current_app, Flask
+from flask import current_app, Flask, g, request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
 
+from wallet_api.common import exception, metrics
+from wallet_api.common.json_provider import get_provider
 from wallet_api.config import FlaskAppConfig as flask_conf
 from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.pool import engine_options, set_local_timeouts
 
 
 db = SQLAlchemy()
@@ -28,6 +35,7 @@ def create_app(test: bool = False) -> Flask:
             # SQLAlchemy specific settings
             "SQLALCHEMY_DATABASE_URI": db_conf.connection_url(),
             "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "SQLALCHEMY_ENGINE_OPTIONS": engine_options(),
         }
     )
     if test:
@@ -39,11 +47,16 @@ def create_app(test: bool = False) -> Flask:
             }
         )
 
+    # JSON encoding of the responses and decoding of the request bodies
+    app.extensions["json_provider"] = get_provider(flask_conf.json_backend)
+
     # Logging config
     app.logger.setLevel(logging.DEBUG if app.config["DEBUG"] else logging.INFO)
 
     # Initializes database
     db.init_app(app)
+    if db_conf.pgbouncer:
+        set_local_timeouts(db.get_engine(app))
 
     # Registering blueprints
     from wallet_api.routes import app_bp
@@ -73,3 +86,81 @@ def db_isolation_level(level: str):
         return view_wrapper
 
     return decorator
+
+
+# PostgreSQL SQLSTATEs of transactions aborted by a concurrency conflict
+# (serialization_failure, deadlock_detected), which are safe to re-run.
+CONFLICT_SQLSTATES = ("40001", "40P01")
+
+
+def db_conflict_sqlstate(error: Exception) -> Optional[str]:
+    """
+    Gets the SQLSTATE of a database error caused by a concurrency conflict.
+
+    :param error: Exception raised by SQLAlchemy.
+    :return: The error SQLSTATE or `None` if it isn't a concurrency conflict.
+    """
+    sqlstate = getattr(getattr(error, "orig", None), "pgcode", None)
+    return sqlstate if sqlstate in CONFLICT_SQLSTATES else None
+
+
+def conflict_backoff(attempt: int) -> float:
+    """
+    Gets the jittered exponential backoff to wait before re-running a
+    transaction aborted by a concurrency conflict.
+
+    :param attempt: Number of re-runs already made.
+    :return: Delay (seconds).
+    """
+    backoff = min(db_conf.conflict_backoff_max, db_conf.conflict_backoff_base * 2**attempt)
+    return random.uniform(0, backoff)
+
+
+def db_conflict_retryable(error: Exception) -> bool:
+    """
+    Checks whether `error` must be re-raised to the `retry_on_conflict`
+    decorator of the view, which re-runs it or, once the retries are
+    exhausted, answers with a `ConflictException`. Views that handle database
+    errors themselves must re-raise the retryable ones, so a conflict gets the
+    same outcome wherever it happens (locking, querying or committing).
+
+    :param error: Exception raised by SQLAlchemy.
+    :return: `True` if the error must be re-raised. `False` otherwise.
+    """
+    return db_conflict_sqlstate(error) is not None and "conflict_retries_left" in g
+
+
+def retry_on_conflict(view):
+    """
+    Flask view decorator to re-run a view whose database transaction was
+    aborted by a concurrency conflict (SQLSTATE 40001/40P01), waiting a
+    jittered exponential backoff between runs. Once the retries are exhausted
+    the conflict is answered with a `409` (`ConflictException`). Must wrap
+    `db_isolation_level` so every run sets the isolation level on its new
+    transaction.
+
+    :param view: view function.
+    :return: decorated view funcion.
+    """
+
+    @wraps(view)
+    def view_wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            g.conflict_retries_left = db_conf.conflict_max_retries - attempt
+            try:
+                return view(*args, **kwargs)
+            except SQLAlchemyError as e:
+                sqlstate = db_conflict_sqlstate(e)
+                if sqlstate is None:
+                    raise
+                db.session.rollback()
+                if attempt >= db_conf.conflict_max_retries:
+                    metrics.db_conflict_exhausted.inc(endpoint=request.endpoint)
+                    raise exception.ConflictException from e
+
+            metrics.db_conflict_retries.inc(endpoint=request.endpoint, sqlstate=sqlstate)
+            time.sleep(conflict_backoff(attempt))
+            attempt += 1
+
+    return view_wrapper
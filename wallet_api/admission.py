@@ -0,0 +1,113 @@
+"""
+Admission control: a worker sheds new requests with a `503` (and a
+`Retry-After` header) once it's handling too many at once or its database
+pool is saturated (too many requests waiting for a connection, or waiting
+for too long), rather than piling them up until they time out.
+
+Health probes and metrics are always admitted, and balance reads can be
+prioritized over transfers (only shed by the in-flight limit). The readiness
+probe reports the saturation so load balancers route around hot workers.
+"""
+import threading
+from typing import Optional
+
+from flask import g, request
+
+from wallet_api.common import metrics
+from wallet_api.common.exception import OverloadedException
+from wallet_api.config import AdmissionConfig as admission_conf
+from wallet_api.pool import pool_waits
+
+
+#: Endpoints always admitted (not counted as in flight).
+PRIORITY_ENDPOINTS = ("app.health_live", "app.health_ready", "app.metrics")
+
+#: Endpoints admitted regardless of the pool saturation if reads are prioritized.
+READ_ENDPOINTS = ("app.user_balance",)
+
+
+class AdmissionController(object):
+    """
+    Requests in flight in the current process and admission decisions.
+    """
+
+    def __init__(self):
+        """Initializes a class instance."""
+        self._lock = threading.Lock()
+        #: Requests being handled.
+        self.in_flight = 0
+
+    def saturation(self) -> Optional[str]:
+        """
+        Checks the database pool saturation.
+
+        :return: Reason (`pool_waiting` or `pool_wait`) if it's saturated.
+            `None` otherwise.
+        """
+        if (
+            admission_conf.max_pool_waiting
+            and pool_waits.count() >= admission_conf.max_pool_waiting
+        ):
+            return "pool_waiting"
+        if (
+            admission_conf.pool_wait_budget
+            and pool_waits.longest(admission_conf.saturation_window)
+            > admission_conf.pool_wait_budget
+        ):
+            return "pool_wait"
+        return None
+
+    def acquire(self, read: bool = False) -> Optional[str]:
+        """
+        Admits a request, counting it as in flight until it's released.
+
+        :param read: `True` if the request is a prioritized read.
+        :return: Reason (`in_flight`, `pool_waiting` or `pool_wait`) if the
+            request is shed. `None` if it's admitted.
+        """
+        reason = None if read else self.saturation()
+        with self._lock:
+            if reason is None and 0 < admission_conf.max_in_flight <= self.in_flight:
+                reason = "in_flight"
+            if reason is None:
+                self.in_flight += 1
+                metrics.http_requests_in_flight.set(self.in_flight)
+        return reason
+
+    def release(self) -> None:
+        """Releases an admitted request."""
+        with self._lock:
+            self.in_flight -= 1
+            metrics.http_requests_in_flight.set(self.in_flight)
+
+
+#: Admission controller of the current process.
+controller = AdmissionController()
+
+
+def admit() -> None:
+    """
+    Blueprint `before_request` hook: admits the request or sheds it.
+
+    :raises OverloadedException: if the request is shed.
+    """
+    if request.endpoint in PRIORITY_ENDPOINTS:
+        return
+
+    read = admission_conf.prioritize_reads and request.endpoint in READ_ENDPOINTS
+    reason = controller.acquire(read)
+    if reason is not None:
+        metrics.admission_rejected.inc(endpoint=request.endpoint or "unknown", reason=reason)
+        raise OverloadedException(admission_conf.retry_after)
+    g.admitted = True
+
+
+def release(exc: Optional[BaseException]) -> None:
+    """
+    Blueprint `teardown_request` hook: releases the admitted request (after
+    a streamed body is sent).
+
+    :param exc: Unhandled exception of the request, if any.
+    """
+    if g.pop("admitted", False):
+        controller.release()
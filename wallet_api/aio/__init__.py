@@ -0,0 +1,107 @@
+"""
+Asynchronous (ASGI) variant of the API: the same routes served on an event
+loop by Starlette, backed by an asyncpg connection pool.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, TypeVar
+
+import asyncpg
+from starlette import responses
+from starlette.applications import Starlette
+from starlette.requests import Request
+
+from wallet_api import conflict_backoff, CONFLICT_SQLSTATES
+from wallet_api.common import metrics
+from wallet_api.common.exception import BaseApiException, ConflictException
+from wallet_api.common.json_provider import get_provider
+from wallet_api.config import FlaskAppConfig as flask_conf
+from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.pool import timeout_settings
+
+
+T = TypeVar("T")
+
+#: JSON provider of the process (see `wallet_api.common.json_provider`).
+json_provider = get_provider(flask_conf.json_backend)
+
+
+class JSONResponse(responses.JSONResponse):
+    """
+    JSON response encoded by the JSON provider.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json_provider.dumps(content)
+
+
+def create_app(test: bool = False) -> Starlette:
+    """
+    Application factory pattern - Creates and initialize the application.
+
+    :param test: `True` to return an application for unit-testing.
+    :return: Starlette's application object.
+    """
+    from wallet_api.aio.routes import routes
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        # Connection pool shared by every request of the process
+        app.state.pool = await asyncpg.create_pool(
+            db_conf.connection_url(test=test, dialect="postgresql"),
+            min_size=db_conf.async_pool_min_size,
+            max_size=db_conf.async_pool_max_size,
+            # PgBouncer transaction pooling breaks prepared statements and
+            # rejects startup parameters
+            statement_cache_size=0 if db_conf.pgbouncer else 100,
+            server_settings={}
+            if db_conf.pgbouncer
+            else {name: str(value) for name, value in timeout_settings().items()},
+        )
+        yield
+        await app.state.pool.close()
+
+    return Starlette(
+        debug=flask_conf.env == "development",
+        routes=routes,
+        exception_handlers={BaseApiException: handle_base_exceptions},
+        lifespan=lifespan,
+    )
+
+
+async def handle_base_exceptions(request: Request, e: BaseApiException) -> JSONResponse:
+    """
+    API custom exceptions handler.
+
+    :param request: Request being handled.
+    :param e: API exception raised in the application.
+    :return: JSON response with proper error message.
+    """
+    return JSONResponse(e.to_dict(), status_code=e.status_code, headers=e.headers)
+
+
+async def retry_on_conflict(endpoint: str, statement: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs a database statement (its own transaction), re-running it when
+    aborted by a concurrency conflict (SQLSTATE 40001/40P01) after a jittered
+    exponential backoff. Asynchronous counterpart of
+    :func:`wallet_api.retry_on_conflict`.
+
+    :param endpoint: Endpoint name (metrics label).
+    :param statement: Coroutine function running the statement.
+    :return: The statement result.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await statement()
+        except asyncpg.PostgresError as e:
+            if e.sqlstate not in CONFLICT_SQLSTATES:
+                raise
+            if attempt >= db_conf.conflict_max_retries:
+                metrics.db_conflict_exhausted.inc(endpoint=endpoint)
+                raise ConflictException from e
+            metrics.db_conflict_retries.inc(endpoint=endpoint, sqlstate=e.sqlstate)
+
+        await asyncio.sleep(conflict_backoff(attempt))
+        attempt += 1
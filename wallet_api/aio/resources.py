@@ -0,0 +1,179 @@
+"""
+Asynchronous counterparts of the user and health endpoints.
+"""
+from datetime import datetime
+from typing import Any
+
+from starlette.endpoints import HTTPEndpoint
+from starlette.requests import Request
+
+from wallet_api.aio import json_provider, JSONResponse, retry_on_conflict
+from wallet_api.common import exception
+from wallet_api.common.money import Money
+from wallet_api.common.serializers import (
+    user_balance_output_schema,
+    user_input_schema,
+    user_output_schema,
+    user_transfer_input_schema,
+    user_transfer_output_schema,
+)
+from wallet_api.models import TransactionType
+
+
+# ---- SQL statements (asyncpg placeholders) ---- #
+#: Creates a user along with its initial deposit and balance (see `User.create`).
+CREATE_USER_SQL = """
+WITH new_user AS (
+    INSERT INTO "user" (name, email) VALUES ($1, $2)
+    ON CONFLICT (email) DO NOTHING
+    RETURNING id
+), deposit AS (
+    INSERT INTO transaction_log
+        (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+    SELECT id, CAST($3 AS transactiontype), $4, 0, $4, $5
+    FROM new_user
+), balance AS (
+    INSERT INTO account_balance (user_id, balance) SELECT id, $4 FROM new_user
+)
+SELECT id FROM new_user
+"""
+
+#: Current balance of a user (sum of its balance slots).
+USER_BALANCE_SQL = "SELECT sum(balance) FROM account_balance WHERE user_id = $1"
+
+#: Calls the server-side transfer function.
+DB_TRANSFER_SQL = "SELECT status FROM wallet_transfer($1, $2, $3, $4)"
+
+
+async def get_json(request: Request) -> Any:
+    """
+    Parses the request body as JSON (with the JSON provider).
+
+    :param request: Request being handled.
+    :return: Parsed body or `None` if it isn't valid JSON.
+    """
+    try:
+        return json_provider.loads(await request.body())
+    except ValueError:
+        return None
+
+
+class UserResource(HTTPEndpoint):
+    """
+    API endpoint: user resource.
+    """
+
+    async def post(self, request: Request) -> JSONResponse:
+        """
+        Creates a new user. Aditionally, initialize the transaction log to
+        store a initial balance.
+
+        :param request: Request being handled.
+        :return: JSON response.
+        """
+        request_payload = user_input_schema.load(await get_json(request))
+        if request_payload.errors:
+            raise exception.InvalidInputException(request_payload.errors)
+        req_data = request_payload.data
+
+        # Insert user, initial transaction entry and balance at once
+        new_user_id = await request.app.state.pool.fetchval(
+            CREATE_USER_SQL,
+            req_data["name"],
+            req_data["email"],
+            TransactionType.DEPOSIT.name,
+            req_data["init_balance"].cents,
+            datetime.utcnow(),
+        )
+        if new_user_id is None:
+            raise exception.UserExistException
+
+        serialized_resp = user_output_schema.dump({"id": new_user_id}, native=json_provider.native)
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+
+        return JSONResponse(serialized_resp.data, status_code=201)
+
+
+class UserBalance(HTTPEndpoint):
+    """
+    API endpoint: User's balance.
+    """
+
+    async def get(self, request: Request) -> JSONResponse:
+        """
+        Fetch user's current balance.
+
+        :param request: Request being handled (`user_id` path parameter).
+        :return: JSON response.
+        """
+        user_id = request.path_params["user_id"]
+        balance = await request.app.state.pool.fetchval(USER_BALANCE_SQL, user_id)
+        if balance is None:
+            raise exception.UserNotFoundException
+
+        serialized_resp = user_balance_output_schema.dump(
+            {"userId": user_id, "balance": Money(int(balance))}, native=json_provider.native
+        )
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+
+        return JSONResponse(serialized_resp.data)
+
+
+class UserTransfer(HTTPEndpoint):
+    """
+    API endpoint: User's money transfer.
+    """
+
+    async def post(self, request: Request) -> JSONResponse:
+        """
+        Transfer money between users. Transfers are always made server-side
+        (`wallet_transfer` database function): a single round trip under
+        READ COMMITTED.
+
+        :param request: Request being handled (`user_id` path parameter).
+        :return: JSON response.
+        """
+        request_payload = user_transfer_input_schema.load(await get_json(request))
+        if request_payload.errors:
+            raise exception.InvalidInputException(request_payload.errors)
+        req_data = request_payload.data
+
+        timestamp = datetime.utcnow()
+        status = await retry_on_conflict(
+            "user_transfer",
+            lambda: request.app.state.pool.fetchval(
+                DB_TRANSFER_SQL,
+                request.path_params["user_id"],
+                req_data["toUserId"],
+                req_data["amount"].cents,
+                timestamp,
+            ),
+        )
+        if status in exception.DB_ERROR_CODES:
+            raise exception.DB_ERROR_CODES[status]
+
+        serialized_resp = user_transfer_output_schema.dump(
+            {"status": status, "timestamp": timestamp}, native=json_provider.native
+        )
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+
+        return JSONResponse(serialized_resp.data)
+
+
+class HealthLive(HTTPEndpoint):
+    """
+    Health probe: liveness.
+    """
+
+    async def get(self, request: Request) -> JSONResponse:
+        """
+        The application is considered to be alive as long as it can return
+        a response.
+
+        :param request: Request being handled.
+        :return: Http (JSON) response with a status code of `200`.
+        """
+        return JSONResponse({"status": "OK"})
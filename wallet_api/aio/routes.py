@@ -0,0 +1,16 @@
+"""
+App routes definitions (ASGI variant).
+"""
+from starlette.routing import Route
+
+from wallet_api.aio.resources import HealthLive, UserBalance, UserResource, UserTransfer
+
+
+routes = [
+    # ----- User routes ----- #
+    Route("/user", UserResource, name="user"),
+    Route("/user/{user_id:int}/balance", UserBalance, name="user_balance"),
+    Route("/user/{user_id:int}/transfer", UserTransfer, name="user_transfer"),
+    # ----- Health probes routes ----- #
+    Route("/health/live", HealthLive, name="health_live"),
+]
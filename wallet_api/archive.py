@@ -0,0 +1,453 @@
+"""
+Archive of the cold transaction log history (used by the `archive` CLI
+command and by the history and statement reads).
+
+Months older than the retention horizon are moved out of the database one
+partition at a time: the partition entries are written to a segment file,
+a balance checkpoint is recorded as of the end of the month and the
+partition is dropped. Partitions already detached (`flask partitions
+maintain --retain`) are attached back to be archived in order. A month is
+only archived once: its segment file is never overwritten.
+
+Segment files are columnar: a header followed by one fixed-width array per
+column (native byte order, narrowest type of each column), with the entries
+sorted by user, timestamp and Id. Amounts are stored in minor units and
+timestamps in microseconds since the epoch. Files are memory-mapped, a
+user's entries are found by binary search over the mapped columns and only
+the entries returned are decoded, nothing else is read or copied.
+"""
+import heapq
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy import text
+
+from wallet_api import db
+from wallet_api.common.money import Money
+from wallet_api.config import ArchiveConfig as archive_conf
+from wallet_api.models import BalanceCheckpoint, TransactionLog, TransactionType
+from wallet_api.partitions import (
+    add_months,
+    attach_partition,
+    detach_partition,
+    list_detached_partitions,
+    list_partitions,
+    month_start,
+    Partition,
+)
+
+
+#: Segment files magic number (format version).
+MAGIC = b"WLTLOG01"
+
+#: Segment files extension.
+SEGMENT_SUFFIX = ".col"
+
+#: Columns of the segment files and their `array` type codes.
+COLUMNS = (
+    ("id", "i"),
+    ("user_id", "i"),
+    ("slot", "h"),
+    ("trans_type", "b"),
+    ("amount", "q"),
+    ("opening_balance", "q"),
+    ("new_balance", "q"),
+    ("timestamp", "q"),
+)
+
+# Header: magic number and number of entries
+_HEADER = struct.Struct("8sQ")
+# Columns start on multiples of 8 bytes
+_ALIGNMENT = 8
+_TRANS_TYPES = list(TransactionType)
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class ArchivedEntry(NamedTuple):
+    """A transaction log entry read from a segment file."""
+
+    id: int
+    user_id: int
+    slot: int
+    trans_type: TransactionType
+    amount: Money
+    opening_balance: Money
+    new_balance: Money
+    timestamp: datetime
+
+
+class Segment(object):
+    """
+    A memory-mapped segment file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Maps a segment file.
+
+        :param path: Segment file path.
+        :raises ValueError: if the file isn't a segment file.
+        """
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} isn't a transaction log segment")
+
+        #: Number of entries.
+        self.rows = rows
+        #: Columns (`memoryview` of the mapped arrays) indexed by name.
+        self.columns = _columns(memoryview(self._mmap), rows)
+
+    def find(
+        self,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before: Optional[Tuple[datetime, int]] = None,
+    ) -> range:
+        """
+        Finds the entries of a user (binary searches).
+
+        :param user_id: Id of the user.
+        :param since: Only entries from this date-time (inclusive).
+        :param until: Only entries up to this date-time (exclusive).
+        :param before: Only entries before this `(timestamp, id)`.
+        :return: Indexes of the entries, in chronological order.
+        """
+        user_ids, timestamps, ids = (self.columns[c] for c in ("user_id", "timestamp", "id"))
+        low, high = bisect_left(user_ids, user_id), bisect_right(user_ids, user_id)
+        if since is not None:
+            low = bisect_left(timestamps, _micros(since), low, high)
+        if until is not None:
+            high = bisect_left(timestamps, _micros(until), low, high)
+        if before is not None:
+            stamp, entry_id = _micros(before[0]), before[1]
+            end = bisect_left(timestamps, stamp, low, high)
+            while end < high and timestamps[end] == stamp and ids[end] < entry_id:
+                end += 1
+            high = end
+
+        return range(low, max(low, high))
+
+    def entry(self, index: int) -> ArchivedEntry:
+        """
+        Decodes an entry.
+
+        :param index: Entry index.
+        :return: The entry.
+        """
+        c = self.columns
+        return ArchivedEntry(
+            c["id"][index],
+            c["user_id"][index],
+            c["slot"][index],
+            _TRANS_TYPES[c["trans_type"][index]],
+            Money(c["amount"][index]),
+            Money(c["opening_balance"][index]),
+            Money(c["new_balance"][index]),
+            _EPOCH + c["timestamp"][index] * _MICROSECOND,
+        )
+
+
+class Archive(object):
+    """
+    Segment files of the archive directory (one instance per process).
+    Segments are mapped on first use and remapped when the directory changes.
+    """
+
+    def __init__(self):
+        """Initializes a class instance."""
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple[str, int]] = None
+        self._segments: List[Segment] = []
+
+    def segments(self) -> List[Segment]:
+        """
+        Gets the current segments.
+
+        :return: Segments in chronological order.
+        """
+        path = archive_conf.path
+        if not path:
+            return []
+        try:
+            version = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return []
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._segments = [
+                        Segment(os.path.join(path, name))
+                        for name in sorted(os.listdir(path))
+                        if name.endswith(SEGMENT_SUFFIX)
+                    ]
+                    self._version = version
+
+        return self._segments
+
+    def newest_first(
+        self,
+        user_id: int,
+        after: Optional[Tuple[datetime, int]] = None,
+        trans_type: Optional[TransactionType] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Iterator[ArchivedEntry]:
+        """
+        Reads a user's archived entries, newest first (see `TransactionLog.page_for`).
+
+        :return: Iterator of entries.
+        """
+        code = None if trans_type is None else _TRANS_TYPES.index(trans_type)
+        for segment in reversed(self.segments()):
+            types = segment.columns["trans_type"]
+            for index in reversed(segment.find(user_id, since, until, after)):
+                if code is None or types[index] == code:
+                    yield segment.entry(index)
+
+    def oldest_first(
+        self, user_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> Iterator[ArchivedEntry]:
+        """
+        Reads a user's archived entries in chronological order.
+
+        :return: Iterator of entries.
+        """
+        for segment in self.segments():
+            for index in segment.find(user_id, since, until):
+                yield segment.entry(index)
+
+
+#: Archive of the current process.
+archive = Archive()
+
+
+# ---- Reads ---- #
+def page_for(
+    user_id: int,
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    trans_type: Optional[TransactionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list:
+    """
+    Fetches a page of a user's transactions, newest first, from the database
+    and the archive (see `TransactionLog.page_for`).
+
+    :return: Rows (`id`, `trans_type`, `amount`, `new_balance`, `timestamp`).
+    """
+    rows = TransactionLog.page_for(user_id, limit, after, trans_type, since, until)
+    archived = archive.newest_first(user_id, after, trans_type, since, until)
+    return list(islice(heapq.merge(rows, archived, key=_entry_key, reverse=True), limit))
+
+
+def statement_for(
+    user_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> Iterator[list]:
+    """
+    Streams a user's transactions in chronological order from the archive
+    and the database (see `TransactionLog.statement_for`).
+
+    :return: Iterator of row batches.
+    """
+    rows = chain.from_iterable(TransactionLog.statement_for(user_id, since, until, batch_size))
+    entries = heapq.merge(archive.oldest_first(user_id, since, until), rows, key=_entry_key)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# ---- Archival ---- #
+def archive_history(retain: int, today: Optional[date] = None) -> List[str]:
+    """
+    Archives the partitions (attached or detached) older than the last
+    `retain` months (current one included), oldest first.
+
+    :param retain: Number of months to keep in the database.
+    :param today: Current (UTC) date, defaults to today.
+    :return: Names of the archived partitions.
+    :raises ValueError: if the archive path isn't configured or a month is
+        already archived.
+    """
+    path = archive_conf.path
+    if not path:
+        raise ValueError("The archive path isn't configured")
+    os.makedirs(path, exist_ok=True)
+    attached = list_partitions()
+    detached = list_detached_partitions()
+    _recover(path, {partition.name for partition in attached + detached})
+
+    horizon = add_months(month_start(today or datetime.utcnow().date()), 1 - retain)
+    archived = []
+    for partition in sorted(attached + detached, key=lambda partition: partition.start):
+        if partition.end > horizon:
+            break
+        archive_partition(path, partition, attached=partition in attached)
+        archived.append(partition.name)
+
+    return archived
+
+
+def archive_partition(path: str, partition: Partition, attached: bool = True) -> None:
+    """
+    Moves a partition to a segment file. The file is written under a
+    temporary name and renamed once the partition is dropped, so an
+    interrupted archival is resumed by `_recover`. A detached partition is
+    attached back first, in the same transaction, so the checkpoint derives
+    the balances from its entries.
+
+    :param path: Archive directory.
+    :param partition: Partition.
+    :param attached: Whether the partition is attached.
+    :raises ValueError: if the month is already archived.
+    """
+    name = partition.name
+    segment_path = os.path.join(path, name + SEGMENT_SUFFIX)
+    if os.path.exists(segment_path):
+        raise ValueError(f"{name} is already archived")
+    if not attached:
+        attach_partition(partition)
+    rows = db.session.execute(f"SELECT count(*) FROM {name}").scalar()
+    result = (
+        db.session.connection()
+        .execution_options(stream_results=True)
+        .execute(
+            text(
+                f"SELECT {', '.join(column for column, _ in COLUMNS)} FROM {name} "
+                "ORDER BY user_id, timestamp, id"
+            )
+        )
+    )
+    write_segment(f"{segment_path}.tmp", rows, result)
+
+    BalanceCheckpoint.record(datetime.combine(partition.end, time()))
+    detach_partition(name, drop=True)
+    db.session.commit()
+    os.replace(f"{segment_path}.tmp", segment_path)
+    _fsync_directory(path)
+
+
+def write_segment(path: str, rows: int, entries: Iterable[tuple]) -> None:
+    """
+    Writes a segment file.
+
+    :param path: Segment file path.
+    :param rows: Number of entries.
+    :param entries: Entries (`COLUMNS` values) sorted by user, timestamp and Id.
+    :raises ValueError: if the number of entries isn't `rows`.
+    """
+    size = _HEADER.size + sum(_column_size(code, rows) for _, code in COLUMNS)
+    with open(path, "w+b") as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as buffer:
+            _HEADER.pack_into(buffer, 0, MAGIC, rows)
+            view = memoryview(buffer)
+            columns = list(_columns(view, rows).values())
+            written = 0
+            try:
+                for written, entry in enumerate(entries, 1):
+                    if written > rows:
+                        break
+                    for column, value in zip(columns, _encode(entry)):
+                        column[written - 1] = value
+            finally:
+                # The views must be released before unmapping
+                for column in columns:
+                    column.release()
+                view.release()
+            buffer.flush()
+        os.fsync(f.fileno())
+    if written != rows:
+        os.remove(path)
+        raise ValueError(f"Expected {rows} entries to archive, got {written}")
+
+
+# ---- Helpers ---- #
+def _columns(buffer: memoryview, rows: int) -> Dict[str, memoryview]:
+    """Views of the columns of a segment (`buffer` is the whole file)."""
+    columns, offset = {}, _HEADER.size
+    for name, code in COLUMNS:
+        end = offset + rows * struct.calcsize(code)
+        columns[name] = buffer[offset:end].cast(code)
+        offset += _column_size(code, rows)
+    return columns
+
+
+def _column_size(code: str, rows: int) -> int:
+    """Size of a column, padded to the alignment of the next one."""
+    return -(-rows * struct.calcsize(code) // _ALIGNMENT) * _ALIGNMENT
+
+
+def _encode(entry: tuple) -> tuple:
+    """Segment values of an entry (`COLUMNS` values)."""
+    entry_id, user_id, slot, trans_type, amount, opening_balance, new_balance, timestamp = entry
+    if isinstance(trans_type, str):
+        trans_type = TransactionType[trans_type]
+    return (
+        entry_id,
+        user_id,
+        slot,
+        _TRANS_TYPES.index(trans_type),
+        _cents(amount),
+        _cents(opening_balance),
+        _cents(new_balance),
+        _micros(timestamp),
+    )
+
+
+def _cents(amount: Union[int, Money]) -> int:
+    """Amount in minor units (raw rows already hold them)."""
+    return amount.cents if isinstance(amount, Money) else amount
+
+
+def _micros(timestamp: datetime) -> int:
+    """Microseconds since the epoch of a naive UTC date-time."""
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def _entry_key(row) -> Tuple[datetime, int]:
+    """Sort key of the transaction log rows and archived entries."""
+    return row.timestamp, row.id
+
+
+def _recover(path: str, existing: set) -> None:
+    """
+    Completes or discards the segment files of an interrupted archival: the
+    file of a partition already dropped is renamed, otherwise it's removed
+    (the partition will be archived again).
+
+    :param path: Archive directory.
+    :param existing: Names of the partitions (attached or detached) in the database.
+    """
+    for name in os.listdir(path):
+        if not name.endswith(f"{SEGMENT_SUFFIX}.tmp"):
+            continue
+        temporary = os.path.join(path, name)
+        if name[: -len(f"{SEGMENT_SUFFIX}.tmp")] in existing:
+            os.remove(temporary)
+        else:
+            os.replace(temporary, temporary[: -len(".tmp")])
+
+
+def _fsync_directory(path: str) -> None:
+    """Persists the entries (e.g. renames) of a directory."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,12 @@
+"""
+ASGI application entrypoint/runner (asynchronous variant of the API).
+"""
+from wallet_api.aio import create_app
+
+# Obtains an app instance
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app)
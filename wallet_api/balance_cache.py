@@ -0,0 +1,285 @@
+"""
+Balance cache shared by every gunicorn worker of a host.
+
+Balances live in a memory-mapped file (under `/dev/shm`) as an array of
+fixed-width records indexed by user Id, kept fresh by a listener thread that
+consumes the PostgreSQL notifications emitted on every `transaction_log`
+insert. Only one worker per host runs the listener (elected through a file
+lock), every worker reads the cache and falls back to the database on a miss.
+
+Records are four int64 fields: a seqlock counter (odd while being written),
+the record version (bumped on every invalidation), the version the cached
+balance is valid for (plus one) and the balance in minor units. Record `0`
+is the header, whose version field is an epoch added to every record
+version, so the whole cache is invalidated by bumping it, and whose balance
+field is the listener heartbeat (wall-clock milliseconds). Records are only
+served while the heartbeat is recent: changes go unnoticed while nobody
+listens (e.g. after a restart or while the listener reconnects), so reads
+bypass the cache then.
+"""
+import fcntl
+import mmap
+import os
+import select
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from flask import current_app, Flask
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from wallet_api.common import metrics
+from wallet_api.common.money import Money
+from wallet_api.config import BalanceCacheConfig as cache_conf
+
+
+#: Notification channel of the balance changes.
+CHANNEL = "balance_changed"
+
+#: Seconds between listener (re)election or reconnection attempts.
+LISTENER_RETRY = 5
+
+#: Seconds the cache is served for after the last listener heartbeat (sent
+# every `LISTENER_RETRY` seconds at most).
+HEARTBEAT_TIMEOUT = 2 * LISTENER_RETRY
+
+# Record fields
+_SEQ, _VERSION, _FILLED, _BALANCE = range(4)
+_RECORD_FIELDS = 4
+_FIELD_SIZE = 8
+# Header field of the listener heartbeat
+_HEARTBEAT = _BALANCE
+
+
+class BalanceCache(object):
+    """
+    Memory-mapped balance cache (one instance per process).
+    """
+
+    def __init__(self):
+        """Initializes a class instance (the file is mapped on first use)."""
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._fd = -1
+        self._records: Optional[memoryview] = None
+
+    def get(self, user_id: int, loader: Callable[[int], Optional[Money]]) -> Optional[Money]:
+        """
+        Gets the balance of a user from the cache or, on a miss, from `loader`
+        (caching its result).
+
+        :param user_id: Id of the user.
+        :param loader: Function fetching the balance of a user from the database.
+        :return: The user's balance or `None` if the user doesn't exist.
+        """
+        self._ensure_started(current_app._get_current_object())
+        balance, version = self.lookup(user_id)
+        if balance is not None:
+            metrics.balance_cache_hits.inc()
+            return balance
+
+        metrics.balance_cache_misses.inc()
+        balance = loader(user_id)
+        if balance is not None:
+            self.fill(user_id, version, balance)
+        return balance
+
+    def lookup(self, user_id: int) -> Tuple[Optional[Money], int]:
+        """
+        Lock-free read of a cache record.
+
+        :param user_id: Id of the user.
+        :return: The cached balance (`None` on a miss) and the record version,
+            to be passed to `fill` after loading the balance on a miss (`-1`
+            if it mustn't be cached).
+        """
+        records = self._records
+        if records is None or not 0 < user_id <= cache_conf.capacity:
+            return None, -1
+        if time.time() * 1000 - records[_HEARTBEAT] > HEARTBEAT_TIMEOUT * 1000:
+            # Nobody is listening to the changes
+            return None, -1
+
+        base = user_id * _RECORD_FIELDS
+        seq = records[base + _SEQ]
+        version = records[base + _VERSION] + records[_VERSION]
+        filled = records[base + _FILLED]
+        balance = records[base + _BALANCE]
+        if seq % 2 or records[base + _SEQ] != seq or filled != version + 1:
+            return None, version
+        return Money(balance), version
+
+    def fill(self, user_id: int, version: int, balance: Money) -> None:
+        """
+        Caches the balance of a user unless the record was invalidated since
+        `version` was read (the balance might be stale then).
+
+        :param user_id: Id of the user.
+        :param version: Record version read before loading the balance.
+        :param balance: User's balance.
+        """
+        if version < 0:
+            return
+        base = user_id * _RECORD_FIELDS
+        with self._write_lock() as records:
+            if records[base + _VERSION] + records[_VERSION] != version:
+                return
+            records[base + _SEQ] += 1
+            records[base + _FILLED] = version + 1
+            records[base + _BALANCE] = balance.cents
+            records[base + _SEQ] += 1
+
+    def invalidate(self, user_id: int) -> int:
+        """
+        Invalidates the cache record of a user.
+
+        :param user_id: Id of the user.
+        :return: The new record version.
+        """
+        base = user_id * _RECORD_FIELDS
+        with self._write_lock() as records:
+            records[base + _SEQ] += 1
+            records[base + _VERSION] += 1
+            records[base + _SEQ] += 1
+            return records[base + _VERSION] + records[_VERSION]
+
+    def clear(self) -> None:
+        """Invalidates every cache record (bumps the epoch)."""
+        with self._write_lock() as records:
+            records[_VERSION] += 1
+
+    def heartbeat(self, listening: bool = True) -> None:
+        """
+        Records whether the listener is consuming the balance changes.
+
+        :param listening: `False` to stop serving the cache right away.
+        """
+        with self._write_lock() as records:
+            records[_HEARTBEAT] = int(time.time() * 1000) if listening else 0
+
+    def _write_lock(self):
+        """
+        Context manager serializing writers across threads and processes.
+
+        :return: Context manager yielding the cache records.
+        """
+        cache = self
+
+        class WriteLock(object):
+            def __enter__(self):
+                cache._lock.acquire()
+                fcntl.flock(cache._fd, fcntl.LOCK_EX)
+                return cache._records
+
+            def __exit__(self, *exc_info):
+                fcntl.flock(cache._fd, fcntl.LOCK_UN)
+                cache._lock.release()
+
+        return WriteLock()
+
+    def _ensure_started(self, app: Flask) -> None:
+        """
+        Maps the cache file and starts the listener thread of the current
+        process. Gunicorn workers are forked and `flock` locks are shared by
+        inherited file descriptors, so every process opens its own. The file
+        may be left over by a previous run, so it's cleared and not served
+        until the listener is heard from.
+
+        :param app: Flask application.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            size = (cache_conf.capacity + 1) * _RECORD_FIELDS * _FIELD_SIZE
+            self._fd = os.open(cache_conf.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            records = memoryview(mmap.mmap(self._fd, size)).cast("q")
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            records[_VERSION] += 1
+            records[_HEARTBEAT] = 0
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._records = records
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self._listen, args=(app,), name="balance-cache-listener", daemon=True
+            ).start()
+
+    def _listen(self, app: Flask) -> None:
+        """
+        Listener thread: waits to be elected as the host listener and then
+        consumes balance change notifications, reconnecting on failures.
+
+        :param app: Flask application.
+        """
+        lock_fd = os.open(f"{cache_conf.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        while True:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                time.sleep(LISTENER_RETRY)
+        # The previous listener might have died while listening
+        self.heartbeat(False)
+
+        engine = create_engine(
+            cache_conf.listen_url or app.config["SQLALCHEMY_DATABASE_URI"], poolclass=NullPool
+        )
+        while True:
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                self._consume(connection.connection)
+            except Exception:
+                self.heartbeat(False)
+                app.logger.exception("Balance cache listener failed")
+                time.sleep(LISTENER_RETRY)
+            finally:
+                if connection is not None:
+                    connection.invalidate()
+
+    def _consume(self, connection) -> None:
+        """
+        Refreshes the records of the users notified through `CHANNEL`,
+        checking the connection and sending a heartbeat on every wake-up.
+
+        :param connection: psycopg2 connection.
+        """
+        connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute(f"LISTEN {CHANNEL}")
+        # Changes made before listening went unnoticed
+        self.clear()
+        self.heartbeat()
+
+        while True:
+            if select.select([connection], [], [], LISTENER_RETRY) == ([], [], []):
+                cursor.execute("SELECT 1")
+                self.heartbeat()
+                continue
+            connection.poll()
+            user_ids = {int(notify.payload) for notify in connection.notifies}
+            connection.notifies.clear()
+
+            versions = {
+                user_id: self.invalidate(user_id)
+                for user_id in user_ids
+                if 0 < user_id <= cache_conf.capacity
+            }
+            self.heartbeat()
+            if not versions:
+                continue
+            cursor.execute(
+                "SELECT user_id, sum(balance) FROM account_balance "
+                "WHERE user_id = ANY(%s) GROUP BY user_id",
+                (list(versions),),
+            )
+            for user_id, balance in cursor.fetchall():
+                self.fill(user_id, versions[user_id], Money(int(balance)))
+
+
+#: Balance cache of the current process.
+cache = BalanceCache()
@@ -0,0 +1,129 @@
+"""
+Bulk users import (used by the bulk users endpoint and CLI command).
+"""
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+
+from wallet_api import db
+from wallet_api.common.money import ZERO
+from wallet_api.common.serializers import user_input_schema
+from wallet_api.models import AccountBalance, TransactionLog, TransactionType, User
+
+
+#: Default number of users loaded per database transaction.
+CHUNK_SIZE = 1000
+
+#: Input record: line number and parsed data (`None` if unparsable).
+Record = Tuple[int, Optional[dict]]
+
+
+def read_records(lines: Iterable[str], fmt: str = "ndjson") -> Iterator[Record]:
+    """
+    Lazily parses users data in NDJSON (an object per line) or CSV (with a
+    header row) format.
+
+    :param lines: Input text lines.
+    :param fmt: Input format: `ndjson` or `csv`.
+    :return: Iterator of records.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty columns are treated as missing fields
+            yield reader.line_num, {k: v for k, v in row.items() if k and v not in ("", None)}
+        return
+
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        yield line_num, data if isinstance(data, dict) else None
+
+
+def import_users(records: Iterable[Record], chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Creates users (with their initial balance) in chunks, each one loaded
+    with a single multi-row insert per table and committed on its own.
+    Invalid records and duplicate emails are reported without aborting the
+    import.
+
+    :param records: Users data records.
+    :param chunk_size: Number of records per chunk.
+    :return: Iterator of per-record results (`line`, `status` and either
+        `userId` or `errors`) in input order.
+    """
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield from _import_chunk(chunk)
+
+
+def _import_chunk(chunk: List[Record]) -> List[dict]:
+    """
+    Validates and loads a chunk of users records.
+
+    :param chunk: Users data records.
+    :return: Per-record results.
+    """
+    results, valid = [], []
+    for line, data in chunk:
+        if data is None:
+            results.append({"line": line, "status": "invalid", "errors": "Invalid record"})
+            continue
+        payload = user_input_schema.load(data)
+        if payload.errors:
+            results.append({"line": line, "status": "invalid", "errors": payload.errors})
+            continue
+        # Assumed duplicate unless the insert returns it
+        result = {"line": line, "status": "duplicate"}
+        results.append(result)
+        valid.append((result, payload.data))
+
+    if not valid:
+        return results
+
+    inserted = dict(
+        db.session.execute(
+            insert(User.__table__)
+            .values([{"name": data["name"], "email": data["email"]} for _, data in valid])
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(User.email, User.id)
+        ).fetchall()
+    )
+
+    timestamp = datetime.utcnow()
+    logs, balances = [], []
+    for result, data in valid:
+        # Only the first record of an email repeated in the chunk gets created
+        user_id = inserted.pop(data["email"], None)
+        if user_id is None:
+            continue
+        result.update(status="created", userId=user_id)
+        logs.append(
+            {
+                "user_id": user_id,
+                "trans_type": TransactionType.DEPOSIT,
+                "amount": data["init_balance"],
+                "opening_balance": ZERO,
+                "new_balance": data["init_balance"],
+                "timestamp": timestamp,
+            }
+        )
+        balances.append({"user_id": user_id, "balance": data["init_balance"]})
+
+    if logs:
+        db.session.execute(TransactionLog.__table__.insert().values(logs))
+        db.session.execute(AccountBalance.__table__.insert().values(balances))
+    db.session.commit()
+
+    return results
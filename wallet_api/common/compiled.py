@@ -0,0 +1,314 @@
+"""
+Compiled serializers: marshmallow schemas turned, once, into plain per-field
+functions for the request hot path.
+
+A `CompiledSchema` wraps a single schema instance (built at import time
+instead of per request) and (de)serializes valid data without going through
+marshmallow's (un)marshallers. Anything the fast path doesn't handle (invalid
+data, unexpected types, failing fields) is passed on to the wrapped schema, so
+results and error messages are marshmallow's own. Any other failure of the fast
+path is a bug: it's logged and counted (`wallet_serialization_fallbacks_total`)
+before falling back as well.
+
+Dumps can also be `native`: the values the JSON provider encodes itself as
+their fields would (money amounts, naive UTC date-times) are left as they are,
+so they're only formatted once, by the encoder.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Tuple, Type
+
+from marshmallow import fields, MarshalResult, Schema, UnmarshalResult, ValidationError
+from marshmallow.decorators import POST_LOAD
+from marshmallow.utils import get_func_args, get_value, missing
+
+from wallet_api.common import metrics
+from wallet_api.monitoring import serialization_timer
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Unsupported(Exception):
+    """Input the fast path leaves to marshmallow (e.g. of an unexpected type)."""
+
+
+#: Fast path failures expected on invalid data, handled by marshmallow.
+_EXPECTED_FAILURES = (_Unsupported, ValidationError)
+
+
+class CompiledSchema(object):
+    """
+    Precompiled (de)serializer of a marshmallow schema. Schemas with
+    processors other than `post_load` ones are always delegated to.
+    """
+
+    def __init__(self, schema_class: Type[Schema], many: bool = False):
+        """
+        Initializes a class instance (compiles the schema).
+
+        :param schema_class: Marshmallow schema to compile.
+        :param many: Whether to (de)serialize collections by default.
+        """
+        #: Wrapped schema instance: reference implementation and fallback.
+        self.schema = schema_class(many=many)
+        self.many = many
+        #: Whether the fast path handles the schema.
+        self.compiled = _compilable(self.schema)
+        self._post_load = bool(self.schema.__processors__[(POST_LOAD, False)])
+
+        names = [name for name in self.schema.declared_fields if name in self.schema.fields]
+        bound = [(name, self.schema.fields[name]) for name in names]
+        self._loaders: List[Tuple[str, str, str, Callable]] = [
+            (name, field.load_from, field.attribute or name, _field_loader(field))
+            for name, field in bound
+            if not field.dump_only
+        ]
+        self._dumpers: List[Tuple[str, str, Callable]] = [
+            (field.dump_to or name, field.attribute or name, _field_dumper(field, native=False))
+            for name, field in bound
+            if not field.load_only
+        ]
+        self._native_dumpers: List[Tuple[str, str, Callable]] = [
+            (field.dump_to or name, field.attribute or name, _field_dumper(field, native=True))
+            for name, field in bound
+            if not field.load_only
+        ]
+
+    def load(self, data: Any, many: bool = None) -> UnmarshalResult:
+        """
+        Deserializes and validates `data` (as `Schema.load`).
+
+        :param data: Data to deserialize.
+        :param many: Whether `data` is a collection (defaults to the instance's).
+        :return: The `(data, errors)` result.
+        """
+        many = self.many if many is None else many
+        with serialization_timer():
+            if self.compiled:
+                try:
+                    return UnmarshalResult(self._load_many(data) if many else self._load(data), {})
+                except _EXPECTED_FAILURES:
+                    pass
+                except Exception:
+                    self._fallback("load")
+            return self.schema.load(data, many=many)
+
+    def dump(self, obj: Any, many: bool = None, native: bool = False) -> MarshalResult:
+        """
+        Serializes `obj` (as `Schema.dump`).
+
+        :param obj: Object to serialize.
+        :param many: Whether `obj` is a collection (defaults to the instance's).
+        :param native: `True` to leave the values the JSON provider encodes as they are.
+        :return: The `(data, errors)` result.
+        """
+        many = self.many if many is None else many
+        with serialization_timer():
+            if self.compiled:
+                try:
+                    if many:
+                        return MarshalResult(self._dump_many(obj, native), {})
+                    return MarshalResult(self._dump(obj, native), {})
+                except _EXPECTED_FAILURES:
+                    pass
+                except Exception:
+                    self._fallback("dump")
+            return self.schema.dump(obj, many=many)
+
+    def _fallback(self, operation: str) -> None:
+        """
+        Logs and counts an unexpected failure of the fast path (a bug), which
+        is then delegated to the wrapped schema.
+
+        :param operation: `load` or `dump`.
+        """
+        schema = type(self.schema).__name__
+        logger.exception("Compiled %s of %s failed, falling back to marshmallow", operation, schema)
+        metrics.serialization_fallbacks.inc(schema=schema, operation=operation)
+
+    def _load(self, data: Any) -> dict:
+        """Fast path deserialization of a single item, raises on any failure."""
+        if type(data) is not dict:
+            raise _Unsupported("Not a dict")
+
+        result = {}
+        for name, load_from, key, loader in self._loaders:
+            value = data.get(name, missing)
+            if value is missing and load_from:
+                value = data.get(load_from, missing)
+            value = loader(value, data)
+            if value is not missing:
+                result[key] = value
+
+        if self._post_load:
+            result = self.schema._invoke_load_processors(
+                POST_LOAD, result, many=False, original_data=data
+            )
+        return result
+
+    def _load_many(self, data: Any) -> list:
+        """Fast path deserialization of a collection, raises on any failure."""
+        if type(data) is not list:
+            raise _Unsupported("Not a list")
+        return [self._load(item) for item in data]
+
+    def _dump(self, obj: Any, native: bool = False) -> dict:
+        """Fast path serialization of a single object, raises on any failure."""
+        result = {}
+        for key, attribute, dumper in self._native_dumpers if native else self._dumpers:
+            value = dumper(attribute, obj)
+            if value is not missing:
+                result[key] = value
+        return result
+
+    def _dump_many(self, obj: Any, native: bool = False) -> list:
+        """Fast path serialization of a collection, raises on any failure."""
+        return [self._dump(item, native) for item in obj]
+
+
+# ---- Helpers ---- #
+def _compilable(schema: Schema) -> bool:
+    """Whether the fast path can handle a schema (else it's delegated to)."""
+    processors = {tag for (tag, _), names in schema.__processors__.items() if names}
+    return (
+        processors <= {POST_LOAD}
+        and not schema.__processors__[(POST_LOAD, True)]
+        and not schema.prefix
+        and not schema.extra
+        and not schema.strict
+        and not schema.partial
+    )
+
+
+def _field_loader(field: fields.Field) -> Callable[[Any, dict], Any]:
+    """
+    Builds the deserializer of a field: takes the raw value (`missing` if
+    absent) and the input data, returns the value (`missing` to skip it).
+    """
+    attr = field.load_from or field.name
+
+    def load(value, data):
+        if value is missing:
+            value = field.missing() if callable(field.missing) else field.missing
+            if value is missing and not field.required:
+                return missing
+        return field.deserialize(value, attr, data)
+
+    if isinstance(field, fields.Nested):
+        nested = CompiledSchema(type(field.schema))
+        if not nested.compiled or field.only or field.exclude:
+            return load
+        nested_load = nested._load_many if field.many else nested._load
+
+        def load_nested(value, data):
+            if value is missing or value is None:
+                return load(value, data)
+            output = nested_load(value)
+            field._validate(output)
+            return output
+
+        return load_nested
+
+    if type(field) in (fields.Integer, fields.String) and not field.validators:
+        exact_type = int if type(field) is fields.Integer else str
+
+        def load_exact(value, data):
+            # Integers and strings deserialize to themselves
+            if type(value) is exact_type:
+                return value
+            return load(value, data)
+
+        return load_exact
+
+    return load
+
+
+def _field_dumper(field: fields.Field, native: bool) -> Callable[[str, Any], Any]:
+    """
+    Builds the serializer of a field: takes the attribute name and the
+    object, returns the value (`missing` to skip it). Native serializers
+    return the values of the field's `native_types` and naive date-times as
+    they are.
+    """
+    dump = field.serialize
+    if (
+        type(field) is fields.Function
+        and field.serialize_func
+        and len(get_func_args(field.serialize_func)) == 1
+    ):
+        func = field.serialize_func
+
+        def dump_function(attribute, obj):
+            # Without inspecting the function's signature on every call
+            try:
+                return func(obj)
+            except AttributeError:
+                return missing
+
+        return dump_function
+
+    if field.default is not missing or not field._CHECK_ATTRIBUTE:
+        return dump
+
+    def get(attribute, obj):
+        if type(obj) is dict:
+            return obj.get(attribute, missing)
+        # Rows and entities are read by attribute rather than trying keys first
+        value = getattr(obj, attribute, missing)
+        return get_value(attribute, obj) if value is missing else value
+
+    if isinstance(field, fields.Nested):
+        nested = CompiledSchema(type(field.schema))
+        if not nested.compiled or field.only or field.exclude:
+            return dump
+        nested_dump = nested._dump_many if field.many else nested._dump
+
+        def dump_nested(attribute, obj):
+            value = get(attribute, obj)
+            if value is missing or value is None:
+                return value
+            return nested_dump(value, native)
+
+        return dump_nested
+
+    if (type(field) is fields.Integer and not field.as_string) or type(field) is fields.String:
+        exact_type = int if type(field) is fields.Integer else str
+
+        def dump_exact(attribute, obj):
+            value = get(attribute, obj)
+            # Integers and strings serialize to themselves
+            if type(value) is exact_type or value is None or value is missing:
+                return value
+            return field._serialize(value, attribute, obj)
+
+        return dump_exact
+
+    if (
+        type(field) is fields.DateTime
+        and (field.dateformat or field.DEFAULT_FORMAT) in ("iso", "iso8601")
+        and not field.localtime
+    ):
+
+        def dump_datetime(attribute, obj):
+            value = get(attribute, obj)
+            # ISO 8601 in UTC, naive date-times being UTC
+            if type(value) is datetime:
+                if value.tzinfo is None:
+                    if native:
+                        return value
+                    return value.replace(tzinfo=timezone.utc).isoformat()
+                return value.astimezone(timezone.utc).isoformat()
+            return missing if value is missing else field._serialize(value, attribute, obj)
+
+        return dump_datetime
+
+    native_types = getattr(field, "native_types", ()) if native else ()
+
+    def dump_value(attribute, obj):
+        value = get(attribute, obj)
+        if value is missing or type(value) in native_types:
+            return value
+        return field._serialize(value, attribute, obj)
+
+    return dump_value
@@ -15,6 +15,8 @@ class BaseApiException(Exception):
     message: Union[str, dict] = "Internal server error"
     #: Error mesage key for dict representation.
     prefix = "Error"
+    #: Extra response headers.
+    headers: dict = {}
 
     def __init__(self, message: Union[str, dict] = None, status_code: int = None):
         # Exception.__init__(self)
@@ -77,3 +79,44 @@ class InsufficientFundsException(BaseApiException):
 
     status_code = 403
     message = "Insufficient funds"
+
+
+class ConflictException(BaseApiException):
+    """
+    Exception raised if a transaction keeps being aborted by concurrency
+    conflicts (serialization failures, deadlocks) after every retry.
+    """
+
+    status_code = 409
+    message = "Transaction aborted by concurrent updates, retry later"
+
+
+class OverloadedException(BaseApiException):
+    """
+    Exception raised if a request is shed by the admission control.
+    """
+
+    status_code = 503
+    message = "Service overloaded, retry later"
+
+    def __init__(self, retry_after: int):
+        """
+        Initializes a class instance.
+
+        :param retry_after: Seconds the client should wait before retrying.
+        """
+        super().__init__()
+        self.headers = {"Retry-After": str(retry_after)}
+
+
+#: Exceptions matching the error codes returned by the `wallet_transfer` database function.
+DB_ERROR_CODES = {
+    "user_not_found": UserNotFoundException,
+    "insufficient_funds": InsufficientFundsException,
+}
+
+#: Error codes of the transfer exceptions (transfer outcomes).
+TRANSFER_ERROR_CODES = {
+    **{error: code for code, error in DB_ERROR_CODES.items()},
+    ConflictException: "conflict",
+}
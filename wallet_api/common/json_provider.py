@@ -0,0 +1,175 @@
+"""
+JSON providers: encoding of the responses and decoding of the request bodies.
+
+The application's provider (`current_json`, registered as the
+`json_provider` extension so it doesn't clash with Flask 2.2's own `app.json`)
+is backed by `orjson` (a requirement of the application) and falls back to
+`simplejson` where it isn't installed. Both encode money
+amounts and decimals as strings and date-times in ISO 8601 format (naive
+date-times being UTC). Serializers hand those values over as they are to
+`native` providers, which encode them faster than they'd format them.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Union
+
+import simplejson
+from flask import current_app, request, Response
+from werkzeug.local import LocalProxy
+
+from wallet_api.common.money import Money
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class JSONProvider(ABC):
+    """
+    Base JSON provider.
+    """
+
+    #: Backend name.
+    name = ""
+    #: Whether to encode native (not preformatted) dumps.
+    native = False
+
+    @abstractmethod
+    def dumps(self, obj: Any, sort_keys: bool = False, indent: bool = False) -> bytes:
+        """
+        Encodes an object as JSON.
+
+        :param obj: Object to encode.
+        :param sort_keys: `True` to sort the keys of the objects.
+        :param indent: `True` to pretty-print it (2 spaces indentation).
+        :return: UTF-8 encoded JSON document.
+        """
+
+    @abstractmethod
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """
+        Decodes a JSON document.
+
+        :param data: JSON document (UTF-8 if encoded).
+        :return: Decoded object.
+        :raises ValueError: if `data` isn't valid JSON.
+        """
+
+    def response(self, obj: Any, status: int = 200, headers: dict = None) -> Response:
+        """
+        Builds a JSON response of the current application (as `jsonify`).
+
+        :param obj: Response body.
+        :param status: Response status code.
+        :param headers: Extra response headers.
+        :return: Http (JSON) response.
+        """
+        config = current_app.config
+        body = self.dumps(
+            obj,
+            sort_keys=config["JSON_SORT_KEYS"],
+            indent=config["JSONIFY_PRETTYPRINT_REGULAR"] or current_app.debug,
+        )
+        return current_app.response_class(
+            body + b"\n", status=status, headers=headers, mimetype=config["JSONIFY_MIMETYPE"]
+        )
+
+    def request_json(self) -> Any:
+        """
+        Decodes the body of the current request straight from its bytes (as
+        `request.get_json(silent=True)`). The raw body stays cached, so views
+        re-run on a conflict decode it again.
+
+        :return: Decoded body or `None` if the request isn't valid JSON.
+        """
+        if not request.is_json:
+            return None
+        try:
+            return self.loads(request.get_data())
+        except ValueError:
+            return None
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider backed by `orjson`: date-times are encoded natively, other
+    types through `default`.
+    """
+
+    name = "orjson"
+    native = True
+
+    def dumps(self, obj: Any, sort_keys: bool = False, indent: bool = False) -> bytes:
+        # Error messages of collections are keyed by item index
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+class SimplejsonProvider(JSONProvider):
+    """
+    JSON provider backed by `simplejson`.
+    """
+
+    name = "simplejson"
+
+    def dumps(self, obj: Any, sort_keys: bool = False, indent: bool = False) -> bytes:
+        return simplejson.dumps(
+            obj,
+            default=default,
+            sort_keys=sort_keys,
+            indent=2 if indent else None,
+            separators=(",", ":"),
+            use_decimal=False,
+        ).encode()
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        if isinstance(data, bytes):
+            data = data.decode()
+        return simplejson.loads(data)
+
+
+#: Providers by backend name.
+PROVIDERS = {provider.name: provider for provider in (OrjsonProvider, SimplejsonProvider)}
+
+
+def get_provider(name: str = "auto") -> JSONProvider:
+    """
+    Instantiates a JSON provider.
+
+    :param name: Backend name or `auto` for the fastest one installed.
+    :return: The JSON provider.
+    :raises ValueError: if the backend is unknown or not installed.
+    """
+    if name == "auto":
+        name = "simplejson" if orjson is None else "orjson"
+    if name not in PROVIDERS or (name == "orjson" and orjson is None):
+        raise ValueError(f"JSON backend {name} is not available")
+    return PROVIDERS[name]()
+
+
+#: JSON provider of the current application.
+current_json = LocalProxy(lambda: current_app.extensions["json_provider"])
+
+
+def default(obj: Any) -> Any:
+    """
+    Encodes the types unknown to the JSON backends.
+
+    :param obj: Object to encode.
+    :return: JSON-compatible value.
+    :raises TypeError: if the object type isn't supported.
+    """
+    if isinstance(obj, (Money, Decimal)):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return (obj if obj.tzinfo else obj.replace(tzinfo=timezone.utc)).isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,291 @@
+"""
+Application metrics: counters, gauges and histograms backed by
+`prometheus_client`, exported in the Prometheus text format.
+
+Gunicorn workers are separate processes, so when `PROMETHEUS_MULTIPROC_DIR`
+is set (see `etc/gunicorn_conf_*.py`) every process writes its values to
+memory-mapped files in that directory and the exposition aggregates them.
+"""
+import os
+from typing import Any, Dict, Tuple
+
+import prometheus_client
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+
+#: Registry of every metric defined in the application (current process).
+REGISTRY = prometheus_client.REGISTRY
+
+
+class Metric(object):
+    """
+    Base class of the metrics, optionally split by a set of labels.
+    """
+
+    #: `prometheus_client` metric class.
+    metric_class: Any = None
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), **options: Any
+    ):
+        """
+        Initializes a class instance and registers it in :data:`REGISTRY`.
+
+        :param name: Metric name.
+        :param documentation: Metric description.
+        :param labelnames: Names of the labels the metric is split by.
+        :param options: Options of the `prometheus_client` metric class.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.metric = self.metric_class(name, documentation, labelnames, **options)
+
+    def _child(self, labels: Dict[str, str]) -> Any:
+        """
+        Metric matching a set of labels.
+
+        :param labels: Label values (one per label name).
+        :return: `prometheus_client` metric (child).
+        """
+        return self.metric.labels(**labels) if self.labelnames else self.metric
+
+    def _samples(self, suffix: str = ""):
+        """
+        Current samples of the metric (current process).
+
+        :param suffix: Suffix of the samples names to keep.
+        :return: Pairs of label values (in label names order) and samples.
+        """
+        for family in self.metric.collect():
+            for sample in family.samples:
+                if sample.name == family.name + suffix:
+                    yield tuple(sample.labels[name] for name in self.labelnames), sample
+
+    def collect(self) -> Dict[Tuple[str, ...], Any]:
+        """
+        Current value of the metric (current process).
+
+        :return: Metric values indexed by label values.
+        """
+        return {key: sample.value for key, sample in self._samples()}
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing counter.
+    """
+
+    metric_class = prometheus_client.Counter
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Increments the counter.
+
+        :param amount: Amount to increment by.
+        :param labels: Label values (one per label name).
+        """
+        self._child(labels).inc(amount)
+
+    def collect(self) -> Dict[Tuple[str, ...], Any]:
+        """
+        Current value of the counter (current process).
+
+        :return: Counter values indexed by label values.
+        """
+        return {key: sample.value for key, sample in self._samples("_total")}
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down. Values of the live processes are summed up.
+    """
+
+    metric_class = prometheus_client.Gauge
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        Initializes a class instance and registers it in :data:`REGISTRY`.
+
+        :param name: Metric name.
+        :param documentation: Metric description.
+        :param labelnames: Names of the labels the gauge is split by.
+        """
+        super().__init__(name, documentation, labelnames, multiprocess_mode="livesum")
+
+    def set(self, value: float, **labels: str) -> None:
+        """
+        Sets the gauge value.
+
+        :param value: New value.
+        :param labels: Label values (one per label name).
+        """
+        self._child(labels).set(value)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over a set of buckets (upper bounds).
+    """
+
+    metric_class = prometheus_client.Histogram
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = prometheus_client.Histogram.DEFAULT_BUCKETS,
+    ):
+        """
+        Initializes a class instance and registers it in :data:`REGISTRY`.
+
+        :param name: Metric name.
+        :param documentation: Metric description.
+        :param labelnames: Names of the labels the histogram is split by.
+        :param buckets: Upper bounds of the buckets (ascending).
+        """
+        super().__init__(name, documentation, labelnames, buckets=buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Records an observed value.
+
+        :param value: Observed value.
+        :param labels: Label values (one per label name).
+        """
+        self._child(labels).observe(value)
+
+    def collect(self) -> Dict[Tuple[str, ...], Any]:
+        """
+        Current value of the histogram (current process).
+
+        :return: `[bucket counts (not cumulative, the last bucket being
+            `+Inf`), sum]` lists indexed by label values.
+        """
+        values: Dict[Tuple[str, ...], Any] = {}
+        for key, sample in self._samples("_bucket"):
+            counts = values.setdefault(key, [[], 0.0])[0]
+            counts.append(sample.value)
+        for key, (counts, _) in values.items():
+            values[key][0] = [int(n - prev) for n, prev in zip(counts, [0.0] + counts[:-1])]
+        for key, sample in self._samples("_sum"):
+            values[key][1] = sample.value
+        return values
+
+
+def exposition() -> Tuple[bytes, str]:
+    """
+    Renders every metric in the Prometheus text format, aggregating the
+    values of every process in multiprocess mode.
+
+    :return: Rendered metrics and their content type.
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+
+    return generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+# ---- Metrics definitions ---- #
+#: Transactions re-run after a concurrency conflict.
+db_conflict_retries = Counter(
+    "wallet_db_conflict_retries_total",
+    "Transactions re-run after a serialization failure or deadlock",
+    ("endpoint", "sqlstate"),
+)
+#: Transactions given up after exhausting the conflict retries.
+db_conflict_exhausted = Counter(
+    "wallet_db_conflict_exhausted_total",
+    "Transactions that kept conflicting after the maximum number of retries",
+    ("endpoint",),
+)
+#: Group commits made by the transfers committer threads.
+group_commits = Counter(
+    "wallet_group_commits_total", "Database transactions made by the transfers group commit"
+)
+#: Transfers applied by the transfers committer threads.
+group_commit_size = Counter(
+    "wallet_group_commit_transfers_total", "Transfers applied through the transfers group commit"
+)
+#: Balance reads served by the shared-memory balance cache.
+balance_cache_hits = Counter(
+    "wallet_balance_cache_hits_total", "Balance reads served by the balance cache"
+)
+#: Balance reads that missed the shared-memory balance cache.
+balance_cache_misses = Counter(
+    "wallet_balance_cache_misses_total", "Balance reads that fell back to the database"
+)
+#: Connections checked out from the SQLAlchemy pool.
+db_pool_checked_out = Gauge(
+    "wallet_db_pool_checked_out_connections", "Connections checked out from the database pool"
+)
+#: Connections opened beyond the SQLAlchemy pool size.
+db_pool_overflow = Gauge(
+    "wallet_db_pool_overflow_connections", "Connections opened beyond the database pool size"
+)
+#: Time waited for a connection of the SQLAlchemy pool.
+db_pool_wait_seconds = Histogram(
+    "wallet_db_pool_wait_seconds",
+    "Time waited to check a connection out of the database pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+#: Checkouts given up after the pool timeout.
+db_pool_timeouts = Counter(
+    "wallet_db_pool_timeouts_total", "Connection checkouts that timed out waiting for the pool"
+)
+#: Requests being handled.
+http_requests_in_flight = Gauge(
+    "wallet_http_requests_in_flight", "HTTP requests being handled (admission control)"
+)
+#: Requests shed by the admission control.
+admission_rejected = Counter(
+    "wallet_admission_rejected_total",
+    "HTTP requests shed with a 503 by the admission control",
+    ("endpoint", "reason"),
+)
+#: Requests handled.
+http_requests = Counter(
+    "wallet_http_requests_total", "HTTP requests handled", ("endpoint", "method", "status")
+)
+#: Requests latency.
+http_request_seconds = Histogram(
+    "wallet_http_request_duration_seconds",
+    "Time spent handling HTTP requests",
+    ("endpoint", "method"),
+)
+#: Time spent in database queries per request.
+db_request_seconds = Histogram(
+    "wallet_db_request_duration_seconds",
+    "Time spent in database queries per request",
+    ("endpoint",),
+)
+#: Database queries made per request.
+db_request_queries = Histogram(
+    "wallet_db_request_queries",
+    "Database queries made per request",
+    ("endpoint",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 1000),
+)
+#: Time spent (de)serializing payloads per request.
+serialization_seconds = Histogram(
+    "wallet_serialization_duration_seconds",
+    "Time spent (de)serializing payloads per request",
+    ("endpoint",),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+)
+#: Unexpected failures of the compiled serializers, delegated to marshmallow.
+serialization_fallbacks = Counter(
+    "wallet_serialization_fallbacks_total",
+    "Unexpected failures of the compiled serializers, delegated to marshmallow",
+    ("schema", "operation"),
+)
+#: Transfers requested (single and batch transfers).
+transfers = Counter(
+    "wallet_transfers_total",
+    "Transfers requested by outcome (done, failed, aborted or the error code)",
+    ("outcome",),
+)
@@ -0,0 +1,131 @@
+"""
+Money amounts in minor units.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Union
+
+
+#: Decimal places of the amounts (the minor unit is a cent).
+DECIMAL_PLACES = 2
+
+#: Highest amount in minor units (amounts are stored as BIGINT).
+MAX_CENTS = 2**63 - 1
+
+_CENTS_PER_UNIT = 10**DECIMAL_PLACES
+# Plain decimal notation, parsed without going through `Decimal`
+_PLAIN_AMOUNT = re.compile(r"([+-]?)(\d+)(?:\.(\d*))?\Z")
+
+
+class DecimalPlacesError(ValueError):
+    """Amount with fractions of a minor unit."""
+
+
+class Money(object):
+    """
+    An amount of money as an integer number of minor units: exact, compact
+    and cheap to add, subtract and compare. Instances must not be mutated.
+    """
+
+    __slots__ = ("cents",)
+
+    def __init__(self, cents: int):
+        """
+        Initializes a class instance.
+
+        :param cents: Amount in minor units.
+        """
+        #: Amount in minor units.
+        self.cents = cents
+
+    @classmethod
+    def parse(cls, value: Union[str, int, float, Decimal]) -> "Money":
+        """
+        Parses a decimal amount in units, e.g. `"12.5"`.
+
+        :param value: Amount as a string or number.
+        :return: The amount.
+        :raises DecimalPlacesError: if the amount has fractions of a minor unit.
+        :raises OverflowError: if the amount is out of the storable range.
+        :raises ValueError: if `value` isn't a finite number.
+        """
+        match = _PLAIN_AMOUNT.match(value) if isinstance(value, str) else None
+        if match:
+            sign, units, fraction = match.groups()
+            fraction = (fraction or "").ljust(DECIMAL_PLACES, "0")
+            if fraction[DECIMAL_PLACES:].strip("0"):
+                raise DecimalPlacesError(value)
+            cents = int(units) * _CENTS_PER_UNIT + int(fraction[:DECIMAL_PLACES])
+            cents = -cents if sign == "-" else cents
+        else:
+            # Any other notation (exponents, surrounding spaces...) and numbers
+            try:
+                amount = Decimal(str(value)).scaleb(DECIMAL_PLACES)
+            except InvalidOperation:
+                raise ValueError(value)
+            if isinstance(value, bool) or not amount.is_finite():
+                raise ValueError(value)
+            if amount != amount.to_integral_value():
+                raise DecimalPlacesError(value)
+            cents = int(amount)
+
+        if abs(cents) > MAX_CENTS:
+            raise OverflowError(value)
+        return cls(cents)
+
+    def __str__(self) -> str:
+        """Amount in units with two decimal places, e.g. `12.50`."""
+        units, cents = divmod(abs(self.cents), _CENTS_PER_UNIT)
+        return f"{'-' if self.cents < 0 else ''}{units}.{cents:0{DECIMAL_PLACES}d}"
+
+    def __repr__(self) -> str:
+        """Object string representation."""
+        return f"Money('{self}')"
+
+    def __hash__(self) -> int:
+        return hash(self.cents)
+
+    def __bool__(self) -> bool:
+        return self.cents != 0
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents == other.cents
+
+    def __lt__(self, other: "Money") -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents < other.cents
+
+    def __le__(self, other: "Money") -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents <= other.cents
+
+    def __gt__(self, other: "Money") -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents > other.cents
+
+    def __ge__(self, other: "Money") -> bool:
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents >= other.cents
+
+    def __add__(self, other: "Money") -> "Money":
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.cents + other.cents)
+
+    def __sub__(self, other: "Money") -> "Money":
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.cents - other.cents)
+
+    def __neg__(self) -> "Money":
+        return Money(-self.cents)
+
+
+#: No money.
+ZERO = Money(0)
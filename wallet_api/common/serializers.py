@@ -1,51 +1,117 @@
 """
 Set of serializers for each API endpoint.
 """
-from decimal import Context, Decimal, Inexact
+import base64
+import binascii
+from datetime import datetime, timezone
 
-from marshmallow import fields, Schema, ValidationError
-from marshmallow.validate import Range
+from marshmallow import fields, post_load, Schema
+from marshmallow.validate import Length, OneOf, Range
 
+from wallet_api.common.compiled import CompiledSchema
+from wallet_api.common.money import DECIMAL_PLACES, DecimalPlacesError, Money, ZERO
+from wallet_api.models import TransactionType, User
+from wallet_api.monitoring import serialization_timer
 
-# Max number of decimal digits allowed
-MAX_DECIMAL_PLACES = 2
+
+# Max number of transfers in a batch
+MAX_BATCH_TRANSFERS = 10000
+# Default and max number of transactions per history page
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 
 # ---- Validators ---- #
-def decimal_places(value: Decimal) -> bool:
+#: Validates amounts aren't negative.
+NON_NEGATIVE = Range(min=ZERO, error="Must be at least 0.")
+
+
+# ---- Fields ---- #
+class MoneyField(fields.Field):
     """
-    Serializer validator that checks if `value` has no more than two decimal
-    digits.
+    Amount of money: loaded from a decimal string or number with no more than
+    two decimal digits and dumped as a string with two decimal digits.
+    """
+
+    default_error_messages = {
+        "invalid": "Not a valid number.",
+        "decimal_places": f"No more than {DECIMAL_PLACES} decimal digits allowed",
+        "range": "Amount out of range.",
+    }
+    #: Types encoded by the JSON provider as this field serializes them.
+    native_types = (Money,)
+
+    def _serialize(self, value, attr, obj):
+        if value is None:
+            return None
+        return str(value)
 
-    :param value: a `Decimal` value (deserialized data).
-    :return: `True` if validation passes. `False` otherwise.
-    :raises marshmallow.exceptions.ValidationError: if validation fails.
+    def _deserialize(self, value, attr, data):
+        try:
+            return Money.parse(value)
+        except DecimalPlacesError:
+            self.fail("decimal_places")
+        except OverflowError:
+            self.fail("range")
+        except (TypeError, ValueError):
+            self.fail("invalid")
+
+
+class KeysetCursor(fields.Field):
+    """
+    Opaque pagination cursor: the `(timestamp, id)` of the last entry of a
+    page, URL-safe base64 encoded.
     """
-    try:
-        value.quantize(Decimal(10) ** -MAX_DECIMAL_PLACES, context=Context(traps=[Inexact]))
-    except Inexact:
-        raise ValidationError(f"No more than {MAX_DECIMAL_PLACES} decimal digits allowed")
 
-    return True
+    default_error_messages = {"invalid": "Invalid cursor."}
+
+    def _serialize(self, value, attr, obj):
+        if value is None:
+            return None
+        timestamp, entry_id = value
+        token = f"{timestamp.isoformat()}|{entry_id}".encode()
+        return base64.urlsafe_b64encode(token).decode().rstrip("=")
+
+    def _deserialize(self, value, attr, data):
+        try:
+            token = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            timestamp, entry_id = token.split("|")
+            return datetime.fromisoformat(timestamp), int(entry_id)
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            self.fail("invalid")
 
 
 # ---- Serializers ---- #
-class UserInputSchema(Schema):
+class BaseSchema(Schema):
+    """
+    Base serializer: times (de)serializations for the request metrics.
+    """
+
+    def load(self, *args, **kwargs):
+        with serialization_timer():
+            return super().load(*args, **kwargs)
+
+    def dump(self, *args, **kwargs):
+        with serialization_timer():
+            return super().dump(*args, **kwargs)
+
+
+class UserInputSchema(BaseSchema):
     """
     Serializar of the user endpoint's request data.
     """
 
-    #: User fullname.
-    name = fields.Str(required=True, allow_none=False)
-    #: User email.
-    email = fields.Email(required=True, allow_none=False)
-    #: Initial balance upon account creation.
-    init_balance = fields.Decimal(
-        missing=Decimal("0.00"), allow_none=False, as_string=True, validate=decimal_places
+    #: User fullname (as long as the column allows).
+    name = fields.Str(required=True, allow_none=False, validate=Length(max=User.name.type.length))
+    #: User email (as long as the column allows).
+    email = fields.Email(
+        required=True, allow_none=False, validate=Length(max=User.email.type.length)
     )
+    #: Initial balance upon account creation.
+    init_balance = MoneyField(missing=ZERO, allow_none=False)
 
 
-class UserOutputSchema(Schema):
+class UserOutputSchema(BaseSchema):
     """
     Serializar of the user endpoint's response data.
     """
@@ -54,7 +120,31 @@ class UserOutputSchema(Schema):
     id = fields.Int(dump_to="userId")
 
 
-class UserBalanceOutputSchema(Schema):
+class UserBulkRowOutputSchema(BaseSchema):
+    """
+    Serializer of a rejected row of the bulk users endpoint's response data.
+    """
+
+    #: Input line number.
+    line = fields.Int()
+    #: Row status (`duplicate` or `invalid`).
+    status = fields.Str()
+    #: Validation errors (`invalid` rows).
+    errors = fields.Raw()
+
+
+class UserBulkOutputSchema(BaseSchema):
+    """
+    Serializer of the bulk users endpoint's response data.
+    """
+
+    #: Number of users created.
+    created = fields.Int()
+    #: Rows not imported.
+    rejected = fields.Nested(UserBulkRowOutputSchema, many=True)
+
+
+class UserBalanceOutputSchema(BaseSchema):
     """
     Serializer of the user balance endpoint's response data.
     """
@@ -62,10 +152,10 @@ class UserBalanceOutputSchema(Schema):
     #: User Id.
     userId = fields.Int()
     #: User current balance.
-    balance = fields.Decimal(allow_none=False, as_string=True)
+    balance = MoneyField(allow_none=False)
 
 
-class UserTransferInputSchema(Schema):
+class UserTransferInputSchema(BaseSchema):
     """
     Serializer of the user transfer endpoint's request data.
     """
@@ -73,12 +163,10 @@ class UserTransferInputSchema(Schema):
     #: Transfer recipient user ID.
     toUserId = fields.Int(required=True, allow_none=False)
     #: Amount of money to tranfer.
-    amount = fields.Decimal(
-        required=True, allow_none=False, validate=(decimal_places, Range(min=0))
-    )
+    amount = MoneyField(required=True, allow_none=False, validate=NON_NEGATIVE)
 
 
-class UserTransferOutputSchema(Schema):
+class UserTransferOutputSchema(BaseSchema):
     """
     Serializer of the user tranfer endpoint's response data.
     """
@@ -87,3 +175,161 @@ class UserTransferOutputSchema(Schema):
     status = fields.Str()
     #: Transfer timestamp (UTC).
     timestamp = fields.DateTime()
+
+
+class TransferItemInputSchema(BaseSchema):
+    """
+    Serializer of a single transfer of the transfers batch endpoint's request data.
+    """
+
+    #: Transfer sender user ID.
+    fromUserId = fields.Int(required=True, allow_none=False)
+    #: Transfer recipient user ID.
+    toUserId = fields.Int(required=True, allow_none=False)
+    #: Amount of money to tranfer.
+    amount = MoneyField(required=True, allow_none=False, validate=NON_NEGATIVE)
+
+
+class TransferBatchInputSchema(BaseSchema):
+    """
+    Serializer of the transfers batch endpoint's request data.
+    """
+
+    #: Transfers to make (in order).
+    transfers = fields.Nested(
+        TransferItemInputSchema,
+        many=True,
+        required=True,
+        allow_none=False,
+        validate=Length(min=1, max=MAX_BATCH_TRANSFERS),
+    )
+    #: `atomic` (all-or-nothing) or `best_effort` (skip the failing transfers).
+    mode = fields.Str(missing="atomic", allow_none=False, validate=OneOf(("atomic", "best_effort")))
+
+
+class TransferItemOutputSchema(BaseSchema):
+    """
+    Serializer of a single transfer result of the transfers batch endpoint's response data.
+    """
+
+    #: Tranfer status (`done`, `failed` or `aborted`).
+    status = fields.Str()
+    #: Reason of the failure.
+    error = fields.Str()
+
+
+class TransferBatchOutputSchema(BaseSchema):
+    """
+    Serializer of the transfers batch endpoint's response data.
+    """
+
+    #: Batch status (`done`, `partial` or `failed`).
+    status = fields.Str()
+    #: Transfers timestamp (UTC).
+    timestamp = fields.DateTime()
+    #: Per-transfer results (in request order).
+    results = fields.Nested(TransferItemOutputSchema, many=True)
+
+
+class DateRangeInputSchema(BaseSchema):
+    """
+    Base serializer of the query strings filtering transactions by date range.
+    """
+
+    #: Only return transactions from this date-time (inclusive).
+    since = fields.DateTime(load_from="from", allow_none=False)
+    #: Only return transactions up to this date-time (exclusive).
+    until = fields.DateTime(load_from="to", allow_none=False)
+
+    @post_load
+    def to_utc(self, data: dict) -> dict:
+        """Converts the date-time filters to naive UTC (as stored)."""
+        for key in ("since", "until"):
+            if key in data and data[key].tzinfo is not None:
+                data[key] = data[key].astimezone(timezone.utc).replace(tzinfo=None)
+        return data
+
+
+class UserTransactionsInputSchema(DateRangeInputSchema):
+    """
+    Serializer of the user transactions endpoint's query string.
+    """
+
+    #: Maximum number of transactions of the page.
+    limit = fields.Int(
+        missing=DEFAULT_PAGE_SIZE, allow_none=False, validate=Range(min=1, max=MAX_PAGE_SIZE)
+    )
+    #: Cursor of the page (`next` of the previous page), first page if missing.
+    cursor = KeysetCursor(allow_none=False)
+    #: Only return transactions of this type.
+    type = fields.Str(allow_none=False, validate=OneOf([t.value for t in TransactionType]))
+
+    @post_load
+    def to_trans_type(self, data: dict) -> dict:
+        """Converts the type filter to its enum."""
+        if "type" in data:
+            data["type"] = TransactionType(data["type"])
+        return data
+
+
+class UserStatementInputSchema(DateRangeInputSchema):
+    """
+    Serializer of the user statement endpoint's query string.
+    """
+
+    #: Statement format.
+    format = fields.Str(missing="ndjson", allow_none=False, validate=OneOf(("ndjson", "csv")))
+
+
+class TransactionOutputSchema(BaseSchema):
+    """
+    Serializer of a single transaction of the user transactions endpoint's response data.
+    """
+
+    #: Transaction Id.
+    id = fields.Int()
+    #: Transaction type.
+    type = fields.Function(lambda row: row.trans_type.value)
+    #: Transaction amount.
+    amount = MoneyField()
+    #: User balance after the transaction.
+    balance = MoneyField(attribute="new_balance")
+    #: Transaction timestamp (UTC).
+    timestamp = fields.DateTime()
+
+
+class UserTransactionsOutputSchema(BaseSchema):
+    """
+    Serializer of the user transactions endpoint's response data.
+    """
+
+    #: User Id.
+    userId = fields.Int()
+    #: Page transactions, newest first.
+    transactions = fields.Nested(TransactionOutputSchema, many=True)
+    #: Cursor of the next page (`None` on the last page).
+    next = KeysetCursor()
+
+
+class StatementEntryOutputSchema(TransactionOutputSchema):
+    """
+    Serializer of a single transaction of the user statement endpoint's response data.
+    """
+
+    #: User balance before the transaction.
+    openingBalance = MoneyField(attribute="opening_balance")
+
+
+# ---- Compiled serializers (shared by every request) ---- #
+user_input_schema = CompiledSchema(UserInputSchema)
+user_output_schema = CompiledSchema(UserOutputSchema)
+user_bulk_output_schema = CompiledSchema(UserBulkOutputSchema)
+user_balance_output_schema = CompiledSchema(UserBalanceOutputSchema)
+user_transfer_input_schema = CompiledSchema(UserTransferInputSchema)
+user_transfer_output_schema = CompiledSchema(UserTransferOutputSchema)
+transfer_batch_input_schema = CompiledSchema(TransferBatchInputSchema)
+transfer_batch_output_schema = CompiledSchema(TransferBatchOutputSchema)
+user_transactions_input_schema = CompiledSchema(UserTransactionsInputSchema)
+user_transactions_output_schema = CompiledSchema(UserTransactionsOutputSchema)
+user_statement_input_schema = CompiledSchema(UserStatementInputSchema)
+statement_entries_output_schema = CompiledSchema(StatementEntryOutputSchema, many=True)
@@ -1,7 +1,7 @@
 """
 Configuration classes of the application.
 """
-from wallet_api.common.configfetch import Configuration, IntValue, Value
+from wallet_api.common.configfetch import BooleanValue, Configuration, FloatValue, IntValue, Value
 
 
 class FlaskAppConfig(Configuration):
@@ -22,6 +22,9 @@ class FlaskAppConfig(Configuration):
     #: Flask secret key
     secret_key = Value("")
 
+    #: JSON backend of requests and responses: auto (fastest installed), orjson or simplejson.
+    json_backend = Value("auto")
+
 
 class PSQLClientConfig(Configuration):
     """Configuration class of the PostgreSQL client."""
@@ -50,17 +53,82 @@ class PSQLClientConfig(Configuration):
     #: PostgreSQL db password.
     password = Value("")
 
+    #: Money transfers concurrency strategy: `serializable` relies on SERIALIZABLE
+    # isolation, `row_lock` locks the involved balances (`SELECT ... FOR UPDATE`
+    # in ascending user Id order) under READ COMMITTED and `stored_function`
+    # makes the whole transfer server-side (`wallet_transfer` database function)
+    # under READ COMMITTED.
+    transfer_strategy = Value("serializable")
+
+    #: Hands transfers over to a per-process committer thread that applies the
+    # ones received within a short window in a single database transaction.
+    # Groups always lock the involved balances under READ COMMITTED, whatever
+    # the `transfer_strategy`.
+    transfer_group_commit = BooleanValue(False)
+
+    #: Time window (seconds) the committer waits for more transfers to group.
+    group_commit_window = FloatValue(0.002)
+
+    #: Maximum number of transfers applied per group commit.
+    group_commit_max_size = IntValue(64)
+
+    #: Maximum number of times a transaction aborted by a concurrency conflict
+    # (serialization failure or deadlock) is re-run before giving up.
+    conflict_max_retries = IntValue(3)
+
+    #: Base delay (seconds) of the jittered exponential backoff between re-runs.
+    conflict_backoff_base = FloatValue(0.005)
+
+    #: Maximum delay (seconds) between re-runs.
+    conflict_backoff_max = FloatValue(0.1)
+
+    #: Connections kept open by the pool of each process. Size it against the
+    # gunicorn worker layout: every thread may hold one connection.
+    pool_size = IntValue(5)
+
+    #: Connections opened beyond `pool_size` on demand (closed when returned).
+    max_overflow = IntValue(10)
+
+    #: Seconds to wait for a connection before giving up.
+    pool_timeout = FloatValue(30)
+
+    #: Seconds after which a connection is recycled (`-1` never).
+    pool_recycle = IntValue(-1)
+
+    #: Tests connections liveness on checkout (a round trip per checkout).
+    pool_pre_ping = BooleanValue(False)
+
+    #: Server-side statement timeout (milliseconds, `0` disables it).
+    statement_timeout = IntValue(0)
+
+    #: Server-side lock wait timeout (milliseconds, `0` disables it).
+    lock_timeout = IntValue(0)
+
+    #: PgBouncer transaction pooling compatibility: no startup parameters
+    # (timeouts are `SET LOCAL` at the beginning of every transaction) and no
+    # asyncpg prepared statements cache. The balance cache listener requires
+    # a session, so it needs a direct connection (`BALANCE_CACHE_LISTEN_URL`).
+    pgbouncer = BooleanValue(False)
+
+    #: Minimum number of connections of the asyncpg pool (ASGI variant).
+    async_pool_min_size = IntValue(2)
+
+    #: Maximum number of connections of the asyncpg pool (ASGI variant).
+    async_pool_max_size = IntValue(20)
+
     @staticmethod
-    def connection_url(test: bool = False) -> str:
+    def connection_url(test: bool = False, dialect: str = None) -> str:
         """
         Gets the database connection URL as expected by SQLAlchemy.
         https://docs.sqlalchemy.org/en/latest/core/engines.html#postgresql
 
         :param test: If `True` returns the URL of the testing database.
+        :param dialect: URL scheme overriding the configured dialect (e.g.
+            `postgresql` for a libpq-style DSN).
         :return: Corresponding PostgreSQL connection URL.
         """
         base_url = "{}://{}:{}@{}:{}/{}".format(
-            PSQLClientConfig.dialect,
+            dialect or PSQLClientConfig.dialect,
             PSQLClientConfig.username,
             PSQLClientConfig.password,
             PSQLClientConfig.host,
@@ -69,3 +137,101 @@ class PSQLClientConfig(Configuration):
         )
 
         return base_url
+
+    @staticmethod
+    def transfer_isolation_level() -> str:
+        """
+        Gets the transaction isolation level required by the configured
+        transfers concurrency strategy.
+
+        :return: SQLAlchemy driver-specific isolation level.
+        """
+        if PSQLClientConfig.transfer_strategy in ("row_lock", "stored_function"):
+            return "READ COMMITTED"
+        return "SERIALIZABLE"
+
+
+class BalanceCacheConfig(Configuration):
+    """Configuration class of the shared-memory balance cache."""
+
+    #: Environment variables prefix of the class.
+    _prefix = "BALANCE_CACHE_"
+
+    #: Serves balance reads from a memory-mapped file shared by the workers of
+    # a host, kept fresh through the `transaction_log` insert notifications.
+    enabled = BooleanValue(False)
+
+    #: Memory-mapped file of the cache (gunicorn's `worker_tmp_dir` is `/dev/shm`).
+    path = Value("/dev/shm/wallet_api_balance_cache")
+
+    #: Highest user Id cached (the file takes 32 bytes per user).
+    capacity = IntValue(1000000)
+
+    #: Database URL of the listener connection (defaults to the app's one),
+    # which must not go through a transaction pooler (e.g. PgBouncer).
+    listen_url = Value("")
+
+
+class SQLProfilerConfig(Configuration):
+    """Configuration class of the per-request SQL profiler."""
+
+    #: Environment variables prefix of the class.
+    _prefix = "SQL_PROFILER_"
+
+    #: Records every statement issued by the requests (along with its duration
+    # and view) to log the requests exceeding the budgets and the statements
+    # repeated within a request (N+1 query patterns).
+    enabled = BooleanValue(False)
+
+    #: Queries per request above which the request is logged.
+    query_budget = IntValue(20)
+
+    #: Database time (seconds) per request above which the request is logged.
+    db_time_budget = FloatValue(0.1)
+
+    #: Executions of the same statement within a request reported as N+1.
+    repeated_threshold = IntValue(5)
+
+
+class ArchiveConfig(Configuration):
+    """Configuration class of the transaction log archive."""
+
+    #: Environment variables prefix of the class.
+    _prefix = "ARCHIVE_"
+
+    #: Directory of the archived history files, merged into the history and
+    # statement reads (archival is disabled if empty).
+    path = Value("")
+
+    #: Months of history kept in the database, current one included.
+    retain_months = IntValue(12)
+
+
+class AdmissionConfig(Configuration):
+    """Configuration class of the admission control (per worker process)."""
+
+    #: Environment variables prefix of the class.
+    _prefix = "ADMISSION_"
+
+    #: Requests handled at once by a worker at which new ones are shed with
+    # a `503` (`0` disables the limit).
+    max_in_flight = IntValue(0)
+
+    #: Requests waiting for a database connection (pool queue depth) at which
+    # new ones are shed (`0` disables the limit).
+    max_pool_waiting = IntValue(0)
+
+    #: Seconds waited for a database connection (by a waiting request or the
+    # last checkout within `saturation_window`) above which new requests are
+    # shed (`0` disables the budget).
+    pool_wait_budget = FloatValue(0)
+
+    #: Seconds a finished checkout's wait counts towards the budget.
+    saturation_window = FloatValue(1)
+
+    #: Seconds clients are told to wait before retrying (`Retry-After`).
+    retry_after = IntValue(1)
+
+    #: Balance reads are only shed by the in-flight limit, not by the pool
+    # saturation (they are short and served by the balance cache if enabled).
+    prioritize_reads = BooleanValue(False)
@@ -0,0 +1,151 @@
+"""
+Transfers group commit: a per-process committer thread that applies the
+transfers handed over by concurrent requests within a short window in a
+single database transaction (one commit/fsync for the whole group).
+
+Groups lock the involved balances under READ COMMITTED (as the `row_lock`
+strategy does, a batch at a time) whatever the configured transfer strategy:
+neither a SERIALIZABLE group nor one `wallet_transfer` call per transfer would
+share a single commit.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple, Type
+
+from flask import current_app, Flask
+from sqlalchemy.exc import SQLAlchemyError
+
+from wallet_api import conflict_backoff, db, db_conflict_sqlstate
+from wallet_api.common import exception, metrics
+from wallet_api.config import PSQLClientConfig as db_conf
+from wallet_api.models import AccountBalance, TransactionLog, Transfer
+
+
+class GroupCommitter(object):
+    """
+    Collects transfers from request threads and applies them in groups.
+    """
+
+    def __init__(self):
+        """Initializes a class instance (the thread starts on first use)."""
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: "queue.Queue[Tuple[Transfer, Future]]" = queue.Queue()
+
+    def submit(self, transfer: Transfer) -> "Future[str]":
+        """
+        Hands a transfer over to the committer thread.
+
+        :param transfer: Transfer to make.
+        :return: Future resolving to the transfer status (`done` or `failed`)
+            or raising the API exception that prevented it.
+        """
+        self._ensure_started(current_app._get_current_object())
+        future: "Future[str]" = Future()
+        self._queue.put((transfer, future))
+
+        return future
+
+    def _ensure_started(self, app: Flask) -> None:
+        """
+        Starts the committer thread of the current process. Gunicorn workers
+        are forked, so a thread started before the fork is not inherited.
+
+        :param app: Flask application.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            threading.Thread(
+                target=self._run, args=(app, self._queue), name="group-committer", daemon=True
+            ).start()
+
+    def _run(self, app: Flask, pending: "queue.Queue[Tuple[Transfer, Future]]") -> None:
+        """
+        Committer thread loop: waits for a transfer and collects the ones
+        received within the group commit window (or up to the maximum group
+        size) before applying them.
+
+        :param app: Flask application.
+        :param pending: Queue of transfers to apply.
+        """
+        with app.app_context():
+            while True:
+                group = [pending.get()]
+                deadline = time.monotonic() + db_conf.group_commit_window
+                while len(group) < db_conf.group_commit_max_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        group.append(pending.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+
+                try:
+                    self._apply(group)
+                except Exception as e:
+                    # Keep the thread alive and release the waiting requests
+                    db.session.rollback()
+                    app.logger.exception("Group commit failed")
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(e)
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def _apply(group: List[Tuple[Transfer, Future]]) -> None:
+        """
+        Applies a group of transfers in a single database transaction,
+        re-running it on concurrency conflicts (locks included) after a
+        jittered exponential backoff. Once the retries are exhausted the
+        transfers fail with a `ConflictException`.
+
+        :param group: Transfers to apply along with their futures.
+        """
+        metrics.group_commit_size.inc(len(group))
+        metrics.group_commits.inc()
+        attempt = 0
+        while True:
+            if not current_app.config["TESTING"]:
+                db.session.connection(execution_options={"isolation_level": "READ COMMITTED"})
+            errors: List[Optional[Type[exception.BaseApiException]]] = [None] * len(group)
+            status = "done"
+            try:
+                rows, errors = AccountBalance.transfer_many(transfer for transfer, _ in group)
+                if rows:
+                    TransactionLog.insert_many(rows)
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                sqlstate = db_conflict_sqlstate(e)
+                if sqlstate is not None and attempt < db_conf.conflict_max_retries:
+                    metrics.db_conflict_retries.inc(endpoint="group_commit", sqlstate=sqlstate)
+                    time.sleep(conflict_backoff(attempt))
+                    attempt += 1
+                    continue
+                if sqlstate is not None:
+                    metrics.db_conflict_exhausted.inc(endpoint="group_commit")
+                    errors = [exception.ConflictException] * len(group)
+                else:
+                    current_app.logger.exception(
+                        "Group commit of %d transfers failed", len(group)
+                    )
+                    status = "failed"
+            break
+
+        for (_, future), error in zip(group, errors):
+            if error:
+                future.set_exception(error())
+            else:
+                future.set_result(status)
+
+
+#: Committer of the current process.
+committer = GroupCommitter()
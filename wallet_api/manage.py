@@ -6,10 +6,18 @@ must be set:
     FLASK_APP=wallet_api/manage.py
     FLASK_ENV=production
 """
+from datetime import datetime
+
+import click
 from flask_migrate import Migrate
 
 from wallet_api import create_app, db
-from wallet_api.models import TransactionLog, User
+from wallet_api.archive import archive_history
+from wallet_api.bulk import CHUNK_SIZE, import_users, read_records
+from wallet_api.config import ArchiveConfig as archive_conf
+from wallet_api.models import AccountBalance, BalanceCheckpoint, TransactionLog, User
+from wallet_api.partitions import maintain
+from wallet_api.seed import CHUNK_ROWS, seed, SeedOptions
 
 
 app = create_app()
@@ -19,7 +27,14 @@ migrate = Migrate(app, db)
 @app.shell_context_processor
 def make_shell_context() -> dict:
     """The shell command."""
-    return dict(app=app, db=db, User=User, TransactionLog=TransactionLog)
+    return dict(
+        app=app,
+        db=db,
+        User=User,
+        TransactionLog=TransactionLog,
+        AccountBalance=AccountBalance,
+        BalanceCheckpoint=BalanceCheckpoint,
+    )
 
 
 @app.cli.command("create_db")
@@ -28,3 +43,124 @@ def create_db() -> None:
     print("Creating application's tables ...")
     db.create_all()
     print("Tables created!!")
+
+
+@app.cli.command("bulk_import_users")
+@click.argument("file", type=click.File("r"))
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["ndjson", "csv"]),
+    help="Input format (defaults to file extension)",
+)
+@click.option("--chunk-size", default=CHUNK_SIZE, help="Users loaded per transaction")
+def bulk_import_users(file, fmt: str, chunk_size: int) -> None:
+    """Imports users from a NDJSON or CSV file."""
+    fmt = fmt or ("csv" if file.name.endswith(".csv") else "ndjson")
+    print(f"Importing users from {file.name} ...")
+    created, rejected = 0, 0
+    for result in import_users(read_records(file, fmt), chunk_size):
+        if result["status"] == "created":
+            created += 1
+        else:
+            rejected += 1
+            print(f"Line {result['line']}: {result['status']} {result.get('errors', '')}")
+    print(f"{created} users created, {rejected} rows rejected!!")
+
+
+@app.cli.command("balance_slots")
+@click.argument("user_id", type=int)
+@click.argument("slots", type=click.IntRange(min=1, max=1024))
+def balance_slots(user_id: int, slots: int) -> None:
+    """Splits/merges a user balance into SLOTS slots (more than 1 for hot accounts)."""
+    print(f"Setting {slots} balance slots to user {user_id} ...")
+    AccountBalance.set_slots(user_id, slots, datetime.utcnow())
+    db.session.commit()
+    print("Balance slots set!!")
+
+
+@app.cli.command("seed")
+@click.option("--users", default=10000, help="Users to create")
+@click.option("--transfers", default=100000, help="Transfers between the new users")
+@click.option("--days", default=365, help="Time span of the transfers (days until now)")
+@click.option("--skew", default=1.1, help="Power-law exponent of the recipients popularity")
+@click.option("--workers", default=1, help="Parallel worker processes")
+@click.option("--chunk-size", default=CHUNK_ROWS, help="Rows per COPY")
+@click.option("--random-seed", type=int, help="Random generator seed (reproducible dataset)")
+def seed_data(
+    users: int, transfers: int, days: int, skew: float, workers: int, chunk_size: int, random_seed
+) -> None:
+    """Generates synthetic users and transfers between them."""
+    print(f"Generating {users} users and {transfers} transfers ...")
+    start = datetime.utcnow()
+    options = SeedOptions(
+        users=users,
+        transfers=transfers,
+        days=days,
+        skew=skew,
+        chunk_rows=chunk_size,
+        random_seed=random_seed,
+    )
+    try:
+        rows = seed(options, workers)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    elapsed = (datetime.utcnow() - start).total_seconds()
+    print(f"{rows} transaction log entries created in {elapsed:.1f}s!!")
+
+
+@app.cli.group()
+def partitions() -> None:
+    """Transaction log monthly partitions."""
+
+
+@partitions.command("maintain")
+@click.option("--ahead", default=3, help="Months to create partitions for in advance")
+@click.option(
+    "--retain",
+    type=click.IntRange(min=1),
+    help="Months to keep attached, current one included (all if missing)",
+)
+@click.option("--drop", is_flag=True, help="Drop the detached partitions instead of keeping them")
+def maintain_partitions(ahead: int, retain: int, drop: bool) -> None:
+    """Creates the upcoming partitions and detaches the expired ones."""
+    print("Maintaining transaction log partitions ...")
+    result = maintain(ahead, retain, drop)
+    for name in result["created"]:
+        print(f"Created {name}")
+    for name in result["detached"]:
+        print(f"{'Dropped' if drop else 'Detached'} {name}")
+    print("Partitions maintained!!")
+
+
+@app.cli.command("checkpoint")
+@click.option(
+    "--as-of", type=click.DateTime(), help="Checkpoint date-time (UTC), defaults to today 00:00"
+)
+def checkpoint(as_of: datetime) -> None:
+    """Records the balances as of a date-time (run periodically, e.g. daily)."""
+    as_of = as_of or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    print(f"Recording balance checkpoint as of {as_of} ...")
+    slots = BalanceCheckpoint.record(as_of)
+    db.session.commit()
+    print(f"{slots} balances recorded!!")
+
+
+@app.cli.command("archive")
+@click.option(
+    "--retain",
+    default=archive_conf.retain_months,
+    type=click.IntRange(min=1),
+    help="Months of history kept in the database, current one included",
+)
+def archive(retain: int) -> None:
+    """Moves the transaction log history older than --retain months to the archive."""
+    if not archive_conf.path:
+        raise click.UsageError("ARCHIVE_PATH must be set")
+    print(f"Archiving transaction log history to {archive_conf.path} ...")
+    try:
+        for name in archive_history(retain):
+            print(f"Archived {name}")
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print("History archived!!")
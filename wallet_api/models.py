@@ -2,12 +2,20 @@
 Data model definitions.
 """
 import enum
+import random
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
 
 from flask import current_app
+from sqlalchemy import BigInteger, bindparam, func, Integer, text, tuple_
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.schema import CreateColumn
+from sqlalchemy.types import TypeDecorator
 
 from wallet_api import db
+from wallet_api.common import exception
+from wallet_api.common.money import Money, ZERO
 
 
 class TransactionType(enum.Enum):
@@ -22,6 +30,83 @@ class TransactionType(enum.Enum):
     WITHDRAWAL = "withdrawal"
 
 
+class Transfer(NamedTuple):
+    """
+    A money transfer between two users.
+    """
+
+    #: Transfer sender user Id.
+    sender_id: int
+    #: Transfer recipient user Id.
+    recipient_id: int
+    #: Amount of money to transfer.
+    amount: Money
+    #: Transfer date-time.
+    timestamp: datetime
+
+
+# ---- Custom column types ---- #
+class MoneyType(TypeDecorator):
+    """
+    Money amounts column: `Money` values stored as BIGINT minor units.
+    """
+
+    impl = BigInteger
+
+    def process_bind_param(self, value: Optional[Money], dialect) -> Optional[int]:
+        return None if value is None else value.cents
+
+    def process_result_value(self, value, dialect) -> Optional[Money]:
+        # Sums of BIGINT columns are NUMERIC
+        return None if value is None else Money(int(value))
+
+
+# ---- Raw SQL statements ---- #
+#: Inserts a user, its initial deposit and balance (nothing if the email exists).
+_CREATE_USER_SQL = text(
+    """
+    WITH new_user AS (
+        INSERT INTO "user" (name, email) VALUES (:name, :email)
+        ON CONFLICT (email) DO NOTHING
+        RETURNING id
+    ), deposit AS (
+        INSERT INTO transaction_log
+            (user_id, trans_type, amount, opening_balance, new_balance, timestamp)
+        SELECT id, CAST(:trans_type AS transactiontype), :amount, 0, :amount, :timestamp
+        FROM new_user
+    ), balance AS (
+        INSERT INTO account_balance (user_id, balance) SELECT id, :amount FROM new_user
+    )
+    SELECT id FROM new_user
+    """
+).bindparams(bindparam("amount", type_=MoneyType))
+
+#: Calls the server-side transfer function.
+_DB_TRANSFER_SQL = text(
+    "SELECT status FROM wallet_transfer(:sender_id, :recipient_id, :amount, :timestamp)"
+).bindparams(bindparam("amount", type_=MoneyType))
+
+#: Records the balance of every balance slot as of `:as_of`: the previous
+#: checkpoint (`:previous`) updated with the entries logged since.
+_RECORD_CHECKPOINT_SQL = text(
+    """
+    INSERT INTO balance_checkpoint (as_of, user_id, slot, balance)
+    SELECT DISTINCT ON (user_id, slot) CAST(:as_of AS timestamp), user_id, slot, balance
+    FROM (
+        SELECT user_id, slot, balance, as_of AS timestamp, 0 AS id
+        FROM balance_checkpoint
+        WHERE as_of = :previous
+        UNION ALL
+        SELECT user_id, slot, new_balance, timestamp, id
+        FROM transaction_log
+        WHERE timestamp >= COALESCE(CAST(:previous AS timestamp), '-infinity')
+            AND timestamp < :as_of
+    ) AS entries
+    ORDER BY user_id, slot, timestamp DESC, id DESC
+    """
+)
+
+
 # ---- DB Models  ---- #
 class User(db.Model):
     """
@@ -36,33 +121,90 @@ class User(db.Model):
     name = db.Column(db.String(50), nullable=False)
     #: User email
     email = db.Column(db.String(254), nullable=False, unique=True, index=True)
-    #: User transactions.
-    transactions = db.relationship("TransactionLog", order_by="TransactionLog.timestamp", lazy=True)
+    #: Number of slots the user balance is split into (`> 1` for hot accounts).
+    balance_slots = db.Column(db.SmallInteger, nullable=False, default=1, server_default="1")
+    #: User transactions (query-able, never loaded as a whole).
+    transactions = db.relationship(
+        "TransactionLog", order_by="TransactionLog.timestamp", lazy="dynamic"
+    )
+    #: User current balance (one entry per slot).
+    balances = db.relationship("AccountBalance", order_by="AccountBalance.slot", lazy=True)
 
     def __repr__(self) -> str:
         """Object string representation."""
         return f"<User(id='{self.id}', name='{self.name}', email='{self.email}')>"
 
+    @classmethod
+    def create(cls, name: str, email: str, init_balance: Money) -> Optional[int]:
+        """
+        Creates a user along with its initial deposit and balance in a single
+        statement (the caller commits).
+
+        :param name: User fullname.
+        :param email: User email.
+        :param init_balance: Initial balance upon account creation.
+        :return: Id of the new user or `None` if the email is already taken.
+        """
+        return db.session.execute(
+            _CREATE_USER_SQL,
+            {
+                "name": name,
+                "email": email,
+                "amount": init_balance,
+                "trans_type": TransactionType.DEPOSIT.name,
+                "timestamp": datetime.utcnow(),
+            },
+        ).scalar()
+
+    @classmethod
+    def exists(cls, user_id: int) -> bool:
+        """
+        Checks whether a user exists.
+
+        :param user_id: Id of the user to query for.
+        :return: `True` if the user exists.
+        """
+        return db.session.query(cls.query.filter(cls.id == user_id).exists()).scalar()
+
 
 class TransactionLog(db.Model):
     """
     Transaction logs data model.
+
+    The table is range partitioned by month on `timestamp` (see
+    `wallet_api.partitions`), its primary key is `(id, timestamp)`: queries
+    bounded by `timestamp` only scan the matching partitions.
     """
 
     __tablename__ = "transaction_log"
+    __table_args__ = (
+        # Covers the latest balance lookup. The migration also INCLUDEs
+        # `new_balance` so the lookup is an index-only scan.
+        db.Index("ix_transaction_log_user_id_timestamp_id", "user_id", "timestamp", "id"),
+        # Serves the history pages filtered by transaction type
+        db.Index(
+            "ix_transaction_log_user_id_trans_type_timestamp_id",
+            "user_id",
+            "trans_type",
+            "timestamp",
+            "id",
+        ),
+    )
 
     #: Table's primary key.
     id = db.Column(db.Integer, primary_key=True)
     #: Transaction user.
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    #: Balance slot of the user affected by the transaction.
+    slot = db.Column(db.SmallInteger, nullable=False, default=0, server_default="0")
     #: Transaction type.
     trans_type = db.Column(db.Enum(TransactionType), nullable=False)
     #: Transaction amount.
-    amount = db.Column(db.DECIMAL(scale=2), nullable=False)
+    amount = db.Column(MoneyType, nullable=False)
     #: User opening balance (before the transanction).
-    opening_balance = db.Column(db.DECIMAL(scale=2), nullable=False)
+    opening_balance = db.Column(MoneyType, nullable=False)
     #: User new balance (after the transanction).
-    new_balance = db.Column(db.DECIMAL(scale=2), nullable=False)
+    new_balance = db.Column(MoneyType, nullable=False)
     #: Transaction date-time.
     timestamp = db.Column(db.DateTime, nullable=False)
 
@@ -77,6 +219,403 @@ class TransactionLog(db.Model):
             f"timestamp='{self.timestamp}')>"
         )
 
+    @classmethod
+    def insert_many(cls, rows: List[dict]) -> None:
+        """
+        Inserts a set of transaction log entries with a single multi-row insert.
+
+        :param rows: Transaction log entries (columns values).
+        """
+        db.session.execute(cls.__table__.insert().values(rows))
+
+    @classmethod
+    def latest_for(cls, user_id: int) -> Optional[Money]:
+        """
+        Fetches the balance left by the latest transaction of a user without
+        loading its history (index-only `ORDER BY ... LIMIT 1`). For hot
+        accounts that's the balance of the slot affected by the transaction.
+
+        :param user_id: Id of the user to query for.
+        :return: The user's latest `new_balance` or `None` if it has no transactions.
+        """
+        return (
+            db.session.query(cls.new_balance)
+            .filter(cls.user_id == user_id)
+            .order_by(cls.timestamp.desc(), cls.id.desc())
+            .limit(1)
+            .scalar()
+        )
+
+    @classmethod
+    def page_for(
+        cls,
+        user_id: int,
+        limit: int,
+        after: Optional[Tuple[datetime, int]] = None,
+        trans_type: Optional[TransactionType] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list:
+        """
+        Fetches a page of a user's transactions, newest first, by keyset
+        (seek) pagination: the page starts right after the `(timestamp, id)`
+        of the previous page last entry, so every page is an index range scan
+        whatever its position in the history (unlike `OFFSET`).
+
+        :param user_id: Id of the user to query for.
+        :param limit: Maximum number of entries.
+        :param after: `(timestamp, id)` of the previous page last entry.
+        :param trans_type: Only fetch entries of this type.
+        :param since: Only fetch entries from this date-time (inclusive).
+        :param until: Only fetch entries up to this date-time (exclusive).
+        :return: Rows (`id`, `trans_type`, `amount`, `new_balance`, `timestamp`).
+        """
+        query = db.session.query(
+            cls.id, cls.trans_type, cls.amount, cls.new_balance, cls.timestamp
+        ).filter(cls.user_id == user_id)
+        if after is not None:
+            # The row comparison doesn't prune partitions, the plain bound does
+            query = query.filter(
+                tuple_(cls.timestamp, cls.id) < tuple_(*after), cls.timestamp <= after[0]
+            )
+        if trans_type is not None:
+            query = query.filter(cls.trans_type == trans_type)
+        if since is not None:
+            query = query.filter(cls.timestamp >= since)
+        if until is not None:
+            query = query.filter(cls.timestamp < until)
+
+        return query.order_by(cls.timestamp.desc(), cls.id.desc()).limit(limit).all()
+
+    @classmethod
+    def statement_for(
+        cls,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[list]:
+        """
+        Streams a user's transactions in chronological order through a
+        server-side (named) cursor, `batch_size` rows at a time, so memory use
+        doesn't depend on the history length. PostgreSQL plans cursors for a
+        fast start, the rows are read along the user's index without sorting.
+
+        :param user_id: Id of the user to query for.
+        :param since: Only fetch entries from this date-time (inclusive).
+        :param until: Only fetch entries up to this date-time (exclusive).
+        :param batch_size: Rows fetched per round trip.
+        :return: Iterator of row batches (`id`, `trans_type`, `amount`,
+            `opening_balance`, `new_balance`, `timestamp`).
+        """
+        query = db.session.query(
+            cls.id, cls.trans_type, cls.amount, cls.opening_balance, cls.new_balance, cls.timestamp
+        ).filter(cls.user_id == user_id)
+        if since is not None:
+            query = query.filter(cls.timestamp >= since)
+        if until is not None:
+            query = query.filter(cls.timestamp < until)
+
+        rows = iter(query.order_by(cls.timestamp, cls.id).yield_per(batch_size))
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+class AccountBalance(db.Model):
+    """
+    Account balance data model. Materializes the `new_balance` of the latest
+    transaction log entry of every user balance slot, so it must be updated in
+    the same database transaction as every `TransactionLog` insert.
+
+    Regular users have a single slot (`0`). Hot accounts split their balance
+    into several slots so concurrent incoming transfers don't serialize on
+    the same row: these pick a random slot while outgoing transfers and
+    balance reads aggregate all of them.
+    """
+
+    __tablename__ = "account_balance"
+
+    #: Balance owner (table's primary key).
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True, autoincrement=False)
+    #: Balance slot (table's primary key).
+    slot = db.Column(
+        db.SmallInteger, primary_key=True, autoincrement=False, default=0, server_default="0"
+    )
+    #: Slot current balance.
+    balance = db.Column(MoneyType, nullable=False)
+
+    def __repr__(self) -> str:
+        """Object string representation."""
+        return (
+            f"<AccountBalance(user_id='{self.user_id}', slot='{self.slot}', "
+            f"balance='{self.balance}')>"
+        )
+
+    @classmethod
+    def total_for(cls, user_id: int) -> Optional[Money]:
+        """
+        Fetches the current balance of a user (sum of its slots).
+
+        :param user_id: Id of the user to query for.
+        :return: The user's balance or `None` if the user doesn't exist.
+        """
+        return db.session.query(func.sum(cls.balance)).filter(cls.user_id == user_id).scalar()
+
+    @classmethod
+    def fetch(cls, *user_ids: int, lock: bool = False) -> Dict[int, List["AccountBalance"]]:
+        """
+        Fetches every balance slot of a set of users in a single query.
+
+        :param user_ids: Ids of the users to query for.
+        :param lock: `True` to lock the rows (`SELECT ... FOR UPDATE`). Locks
+            are acquired in ascending (user Id, slot) order so concurrent
+            callers can't deadlock each other.
+        :return: Balance slots indexed by user Id (missing users are left out).
+        """
+        query = cls.query.filter(cls.user_id.in_(set(user_ids))).order_by(cls.user_id, cls.slot)
+        if lock:
+            query = query.with_for_update()
+
+        accounts: Dict[int, List[AccountBalance]] = {}
+        for account in query:
+            accounts.setdefault(account.user_id, []).append(account)
+
+        return accounts
+
+    @classmethod
+    def fetch_for_transfer(
+        cls, sender_id: int, recipient_id: int, lock: bool = False
+    ) -> Tuple[List["AccountBalance"], Optional["AccountBalance"]]:
+        """
+        Fetches, in a single query, every balance slot of a transfer sender
+        and a random slot of the recipient (the one receiving the money).
+
+        :param sender_id: Transfer sender user Id.
+        :param recipient_id: Transfer recipient user Id.
+        :param lock: `True` to lock the rows (see `fetch`).
+        :return: Sender slots (empty if the sender doesn't exist) and recipient
+            slot (`None` if the recipient doesn't exist).
+        """
+        recipient_slot = (
+            db.session.query(func.floor(func.random() * User.balance_slots).cast(Integer))
+            .filter(User.id == recipient_id)
+            .as_scalar()
+        )
+        query = cls.query.filter(
+            (cls.user_id == sender_id)
+            | ((cls.user_id == recipient_id) & (cls.slot == recipient_slot))
+        ).order_by(cls.user_id, cls.slot)
+        if lock:
+            query = query.with_for_update()
+
+        accounts = query.all()
+        senders = [account for account in accounts if account.user_id == sender_id]
+        if sender_id == recipient_id:
+            return senders, random.choice(senders) if senders else None
+        recipients = [account for account in accounts if account.user_id == recipient_id]
+        return senders, recipients[0] if recipients else None
+
+    @classmethod
+    def transfer_many(
+        cls, transfers: Iterable[Transfer]
+    ) -> Tuple[List[dict], List[Optional[Type[exception.BaseApiException]]]]:
+        """
+        Locks the balances of every involved user at once (every slot of the
+        senders, a random slot of the other recipients, as `fetch_for_transfer`)
+        and makes the transfers in order, skipping the ones that can't be made.
+
+        :param transfers: Transfers to make.
+        :return: `TransactionLog` rows recording the transfers made and the
+            error of each transfer (`None` if it was made).
+        """
+        transfers = list(transfers)
+        sender_ids = {t.sender_id for t in transfers}
+        recipient_ids = {t.recipient_id for t in transfers} - sender_ids
+        condition = cls.user_id.in_(sender_ids)
+        if recipient_ids:
+            recipient_slots = db.session.query(
+                User.id, func.floor(func.random() * User.balance_slots).cast(Integer)
+            ).filter(User.id.in_(recipient_ids))
+            condition |= tuple_(cls.user_id, cls.slot).in_(recipient_slots.subquery())
+        query = cls.query.filter(condition).order_by(cls.user_id, cls.slot).with_for_update()
+
+        accounts: Dict[int, List[AccountBalance]] = {}
+        for account in query:
+            accounts.setdefault(account.user_id, []).append(account)
+
+        rows, errors = [], []
+        for transfer in transfers:
+            senders = accounts.get(transfer.sender_id)
+            recipients = accounts.get(transfer.recipient_id)
+            if not senders or not recipients:
+                errors.append(exception.UserNotFoundException)
+            elif transfer.amount > sum((account.balance for account in senders), ZERO):
+                errors.append(exception.InsufficientFundsException)
+            else:
+                rows.extend(
+                    cls.transfer(
+                        senders, random.choice(recipients), transfer.amount, transfer.timestamp
+                    )
+                )
+                errors.append(None)
+
+        return rows, errors
+
+    @staticmethod
+    def db_transfer(sender_id: int, recipient_id: int, amount: Money, timestamp: datetime) -> str:
+        """
+        Makes a transfer server-side through the `wallet_transfer` database
+        function (the caller commits).
+
+        :param sender_id: Transfer sender user Id.
+        :param recipient_id: Transfer recipient user Id.
+        :param amount: Amount of money to transfer.
+        :param timestamp: Transfer date-time.
+        :return: `done` or an error code (`user_not_found`, `insufficient_funds`).
+        """
+        return db.session.execute(
+            _DB_TRANSFER_SQL,
+            {
+                "sender_id": sender_id,
+                "recipient_id": recipient_id,
+                "amount": amount,
+                "timestamp": timestamp,
+            },
+        ).scalar()
+
+    @staticmethod
+    def transfer(
+        senders: List["AccountBalance"],
+        recipient: "AccountBalance",
+        amount: Money,
+        timestamp: datetime,
+    ) -> List[dict]:
+        """
+        Moves `amount` from the sender balance slots to a recipient slot
+        (funds are not checked). The amount is taken from the fullest sender
+        slots first, with one `TRANSFER_OUT` entry per slot used. The sender
+        goes first so a self-transfer keeps a consistent chain of balances.
+
+        :param senders: Every balance slot of the transfer sender.
+        :param recipient: Balance slot of the transfer recipient.
+        :param amount: Amount of money to transfer.
+        :param timestamp: Transfer date-time.
+        :return: `TransactionLog` rows (sender's, recipient's) recording the transfer.
+        """
+        debits = []
+        remaining = amount
+        for account in sorted(senders, key=lambda a: (-a.balance, a.slot)):
+            if debits and remaining <= ZERO:
+                break
+            debit = min(remaining, account.balance)
+            debits.append((account, TransactionType.TRANSFER_OUT, debit, -debit))
+            remaining -= debit
+
+        rows = []
+        for account, trans_type, trans_amount, delta in (
+            *debits,
+            (recipient, TransactionType.TRANSFER_IN, amount, amount),
+        ):
+            opening_balance = account.balance
+            account.balance = opening_balance + delta
+            rows.append(
+                {
+                    "user_id": account.user_id,
+                    "slot": account.slot,
+                    "trans_type": trans_type,
+                    "amount": trans_amount,
+                    "opening_balance": opening_balance,
+                    "new_balance": account.balance,
+                    "timestamp": timestamp,
+                }
+            )
+
+        return rows
+
+    @classmethod
+    def set_slots(cls, user_id: int, slots: int, timestamp: datetime) -> None:
+        """
+        Splits or merges the balance of a user into `slots` slots (the caller
+        commits). New slots start empty, while the balance of the removed ones
+        is moved to slot `0` through `TRANSFER_OUT`/`TRANSFER_IN` entries.
+
+        :param user_id: Id of the user.
+        :param slots: Number of balance slots (`1` for regular accounts).
+        :param timestamp: Date-time of the balance moves.
+        :raises wallet_api.common.exception.UserNotFoundException: if the user
+            doesn't exist.
+        """
+        user = User.query.filter_by(id=user_id).with_for_update().one_or_none()
+        if user is None:
+            raise exception.UserNotFoundException
+        accounts = cls.fetch(user_id, lock=True)[user_id]
+
+        for account in accounts[slots:]:
+            TransactionLog.insert_many(
+                cls.transfer([account], accounts[0], account.balance, timestamp)
+            )
+            db.session.delete(account)
+        for slot in range(len(accounts), slots):
+            db.session.add(cls(user_id=user_id, slot=slot, balance=ZERO))
+        user.balance_slots = slots
+
+
+class BalanceCheckpoint(db.Model):
+    """
+    Balance checkpoints data model: the balance of every user balance slot as
+    of a date-time (the `new_balance` of its latest transaction log entry
+    before then). Every checkpoint is derived from the previous one and the
+    entries logged since, so the history before the latest checkpoint isn't
+    needed anymore to derive balances and can be archived. Entries must not
+    be logged with timestamps before the latest checkpoint.
+    """
+
+    __tablename__ = "balance_checkpoint"
+
+    #: Checkpoint date-time (table's primary key).
+    as_of = db.Column(db.DateTime, primary_key=True)
+    #: Balance owner (table's primary key).
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True, autoincrement=False)
+    #: Balance slot (table's primary key).
+    slot = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    #: Slot balance as of the checkpoint.
+    balance = db.Column(MoneyType, nullable=False)
+
+    def __repr__(self) -> str:
+        """Object string representation."""
+        return (
+            f"<BalanceCheckpoint(as_of='{self.as_of}', user_id='{self.user_id}', "
+            f"slot='{self.slot}', balance='{self.balance}')>"
+        )
+
+    @classmethod
+    def latest(cls) -> Optional[datetime]:
+        """
+        Gets the date-time of the latest checkpoint.
+
+        :return: Checkpoint date-time or `None` if there's none.
+        """
+        return db.session.query(func.max(cls.as_of)).scalar()
+
+    @classmethod
+    def record(cls, as_of: datetime) -> int:
+        """
+        Records the checkpoint as of a date-time unless it exists (the caller
+        commits).
+
+        :param as_of: Checkpoint date-time, entries logged before it are included.
+        :return: Number of balance slots recorded.
+        """
+        previous = db.session.query(func.max(cls.as_of)).filter(cls.as_of <= as_of).scalar()
+        if previous == as_of:
+            return 0
+        return db.session.execute(
+            _RECORD_CHECKPOINT_SQL, {"as_of": as_of, "previous": previous}
+        ).rowcount
+
 
 # ---- SQLAlchemy custom compilation rules ---- #
 @compiles(CreateColumn, "postgresql")
@@ -0,0 +1,143 @@
+"""
+Per-request instrumentation: latency, status codes, database time and
+queries count and (de)serialization time of every request handled by the
+application blueprint, plus an opt-in SQL profiler recording every statement
+of the requests to report the ones over budget and the N+1 query patterns.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from flask import current_app, g, has_request_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from wallet_api.common import metrics
+from wallet_api.config import SQLProfilerConfig as profiler_conf
+
+
+#: Slowest statements listed when a request exceeds a budget.
+REPORTED_STATEMENTS = 5
+
+
+class Query(NamedTuple):
+    """Statement recorded by the SQL profiler."""
+
+    #: SQL statement (with its parameters placeholders).
+    statement: str
+    #: Execution time (seconds).
+    duration: float
+    #: Endpoint of the view that issued the statement.
+    view: str
+
+
+def start_request() -> None:
+    """Blueprint `before_request` hook: initializes the request timers."""
+    g.request_start = time.perf_counter()
+    g.db_time = 0.0
+    g.db_queries = 0
+    g.serialization_time = 0.0
+    if profiler_conf.enabled:
+        g.queries = []
+
+
+def record_request(response: Response) -> Response:
+    """
+    Blueprint `after_request` hook: records the request metrics.
+
+    :param response: Response to the request.
+    :return: The same response.
+    """
+    if "request_start" not in g:
+        return response
+
+    endpoint = request.endpoint or "unknown"
+    metrics.http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.http_request_seconds.observe(
+        time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method
+    )
+    metrics.db_request_seconds.observe(g.db_time, endpoint=endpoint)
+    metrics.db_request_queries.observe(g.db_queries, endpoint=endpoint)
+    metrics.serialization_seconds.observe(g.serialization_time, endpoint=endpoint)
+
+    if current_app.debug:
+        response.headers.add(
+            "Server-Timing", f'db;dur={g.db_time * 1000:.2f};desc="{g.db_queries} queries"'
+        )
+    if "queries" in g:
+        report_queries(endpoint, g.queries, g.db_time)
+
+    return response
+
+
+def report_queries(endpoint: str, queries: list, db_time: float) -> None:
+    """
+    Logs the requests exceeding the queries count or database time budgets
+    (along with their slowest statements) and the statements executed
+    repeatedly within a request, likely a relationship loaded per item (N+1).
+
+    :param endpoint: Endpoint of the request.
+    :param queries: Statements (:class:`Query`) issued by the request.
+    :param db_time: Database time (seconds) of the request.
+    """
+    if len(queries) > profiler_conf.query_budget or db_time > profiler_conf.db_time_budget:
+        slowest = sorted(queries, key=lambda query: query.duration, reverse=True)
+        current_app.logger.warning(
+            "%s %s over budget: %d queries, %.2f ms database time. Slowest statements:\n%s",
+            request.method,
+            endpoint,
+            len(queries),
+            db_time * 1000,
+            "\n".join(
+                f"{query.duration * 1000:.2f} ms: {query.statement}"
+                for query in slowest[:REPORTED_STATEMENTS]
+            ),
+        )
+
+    for statement, count in Counter(query.statement for query in queries).items():
+        if count >= profiler_conf.repeated_threshold:
+            current_app.logger.warning(
+                "%s %s possible N+1: statement executed %d times: %s",
+                request.method,
+                endpoint,
+                count,
+                statement,
+            )
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Context manager adding the time spent (de)serializing a payload to the
+    current request (nested serializers are only timed once).
+    """
+    if not has_request_context() or "serialization_time" not in g:
+        yield
+        return
+
+    depth = g.get("serialization_depth", 0)
+    g.serialization_depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.serialization_depth = depth
+        if not depth:
+            g.serialization_time += time.perf_counter() - start
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_start")
+    # Queries of the background threads (no request) aren't attributed
+    if has_request_context() and "db_time" in g:
+        g.db_time += elapsed
+        g.db_queries += 1
+        if "queries" in g:
+            g.queries.append(Query(statement, elapsed, request.endpoint or "unknown"))
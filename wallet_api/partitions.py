@@ -0,0 +1,276 @@
+"""
+Maintenance of the monthly partitions of the transaction log (used by the
+`partitions` CLI commands).
+
+`transaction_log` is range partitioned by month on `timestamp`, one
+`transaction_log_YYYY_MM` partition per month. There's no default partition:
+partitions must exist before the transactions of their month are logged, so
+upcoming months are created in advance (and workers stop being ready, see
+`/health/ready`, once the next month is missing: a background thread of every
+worker checks it, so the probe itself never queries the database). Old months
+are detached (they're left as plain tables to be archived or dropped) so the
+vacuum, indexes and backups of the live table only cover the retained history.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+from flask import current_app, Flask
+
+from wallet_api import db
+
+
+#: Partitioned table.
+PARENT_TABLE = "transaction_log"
+
+#: Partition names format (`strftime` of the first day of the month).
+PARTITION_NAME_FORMAT = "transaction_log_%Y_%m"
+
+#: Seconds between the missing partitions checks of the workers.
+CHECK_INTERVAL = 60
+
+
+class Partition(NamedTuple):
+    """A monthly partition: `[start, end)` range of `timestamp`."""
+
+    #: Partition (table) name.
+    name: str
+    #: First day of the month.
+    start: date
+    #: First day of the next month.
+    end: date
+
+
+def month_start(day: date) -> date:
+    """First day of the month of `day`."""
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month `months` months after (or before) `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_for(month: date) -> Partition:
+    """Partition of the month of `month`."""
+    start = month_start(month)
+    return Partition(start.strftime(PARTITION_NAME_FORMAT), start, add_months(start, 1))
+
+
+def list_partitions() -> List[Partition]:
+    """
+    Lists the (attached) monthly partitions of the transaction log.
+
+    :return: Partitions in chronological order.
+    """
+    names = db.session.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+        """,
+        {"parent": PARENT_TABLE},
+    ).fetchall()
+
+    return _parse_partitions(name for (name,) in names)
+
+
+def list_detached_partitions() -> List[Partition]:
+    """
+    Lists the detached monthly partitions of the transaction log (left as
+    plain tables to be archived).
+
+    :return: Partitions in chronological order.
+    """
+    names = db.session.execute(
+        """
+        SELECT relname
+        FROM pg_class
+        WHERE relkind = 'r' AND NOT relispartition AND pg_table_is_visible(oid)
+            AND relname LIKE :prefix
+        """,
+        {"prefix": f"{PARENT_TABLE}_%"},
+    ).fetchall()
+
+    return _parse_partitions(name for (name,) in names)
+
+
+def _parse_partitions(names: Iterable[str]) -> List[Partition]:
+    """Partitions of the tables named after a month, in chronological order."""
+    partitions = []
+    for name in names:
+        try:
+            start = datetime.strptime(name, PARTITION_NAME_FORMAT).date()
+        except ValueError:
+            # Not managed by this module
+            continue
+        partitions.append(partition_for(start))
+
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def create_partitions(first: date, last: date) -> List[str]:
+    """
+    Creates the missing partitions of the months from `first` to `last`
+    (both included). Indexes and the primary key are inherited from the
+    partitioned table.
+
+    :param first: A day of the first month.
+    :param last: A day of the last month.
+    :return: Names of the partitions created.
+    """
+    existing = {partition.name for partition in list_partitions()}
+    created = []
+    month = month_start(first)
+    while month <= last:
+        partition = partition_for(month)
+        if partition.name not in existing:
+            db.session.execute(
+                f"CREATE TABLE {partition.name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{partition.start}') TO ('{partition.end}')"
+            )
+            created.append(partition.name)
+        month = partition.end
+    db.session.commit()
+
+    return created
+
+
+def missing_partitions(ahead: int = 1, today: Optional[date] = None) -> List[str]:
+    """
+    Lists the missing partitions of the current and next `ahead` months.
+
+    :param ahead: Number of upcoming months to check.
+    :param today: Current (UTC) date, defaults to today.
+    :return: Names of the missing partitions.
+    """
+    current = month_start(today or datetime.utcnow().date())
+    existing = {partition.name for partition in list_partitions()}
+    months = (partition_for(add_months(current, months)) for months in range(ahead + 1))
+    return [partition.name for partition in months if partition.name not in existing]
+
+
+def attach_partition(partition: Partition) -> None:
+    """
+    Attaches back a detached partition (the caller commits).
+
+    :param partition: Partition.
+    """
+    db.session.execute(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {partition.name} "
+        f"FOR VALUES FROM ('{partition.start}') TO ('{partition.end}')"
+    )
+
+
+def detach_partition(name: str, drop: bool = False) -> None:
+    """
+    Detaches a partition (the caller commits).
+
+    :param name: Partition name.
+    :param drop: Whether to drop the detached partition.
+    """
+    db.session.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+    if drop:
+        db.session.execute(f"DROP TABLE {name}")
+
+
+def detach_partitions(before: date, drop: bool = False) -> List[str]:
+    """
+    Detaches the partitions ending on or before `before`. Detached
+    partitions are kept as plain tables (to be archived) unless `drop`.
+
+    :param before: First day not to detach.
+    :param drop: Whether to drop the detached partitions.
+    :return: Names of the partitions detached.
+    """
+    detached = []
+    for partition in list_partitions():
+        if partition.end > before:
+            break
+        detach_partition(partition.name, drop)
+        detached.append(partition.name)
+    db.session.commit()
+
+    return detached
+
+
+def maintain(
+    ahead: int, retain: Optional[int] = None, drop: bool = False, today: Optional[date] = None
+) -> dict:
+    """
+    Creates the partitions of the current and next `ahead` months and, if
+    `retain` is given, detaches the ones older than the last `retain` months
+    (current one included).
+
+    :param ahead: Number of months to create in advance.
+    :param retain: Number of months to keep attached (all if `None`).
+    :param drop: Whether to drop the detached partitions.
+    :param today: Current (UTC) date, defaults to today.
+    :return: Names of the `created` and `detached` partitions.
+    """
+    current = month_start(today or datetime.utcnow().date())
+    created = create_partitions(current, add_months(current, ahead))
+    detached = []
+    if retain is not None:
+        detached = detach_partitions(add_months(current, 1 - retain), drop)
+
+    return {"created": created, "detached": detached}
+
+
+class PartitionsMonitor(object):
+    """
+    Missing partitions of the current and next months, checked by a
+    background thread of the current process (one instance per process).
+    """
+
+    def __init__(self):
+        """Initializes a class instance (the thread starts on first use)."""
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        #: Names of the missing partitions as of the last successful check.
+        self.missing: List[str] = []
+
+    def watch(self, app: Flask) -> List[str]:
+        """
+        Gets the missing partitions without querying the database, starting
+        the checker thread of the current process (gunicorn workers are
+        forked, a thread started before the fork is not inherited).
+
+        :param app: Flask application.
+        :return: Names of the missing partitions (none until first checked).
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    threading.Thread(
+                        target=self._run, args=(app,), name="partitions-monitor", daemon=True
+                    ).start()
+        return self.missing
+
+    def check(self) -> None:
+        """Checks the missing partitions, keeping the last result on failures."""
+        try:
+            self.missing = missing_partitions(ahead=1)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Missing partitions check failed")
+
+    def _run(self, app: Flask) -> None:
+        """
+        Checker thread loop (the session is removed with the app context).
+
+        :param app: Flask application.
+        """
+        while True:
+            with app.app_context():
+                self.check()
+            time.sleep(CHECK_INTERVAL)
+
+
+#: Partitions monitor of the current process.
+monitor = PartitionsMonitor()
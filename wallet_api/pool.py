@@ -0,0 +1,158 @@
+"""
+SQLAlchemy connection pool: engine options built from the configuration and
+a queue pool exporting its usage metrics and tracking its saturation.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+from wallet_api.common import metrics
+from wallet_api.config import PSQLClientConfig as db_conf
+
+
+class PoolWaits(object):
+    """
+    Checkouts of the process' pools waiting for a connection, along with the
+    wait of the last finished one.
+    """
+
+    def __init__(self):
+        """Initializes a class instance."""
+        self._lock = threading.Lock()
+        self._started: dict = {}
+        #: Time (monotonic) and wait (seconds) of the last finished checkout.
+        self.last = (float("-inf"), 0.0)
+
+    @contextmanager
+    def waiting(self):
+        """Context manager tracking a checkout while it waits for a connection."""
+        token = object()
+        start = time.monotonic()
+        with self._lock:
+            self._started[token] = start
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                del self._started[token]
+                self.last = (end, end - start)
+
+    def count(self) -> int:
+        """
+        Checkouts currently waiting.
+
+        :return: Number of checkouts.
+        """
+        return len(self._started)
+
+    def longest(self, window: float) -> float:
+        """
+        Longest wait of the checkouts currently waiting and of the last
+        finished one (if it finished within `window`).
+
+        :param window: Seconds a finished checkout's wait is taken into account.
+        :return: Wait (seconds).
+        """
+        now = time.monotonic()
+        with self._lock:
+            started = min(self._started.values(), default=now)
+            end, wait = self.last
+        return max(now - started, wait if now - end <= window else 0.0)
+
+
+#: Connection waits of the current process.
+pool_waits = PoolWaits()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    Queue pool reporting the connections checked out and in overflow, the
+    time waited for a connection and the checkouts timed out. Checkouts are
+    tracked in :data:`pool_waits` (admission control).
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            with pool_waits.waiting():
+                return super()._do_get()
+        except TimeoutError:
+            metrics.db_pool_timeouts.inc()
+            raise
+        finally:
+            metrics.db_pool_wait_seconds.observe(time.perf_counter() - start)
+            self._report_usage()
+
+    def _do_return_conn(self, conn):
+        super()._do_return_conn(conn)
+        self._report_usage()
+
+    def _report_usage(self) -> None:
+        """Updates the pool usage gauges."""
+        metrics.db_pool_checked_out.set(self.checkedout())
+        metrics.db_pool_overflow.set(max(self.overflow(), 0))
+
+
+def timeout_settings() -> dict:
+    """
+    Server-side timeouts (`statement_timeout`, `lock_timeout`) configured.
+
+    :return: Settings values (milliseconds) indexed by name.
+    """
+    settings = {
+        "statement_timeout": db_conf.statement_timeout,
+        "lock_timeout": db_conf.lock_timeout,
+    }
+    return {name: value for name, value in settings.items() if value > 0}
+
+
+def engine_options() -> dict:
+    """
+    Gets the SQLAlchemy engine options (`SQLALCHEMY_ENGINE_OPTIONS`) matching
+    the configuration.
+
+    :return: Keyword arguments of `sqlalchemy.create_engine`.
+    """
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": db_conf.pool_size,
+        "max_overflow": db_conf.max_overflow,
+        "pool_timeout": db_conf.pool_timeout,
+        "pool_recycle": db_conf.pool_recycle,
+        "pool_pre_ping": db_conf.pool_pre_ping,
+    }
+    settings = timeout_settings()
+    if settings and not db_conf.pgbouncer:
+        # Session defaults sent as startup parameters (no extra round trip)
+        options["connect_args"] = {
+            "options": " ".join(f"-c {name}={value}" for name, value in settings.items())
+        }
+
+    return options
+
+
+def set_local_timeouts(engine: Engine) -> None:
+    """
+    Sets the server-side timeouts at the beginning of every transaction of
+    `engine` (`SET LOCAL`), as PgBouncer transaction pooling neither accepts
+    startup parameters nor keeps session settings.
+
+    :param engine: SQLAlchemy engine.
+    """
+    statement = "; ".join(
+        f"SET LOCAL {name} = {value}" for name, value in timeout_settings().items()
+    )
+    if not statement:
+        return
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        cursor = connection.connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
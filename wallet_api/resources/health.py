@@ -1,9 +1,15 @@
 """
 Health set of endpoints.
 """
-from flask import jsonify, Response
+from flask import current_app, Response
 from flask_restful import Resource
 
+from wallet_api.admission import controller
+from wallet_api.common.json_provider import current_json
+from wallet_api.config import AdmissionConfig as admission_conf
+from wallet_api.partitions import monitor as partitions_monitor
+from wallet_api.pool import pool_waits
+
 
 class HealthLive(Resource):
     """
@@ -17,4 +23,44 @@ class HealthLive(Resource):
 
         :return: Http (JSON) response with a status code of `200`.
         """
-        return jsonify({"status": "OK"})
+        return current_json.response({"status": "OK"})
+
+
+class HealthReady(Resource):
+    """
+    Health probe: readiness.
+    """
+
+    def get(self) -> Response:
+        """
+        The worker is considered to be ready as long as its database pool
+        isn't saturated (it would shed transfers), so load balancers can route
+        around it, and the transaction log partitions of the current and next
+        months exist (transactions can't be logged otherwise, see
+        `flask partitions maintain`). Neither check queries the database (the
+        partitions are checked in the background), so the probe answers
+        quickly when the pool is saturated. Reports the worker's load either way.
+
+        :return: Http (JSON) response with a status code of `200` if the
+            worker is ready, `503` (and a `Retry-After` header) otherwise.
+        """
+        missing = partitions_monitor.watch(current_app._get_current_object())
+        reason = controller.saturation()
+        status = "Saturated"
+        if reason is None and missing:
+            reason, status = "partitions", "Unavailable"
+        body = {
+            "status": "OK" if reason is None else status,
+            "inFlight": controller.in_flight,
+            "poolWaiting": pool_waits.count(),
+            "poolWait": round(pool_waits.longest(admission_conf.saturation_window), 3),
+        }
+        if reason is None:
+            return current_json.response(body)
+
+        body["reason"] = reason
+        if missing:
+            body["missingPartitions"] = missing
+        return current_json.response(
+            body, status=503, headers={"Retry-After": str(admission_conf.retry_after)}
+        )
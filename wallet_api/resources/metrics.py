@@ -0,0 +1,23 @@
+"""
+Metrics set of endpoints.
+"""
+from flask import Response
+from flask_restful import Resource
+
+from wallet_api.common import metrics
+
+
+class Metrics(Resource):
+    """
+    API endpoint: application metrics.
+    """
+
+    def get(self) -> Response:
+        """
+        Every application metric in the Prometheus text format (aggregated
+        across the gunicorn worker processes).
+
+        :return: Http (text) response.
+        """
+        data, content_type = metrics.exposition()
+        return Response(data, content_type=content_type)
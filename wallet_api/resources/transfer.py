@@ -0,0 +1,92 @@
+"""
+Transfers set of endpoints.
+"""
+from datetime import datetime
+
+from flask import current_app, Response
+from flask_restful import Resource
+from sqlalchemy.exc import SQLAlchemyError
+
+from wallet_api import db, db_conflict_retryable, db_isolation_level, retry_on_conflict
+from wallet_api.common import exception, metrics
+from wallet_api.common.json_provider import current_json
+from wallet_api.common.serializers import transfer_batch_input_schema, transfer_batch_output_schema
+from wallet_api.models import AccountBalance, TransactionLog, Transfer
+
+
+class TransferBatch(Resource):
+    """
+    API endpoint: batch of money transfers.
+    """
+
+    @retry_on_conflict
+    @db_isolation_level("READ COMMITTED")
+    def post(self) -> Response:
+        """
+        Makes a batch of transfers in a single database transaction. Every
+        involved balance is locked upfront and transfers are checked in order.
+        In `atomic` mode a single failing transfer aborts the whole batch, in
+        `best_effort` mode only the failing transfers are skipped.
+
+        :return: JSON response.
+        """
+        request_payload = transfer_batch_input_schema.load(current_json.request_json())
+        if request_payload.errors:
+            raise exception.InvalidInputException(request_payload.errors)
+        if request_payload.data is None:
+            # Bodies that aren't JSON (or are `null`) are loaded as `None`
+            raise exception.InvalidInputException({"_schema": ["Invalid type."]})
+        req_data = request_payload.data
+        transfers = req_data["transfers"]
+
+        timestamp = datetime.utcnow()
+        rows, errors = AccountBalance.transfer_many(
+            Transfer(t["fromUserId"], t["toUserId"], t["amount"], timestamp) for t in transfers
+        )
+        results = [
+            {"status": "failed", "error": error.message} if error else {"status": "done"}
+            for error in errors
+        ]
+
+        applied = False
+        if rows and not (any(errors) and req_data["mode"] == "atomic"):
+            try:
+                # Single multi-row insert for the whole batch
+                TransactionLog.insert_many(rows)
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                if db_conflict_retryable(e):
+                    raise
+                current_app.logger.exception("Batch of %d transfers failed", len(transfers))
+            else:
+                applied = True
+        else:
+            db.session.rollback()
+        db.session.close()
+
+        if not applied:
+            for result in results:
+                if result["status"] == "done":
+                    result["status"] = "aborted"
+
+        for result, error in zip(results, errors):
+            metrics.transfers.inc(
+                outcome=exception.TRANSFER_ERROR_CODES[error] if error else result["status"]
+            )
+
+        statuses = {result["status"] for result in results}
+        if statuses == {"done"}:
+            status = "done"
+        elif "done" in statuses:
+            status = "partial"
+        else:
+            status = "failed"
+
+        serialized_resp = transfer_batch_output_schema.dump(
+            {"status": status, "timestamp": timestamp, "results": results},
+            native=current_json.native,
+        )
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+        return current_json.response(serialized_resp.data)
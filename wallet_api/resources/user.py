@@ -1,24 +1,34 @@
 """
 User's set of endpoints.
 """
+import codecs
 from datetime import datetime
-from decimal import Decimal
 
-from flask import jsonify, request, Response
+from flask import current_app, request, Response, stream_with_context
 from flask_restful import Resource
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.exc import SQLAlchemyError
 
-from wallet_api import db, db_isolation_level
-from wallet_api.common import exception
+from wallet_api import archive, db, db_conflict_retryable, db_isolation_level, retry_on_conflict
+from wallet_api.balance_cache import cache as balance_cache
+from wallet_api.bulk import import_users, read_records
+from wallet_api.common import exception, metrics
+from wallet_api.common.json_provider import current_json
+from wallet_api.common.money import ZERO
 from wallet_api.common.serializers import (
-    UserBalanceOutputSchema,
-    UserInputSchema,
-    UserOutputSchema,
-    UserTransferInputSchema,
-    UserTransferOutputSchema,
+    user_balance_output_schema,
+    user_bulk_output_schema,
+    user_input_schema,
+    user_output_schema,
+    user_statement_input_schema,
+    user_transactions_input_schema,
+    user_transactions_output_schema,
+    user_transfer_input_schema,
+    user_transfer_output_schema,
 )
-from wallet_api.models import TransactionLog, TransactionType, User
+from wallet_api.config import BalanceCacheConfig as cache_conf, PSQLClientConfig as db_conf
+from wallet_api.group_commit import committer
+from wallet_api.models import AccountBalance, TransactionLog, Transfer, User
+from wallet_api.statement import CONTENT_TYPES, gzip_chunks, render
 
 
 class UserResource(Resource):
@@ -33,42 +43,57 @@ class UserResource(Resource):
 
         :return: JSON response.
         """
-        request_payload = UserInputSchema().load(request.get_json(silent=True))
+        request_payload = user_input_schema.load(current_json.request_json())
         if request_payload.errors:
             raise exception.InvalidInputException(request_payload.errors)
         req_data = request_payload.data
 
-        # Insert user data
-        new_user = User(name=req_data["name"], email=req_data["email"])
-        db.session.add(new_user)
-
-        try:
-            db.session.commit()
-        except IntegrityError:
+        # Insert user, initial transaction entry and balance at once
+        new_user_id = User.create(req_data["name"], req_data["email"], req_data["init_balance"])
+        if new_user_id is None:
             db.session.rollback()
             raise exception.UserExistException
-        else:
-            # Insert initial transaction entry.
-            init_balance = TransactionLog(
-                user_id=new_user.id,
-                trans_type=TransactionType.DEPOSIT,
-                amount=req_data["init_balance"],
-                opening_balance=Decimal("0.0"),
-                new_balance=req_data["init_balance"],
-                timestamp=datetime.utcnow(),
-            )
-            db.session.add(init_balance)
-            db.session.commit()
+        db.session.commit()
+
+        serialized_resp = user_output_schema.dump(
+            {"id": new_user_id}, native=current_json.native
+        )
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
 
-            db.session.refresh(new_user)
-            serialized_resp = UserOutputSchema().dump(new_user.__dict__)
-            if serialized_resp.errors:
-                raise exception.InvalidOutputException(serialized_resp.errors)
+        return current_json.response(serialized_resp.data, status=201)
+
+
+class UserBulk(Resource):
+    """
+    API endpoint: bulk users creation.
+    """
+
+    def post(self) -> Response:
+        """
+        Creates users (and their initial balances) from a NDJSON body (one
+        user object per line) or a CSV body (`text/csv` content type, with a
+        header row). The body is streamed and loaded in chunks, rows that
+        can't be imported are reported without aborting the rest.
+
+        :return: JSON response.
+        """
+        fmt = "csv" if request.mimetype == "text/csv" else "ndjson"
+        lines = codecs.getreader(request.charset or "utf-8")(request.stream)
 
-            response = jsonify(serialized_resp.data)
-            response.status_code = 201
+        created, rejected = 0, []
+        for result in import_users(read_records(lines, fmt)):
+            if result["status"] == "created":
+                created += 1
+            else:
+                rejected.append(result)
 
-        return response
+        serialized_resp = user_bulk_output_schema.dump(
+            {"created": created, "rejected": rejected}, native=current_json.native
+        )
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+        return current_json.response(serialized_resp.data)
 
 
 class UserBalance(Resource):
@@ -83,18 +108,106 @@ class UserBalance(Resource):
         :param user_id: Id of the user to query for.
         :return: JSON response.
         """
-        try:
-            user = User.query.filter_by(id=user_id).one()
-        except NoResultFound:
+        if cache_conf.enabled:
+            balance = balance_cache.get(user_id, AccountBalance.total_for)
+        else:
+            balance = AccountBalance.total_for(user_id)
+        if balance is None:
+            raise exception.UserNotFoundException
+
+        serialized_resp = user_balance_output_schema.dump(
+            {"userId": user_id, "balance": balance}, native=current_json.native
+        )
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+
+        return current_json.response(serialized_resp.data)
+
+
+class UserTransactions(Resource):
+    """
+    API endpoint: User's transaction history.
+    """
+
+    def get(self, user_id: int) -> Response:
+        """
+        Fetch a page of user's transactions, newest first, archived ones
+        included. Pages are walked through the `next` cursor of the previous
+        one and can be filtered by type (`type`) and date range (`from`, `to`).
+
+        :param user_id: Id of the user to query for.
+        :return: JSON response.
+        """
+        request_payload = user_transactions_input_schema.load(request.args.to_dict())
+        if request_payload.errors:
+            raise exception.InvalidInputException(request_payload.errors)
+        req_data = request_payload.data
+
+        # One extra entry tells whether there is a next page
+        limit = req_data["limit"]
+        rows = archive.page_for(
+            user_id,
+            limit + 1,
+            after=req_data.get("cursor"),
+            trans_type=req_data.get("type"),
+            since=req_data.get("since"),
+            until=req_data.get("until"),
+        )
+        if not rows and not User.exists(user_id):
             raise exception.UserNotFoundException
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].timestamp, rows[-1].id)
 
-        serialized_resp = UserBalanceOutputSchema().dump(
-            {"userId": user.id, "balance": user.transactions[-1].new_balance}
+        serialized_resp = user_transactions_output_schema.dump(
+            {"userId": user_id, "transactions": rows, "next": next_cursor},
+            native=current_json.native,
         )
         if serialized_resp.errors:
             raise exception.InvalidOutputException(serialized_resp.errors)
+        return current_json.response(serialized_resp.data)
+
+
+class UserStatement(Resource):
+    """
+    API endpoint: User's account statement.
+    """
+
+    def get(self, user_id: int) -> Response:
+        """
+        Streams user's full account statement (chronological order, archived
+        transactions included) as NDJSON or CSV (`format`), gzip-compressed if
+        accepted by the client. Rows are read through a server-side cursor and
+        sent as they are fetched, so neither memory use nor time to first byte
+        depend on the statement size.
+
+        :param user_id: Id of the user to query for.
+        :return: Streamed response.
+        """
+        request_payload = user_statement_input_schema.load(request.args.to_dict())
+        if request_payload.errors:
+            raise exception.InvalidInputException(request_payload.errors)
+        req_data = request_payload.data
 
-        return jsonify(serialized_resp.data)
+        if not User.exists(user_id):
+            raise exception.UserNotFoundException
+
+        fmt = req_data["format"]
+        batches = archive.statement_for(
+            user_id, since=req_data.get("since"), until=req_data.get("until")
+        )
+        body = render(batches, fmt, current_json)
+        headers = {
+            "Content-Disposition": f"attachment; filename=statement-{user_id}.{fmt}",
+            "Vary": "Accept-Encoding",
+        }
+        if request.accept_encodings["gzip"]:
+            body = gzip_chunks(body)
+            headers["Content-Encoding"] = "gzip"
+
+        # The request context (and database session) lives until the body is sent
+        return Response(stream_with_context(body), mimetype=CONTENT_TYPES[fmt], headers=headers)
 
 
 class UserTransfer(Resource):
@@ -102,7 +215,6 @@ class UserTransfer(Resource):
     API endpoint: User's money transfer.
     """
 
-    @db_isolation_level("SERIALIZABLE")
     def post(self, user_id: int) -> Response:
         """
         Transfer money between users.
@@ -110,64 +222,74 @@ class UserTransfer(Resource):
         :param user_id: Sender user Id.
         :return: JSON response.
         """
-        request_payload = UserTransferInputSchema().load(request.get_json(silent=True))
+        request_payload = user_transfer_input_schema.load(current_json.request_json())
         if request_payload.errors:
             raise exception.InvalidInputException(request_payload.errors)
         req_data = request_payload.data
 
+        transfer = Transfer(user_id, req_data["toUserId"], req_data["amount"], datetime.utcnow())
         try:
-            sender = User.query.filter_by(id=user_id).one()
-            recipient = User.query.filter_by(id=req_data["toUserId"]).one()
-        except NoResultFound:
-            raise exception.UserNotFoundException
+            if db_conf.transfer_group_commit:
+                status = committer.submit(transfer).result()
+            else:
+                status = self.transfer(transfer)
+        except tuple(exception.TRANSFER_ERROR_CODES) as e:
+            metrics.transfers.inc(outcome=exception.TRANSFER_ERROR_CODES[type(e)])
+            raise
+        metrics.transfers.inc(outcome=status)
 
-        # Check funds
-        if req_data["amount"] > sender.transactions[-1].new_balance:
-            raise exception.InsufficientFundsException
-
-        timestamp = datetime.utcnow()
-
-        # Users new balance
-        sender_new_balance = sender.transactions[-1].new_balance - req_data["amount"]
-        recipient_new_balance = recipient.transactions[-1].new_balance + req_data["amount"]
-
-        # A transfer creates two rows (sender, recipient)
-        db.session.add(
-            TransactionLog(
-                user_id=sender.id,
-                trans_type=TransactionType.TRANSFER_OUT,
-                amount=req_data["amount"],
-                opening_balance=sender.transactions[-1].new_balance,
-                new_balance=sender_new_balance,
-                timestamp=timestamp,
-            )
+        serialized_resp = user_transfer_output_schema.dump(
+            {"status": status, "timestamp": transfer.timestamp}, native=current_json.native
         )
-        db.session.add(
-            TransactionLog(
-                user_id=recipient.id,
-                trans_type=TransactionType.TRANSFER_IN,
-                amount=req_data["amount"],
-                opening_balance=recipient.transactions[-1].new_balance,
-                new_balance=recipient_new_balance,
-                timestamp=timestamp,
+        if serialized_resp.errors:
+            raise exception.InvalidOutputException(serialized_resp.errors)
+        return current_json.response(serialized_resp.data)
+
+    @staticmethod
+    @retry_on_conflict
+    @db_isolation_level(db_conf.transfer_isolation_level())
+    def transfer(transfer: Transfer) -> str:
+        """
+        Makes a transfer in its own database transaction following the
+        configured concurrency strategy.
+
+        :param transfer: Transfer to make.
+        :return: Transfer status (`done` or `failed`).
+        """
+        if db_conf.transfer_strategy == "stored_function":
+            status = AccountBalance.db_transfer(*transfer)
+            if status in exception.DB_ERROR_CODES:
+                raise exception.DB_ERROR_CODES[status]
+        else:
+            senders, recipient = AccountBalance.fetch_for_transfer(
+                transfer.sender_id,
+                transfer.recipient_id,
+                lock=db_conf.transfer_strategy == "row_lock",
             )
-        )
+            if not senders or recipient is None:
+                raise exception.UserNotFoundException
+
+            # Check funds
+            if transfer.amount > sum((account.balance for account in senders), ZERO):
+                raise exception.InsufficientFundsException
+
+            # A transfer creates (at least) two rows (sender, recipient) and
+            # updates both balances
+            rows = AccountBalance.transfer(senders, recipient, transfer.amount, transfer.timestamp)
+            for row in rows:
+                db.session.add(TransactionLog(**row))
 
         try:
             db.session.commit()
-        except SQLAlchemyError:
+        except SQLAlchemyError as e:
             db.session.rollback()
-            # TODO: Log exception
-            serialized_resp = UserTransferOutputSchema().dump(
-                {"status": "failed", "timestamp": timestamp}
-            )
+            if db_conflict_retryable(e):
+                raise
+            current_app.logger.exception("Transfer of user %d failed", transfer.sender_id)
+            status = "failed"
         else:
-            serialized_resp = UserTransferOutputSchema().dump(
-                {"status": "done", "timestamp": timestamp}
-            )
+            status = "done"
         finally:
             db.session.close()
 
-        if serialized_resp.errors:
-            raise exception.InvalidOutputException(serialized_resp.errors)
-        return jsonify(serialized_resp.data)
+        return status
@@ -1,12 +1,23 @@
 """
 App routes definitions.
 """
-from flask import Blueprint, jsonify, Response
+from flask import Blueprint, Response
 from flask_restful import Api
 
+from wallet_api import admission, monitoring
 from wallet_api.common.exception import BaseApiException
-from wallet_api.resources.health import HealthLive
-from wallet_api.resources.user import UserBalance, UserResource, UserTransfer
+from wallet_api.common.json_provider import current_json
+from wallet_api.resources.health import HealthLive, HealthReady
+from wallet_api.resources.metrics import Metrics
+from wallet_api.resources.transfer import TransferBatch
+from wallet_api.resources.user import (
+    UserBalance,
+    UserBulk,
+    UserResource,
+    UserStatement,
+    UserTransactions,
+    UserTransfer,
+)
 
 
 # Application's blueprint
@@ -15,13 +26,29 @@ app_bp = Blueprint("app", __name__)
 # Api plugin
 api = Api(app_bp)
 
+# Requests instrumentation
+app_bp.before_request(monitoring.start_request)
+app_bp.after_request(monitoring.record_request)
+
+# Admission control (shed requests are still instrumented)
+app_bp.before_request(admission.admit)
+app_bp.teardown_request(admission.release)
+
 
 # ----- User routes ----- #
 api.add_resource(UserResource, "/user", endpoint="user")
+api.add_resource(UserBulk, "/users/bulk", endpoint="users_bulk")
 api.add_resource(UserBalance, "/user/<int:user_id>/balance", endpoint="user_balance")
 api.add_resource(UserTransfer, "/user/<int:user_id>/transfer", endpoint="user_transfer")
+api.add_resource(UserTransactions, "/user/<int:user_id>/transactions", endpoint="user_transactions")
+api.add_resource(UserStatement, "/user/<int:user_id>/statement", endpoint="user_statement")
+# ----- Transfer routes ----- #
+api.add_resource(TransferBatch, "/transfers/batch", endpoint="transfers_batch")
 # ----- Health probes routes ----- #
 api.add_resource(HealthLive, "/health/live", endpoint="health_live")
+api.add_resource(HealthReady, "/health/ready", endpoint="health_ready")
+# ----- Metrics routes ----- #
+api.add_resource(Metrics, "/metrics", endpoint="metrics")
 
 
 # ----- App exceptions handler ----- #
@@ -35,9 +62,6 @@ def handle_base_exceptions(e: Exception) -> Response:
     """
     if isinstance(e, BaseApiException):
         # API custom exception
-        response = jsonify(e.to_dict())
-        response.status_code = e.status_code
-    else:
-        raise e
+        return current_json.response(e.to_dict(), status=e.status_code, headers=e.headers)
 
-    return response
+    raise e
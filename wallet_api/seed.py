@@ -0,0 +1,312 @@
+"""
+Synthetic data generator (used by the `seed` CLI command).
+
+Users and transfers are streamed to PostgreSQL with `COPY` in chunks of
+bounded size. Users are split among the worker processes (user Id modulo the
+number of workers) and every worker only makes transfers between its own
+users, so it can keep their balances in memory and chain every transaction
+log entry (`opening_balance`/`new_balance`) on its own.
+
+Transfer recipients follow a power law (a few users receive most of the
+transfers) and transfers arrive as a Poisson process spread over the last
+`days` days. Amounts are handled in minor units (cents).
+"""
+import io
+import math
+import multiprocessing
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import repeat
+from typing import Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from wallet_api import db
+from wallet_api.models import BalanceCheckpoint, TransactionType
+from wallet_api.partitions import create_partitions
+
+
+#: Default number of rows streamed per `COPY`.
+CHUNK_ROWS = 100000
+
+#: Email domain of the generated users.
+SEED_EMAIL_DOMAIN = "seed.wallet"
+
+#: Trigger notifying the balance changes, disabled while seeding.
+NOTIFY_TRIGGER = "transaction_log_balance_changed"
+
+# Multiplier (coprime with any realistic number of users) spreading the
+# power-law ranks over the users, so the popular recipients aren't the
+# lowest Ids.
+_RANK_SPREAD = 2654435761
+
+_TRANSACTION_LOG_COLUMNS = "user_id, trans_type, amount, opening_balance, new_balance, timestamp"
+
+
+class SeedOptions(NamedTuple):
+    """Shape of the generated dataset."""
+
+    #: Number of users.
+    users: int
+    #: Number of transfers between the users.
+    transfers: int
+    #: Time span (days until now) of the transfers.
+    days: int = 365
+    #: Power-law exponent of the recipients popularity.
+    skew: float = 1.1
+    #: Maximum initial deposit of a user (cents).
+    max_deposit: int = 100000
+    #: Mean amount of a transfer (cents).
+    mean_amount: int = 2000
+    #: Rows streamed per `COPY`.
+    chunk_rows: int = CHUNK_ROWS
+    #: Random generator seed (`None` for a different dataset every time).
+    random_seed: Optional[int] = None
+
+
+def seed(options: SeedOptions, workers: int = 1) -> int:
+    """
+    Generates users and transfers between them.
+
+    :param options: Shape of the generated dataset.
+    :param workers: Number of worker processes.
+    :return: Number of transaction log entries created.
+    :raises ValueError: if the time span starts before the latest balance
+        checkpoint (checkpoints don't include entries logged afterwards).
+    """
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=options.days)
+    checkpoint = BalanceCheckpoint.latest()
+    if checkpoint is not None and datetime.combine(first_day, datetime.min.time()) < checkpoint:
+        raise ValueError(f"Transfers can't be dated before the latest checkpoint ({checkpoint})")
+
+    url = str(db.engine.url)
+    # Reserves the Ids of the new users
+    first_id = db.session.execute(
+        """
+        SELECT GREATEST(nextval(pg_get_serial_sequence('"user"', 'id')), max(id) + 1)
+        FROM "user"
+        """
+    ).scalar()
+    db.session.execute(
+        "SELECT setval(pg_get_serial_sequence('\"user\"', 'id'), :last_id)",
+        {"last_id": first_id + options.users - 1},
+    )
+    # Transaction log partitions of the whole time span
+    create_partitions(first_day, today)
+    # One notification per user and chunk would flood the notifications queue
+    # (the balance cache is cleared when its listener reconnects)
+    db.session.execute(f"ALTER TABLE transaction_log DISABLE TRIGGER {NOTIFY_TRIGGER}")
+    db.session.commit()
+
+    try:
+        if workers == 1:
+            rows = seed_partition(url, options, first_id, 0, 1)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                rows = sum(
+                    executor.map(
+                        seed_partition,
+                        repeat(url),
+                        repeat(options),
+                        repeat(first_id),
+                        range(workers),
+                        repeat(workers),
+                    )
+                )
+    finally:
+        db.session.execute(f"ALTER TABLE transaction_log ENABLE TRIGGER {NOTIFY_TRIGGER}")
+        db.session.commit()
+
+    for table in ('"user"', "account_balance", "transaction_log"):
+        db.session.execute(f"ANALYZE {table}")
+    db.session.commit()
+
+    return rows
+
+
+def seed_partition(
+    url: str, options: SeedOptions, first_id: int, partition: int, workers: int
+) -> int:
+    """
+    Generates the users of a partition (Ids `first_id + partition + k * workers`)
+    and the transfers between them, on its own database connection.
+
+    :param url: Database URL.
+    :param options: Shape of the generated dataset.
+    :param first_id: Id of the first generated user.
+    :param partition: Partition number.
+    :param workers: Number of partitions.
+    :return: Number of transaction log entries created.
+    """
+    users = len(range(partition, options.users, workers))
+    transfers = len(range(partition, options.transfers, workers))
+    if not users:
+        return 0
+    rng = random.Random(None if options.random_seed is None else options.random_seed + partition)
+    user_ids = range(first_id + partition, first_id + options.users, workers)
+
+    engine = create_engine(url, poolclass=NullPool)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # Chunks are committed without waiting for the WAL flush
+        cursor.execute("SET synchronous_commit = off")
+        _copy(
+            cursor,
+            '"user" (id, name, email)',
+            (f"{uid}\tSeed User {uid}\tuser-{uid}@{SEED_EMAIL_DOMAIN}\n" for uid in user_ids),
+            options.chunk_rows,
+            connection.commit,
+        )
+
+        balances = array("q", (rng.randint(1, options.max_deposit) for _ in range(users)))
+        rows = _copy(
+            cursor,
+            f"transaction_log ({_TRANSACTION_LOG_COLUMNS})",
+            _transaction_log(rng, options, user_ids, balances, transfers),
+            options.chunk_rows,
+            connection.commit,
+        )
+        _copy(
+            cursor,
+            "account_balance (user_id, balance)",
+            (f"{uid}\t{balance}\n" for uid, balance in zip(user_ids, balances)),
+            options.chunk_rows,
+            connection.commit,
+        )
+    finally:
+        connection.close()
+        engine.dispose()
+
+    return rows
+
+
+def _transaction_log(
+    rng: random.Random, options: SeedOptions, user_ids: range, balances: array, transfers: int
+) -> Iterator[str]:
+    """
+    Generates the transaction log entries (`COPY` text format) of the initial
+    deposits and of the transfers between a partition users. `balances`
+    starts with the initial deposits and ends with the final balances.
+
+    :param rng: Random numbers generator.
+    :param options: Shape of the generated dataset.
+    :param user_ids: Ids of the partition users.
+    :param balances: Balances (cents) indexed by user position in `user_ids`.
+    :param transfers: Number of transfers to generate.
+    :return: Iterator of `COPY` rows.
+    """
+    users = len(user_ids)
+    end = time.time()
+    start = end - options.days * 86400
+    opening = _timestamp(start)
+    for uid, balance in zip(user_ids, balances):
+        yield _log_row(uid, TransactionType.DEPOSIT, balance, 0, balance, opening)
+    if users < 2:
+        return
+
+    now = start
+    for _ in range(transfers):
+        now = min(now + rng.expovariate(transfers / (end - start)), end)
+        timestamp = _timestamp(now)
+        sender = rng.randrange(users)
+        while not balances[sender]:
+            sender = rng.randrange(users)
+        recipient = sender
+        while recipient == sender:
+            recipient = (_power_law_rank(rng, users, options.skew) + 1) * _RANK_SPREAD % users
+        amount = min(int(rng.expovariate(1 / options.mean_amount)) + 1, balances[sender])
+
+        balances[sender] -= amount
+        balances[recipient] += amount
+        yield _log_row(
+            user_ids[sender],
+            TransactionType.TRANSFER_OUT,
+            amount,
+            balances[sender] + amount,
+            balances[sender],
+            timestamp,
+        )
+        yield _log_row(
+            user_ids[recipient],
+            TransactionType.TRANSFER_IN,
+            amount,
+            balances[recipient] - amount,
+            balances[recipient],
+            timestamp,
+        )
+
+
+def _power_law_rank(rng: random.Random, n: int, exponent: float) -> int:
+    """
+    Draws a rank in `[0, n)` with a probability decreasing as `rank ** -exponent`
+    (inverse transform of the continuous power law).
+
+    :param rng: Random numbers generator.
+    :param n: Number of ranks.
+    :param exponent: Power-law exponent (`0` for uniform ranks).
+    :return: The drawn rank.
+    """
+    u = rng.random()
+    if math.isclose(exponent, 1):
+        x = (n + 1) ** u
+    else:
+        x = (1 + u * ((n + 1) ** (1 - exponent) - 1)) ** (1 / (1 - exponent))
+    return min(int(x) - 1, n - 1)
+
+
+def _copy(cursor, table: str, rows: Iterator[str], chunk_rows: int, commit) -> int:
+    """
+    Streams rows into a table with one `COPY` (and commit) per chunk.
+
+    :param cursor: psycopg2 cursor.
+    :param table: Table name and columns list.
+    :param rows: `COPY` text format rows.
+    :param chunk_rows: Rows per chunk.
+    :param commit: Function committing the transaction.
+    :return: Number of rows copied.
+    """
+    total = 0
+    chunk: List[str] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            total += _copy_chunk(cursor, table, chunk, commit)
+            chunk = []
+    if chunk:
+        total += _copy_chunk(cursor, table, chunk, commit)
+
+    return total
+
+
+def _copy_chunk(cursor, table: str, chunk: List[str], commit) -> int:
+    """Copies (and commits) a chunk of rows, see `_copy`."""
+    cursor.copy_expert(f"COPY {table} FROM STDIN", io.StringIO("".join(chunk)))
+    commit()
+    return len(chunk)
+
+
+def _log_row(
+    user_id: int,
+    trans_type: TransactionType,
+    amount: int,
+    opening_balance: int,
+    new_balance: int,
+    timestamp: str,
+) -> str:
+    """Transaction log entry in `COPY` text format (amounts in cents)."""
+    return (
+        f"{user_id}\t{trans_type.name}\t{amount}\t{opening_balance}\t{new_balance}\t{timestamp}\n"
+    )
+
+
+def _timestamp(seconds: float) -> str:
+    """Epoch seconds as a UTC timestamp string."""
+    return datetime.utcfromtimestamp(seconds).isoformat(" ")
@@ -0,0 +1,69 @@
+"""
+Account statements rendering (used by the user statement endpoint): rows are
+rendered and compressed batch by batch as they are streamed from the database.
+"""
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator, List
+
+from wallet_api.common.json_provider import JSONProvider
+from wallet_api.common.serializers import statement_entries_output_schema
+
+
+#: Content type of each statement format.
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+#: Columns of the CSV statements.
+CSV_COLUMNS = ("id", "timestamp", "type", "amount", "openingBalance", "balance")
+
+#: gzip compression level (speed over ratio, the body is compressed on the fly).
+GZIP_LEVEL = 6
+
+
+def render(batches: Iterable[List], fmt: str, provider: JSONProvider) -> Iterator[bytes]:
+    """
+    Renders a statement, one UTF-8 encoded chunk per batch of rows.
+
+    :param batches: Batches of transaction log rows.
+    :param fmt: Statement format: `ndjson` or `csv`.
+    :param provider: JSON provider encoding the NDJSON entries.
+    :return: Iterator of chunks.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_COLUMNS)
+        writer.writeheader()
+        # The header goes out before the first row is fetched
+        yield _drain(buffer).encode()
+        for batch in batches:
+            writer.writerows(statement_entries_output_schema.dump(batch).data)
+            yield _drain(buffer).encode()
+        return
+
+    for batch in batches:
+        entries = statement_entries_output_schema.dump(batch, native=provider.native).data
+        yield b"".join(provider.dumps(entry) + b"\n" for entry in entries)
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks as a gzip stream, flushing the compressed
+    data of every chunk.
+
+    :param chunks: Data chunks.
+    :return: Iterator of gzip data chunks.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        # Flushed per chunk so the client gets the data as it's fetched
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _drain(buffer: io.StringIO) -> str:
+    """Returns and clears the content of a text buffer."""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data